@@ -0,0 +1,243 @@
+import pandas as pd
+import numpy as np
+import argparse
+import contextlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+# --- Configuration ---
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Converter versions to compare (001 runs at import time, so it cannot be timed in-process)
+DEFAULT_SCRIPT_VERSIONS = ['002', '003', '004', '005', '006']
+DEFAULT_ROW_COUNTS = [10000, 100000, 1000000]
+DEFAULT_RUN_TIMEOUT = 3600 # Seconds before a single conversion is given up on
+
+# Shape of the generated exports (the sample averages ~20 variants per handle, median 11)
+VARIANT_DISTRIBUTIONS = ['geometric', 'uniform', 'fixed']
+DEFAULT_VARIANTS_PER_HANDLE = 20
+DEFAULT_HTML_BYTES = 2000
+DEFAULT_BODY_IMAGES = 3
+DEFAULT_TAGS = 5
+PRODUCTS_PER_WRITE = 2000 # Products generated and appended to the CSV at a time
+
+# Every column of a Shopify product export, in export order
+SHOPIFY_EXPORT_COLUMNS = [
+    'Handle', 'Title', 'Body (HTML)', 'Vendor', 'Product Category', 'Type', 'Tags', 'Published',
+    'Option1 Name', 'Option1 Value', 'Option1 Linked To', 'Option2 Name', 'Option2 Value', 'Option2 Linked To',
+    'Option3 Name', 'Option3 Value', 'Option3 Linked To', 'Variant SKU', 'Variant Grams',
+    'Variant Inventory Tracker', 'Variant Inventory Policy', 'Variant Fulfillment Service', 'Variant Price',
+    'Variant Compare At Price', 'Variant Requires Shipping', 'Variant Taxable', 'Variant Barcode',
+    'Image Src', 'Image Position', 'Image Alt Text', 'Gift Card', 'SEO Title', 'SEO Description',
+    'Google Shopping / Google Product Category', 'Google Shopping / Gender', 'Google Shopping / Age Group',
+    'Google Shopping / MPN', 'Google Shopping / Condition', 'Google Shopping / Custom Product',
+    'Google Shopping / Custom Label 0', 'Google Shopping / Custom Label 1', 'Google Shopping / Custom Label 2',
+    'Google Shopping / Custom Label 3', 'Google Shopping / Custom Label 4', 'Variant Image',
+    'Variant Weight Unit', 'Variant Tax Code', 'Cost per item', 'Status',
+]
+
+# Word lists for titles, tags and descriptions; the nouns include the converters' category keywords
+TITLE_ADJECTIVES = ['Classic', 'Premium', 'Portable', 'Vintage', 'Soft', 'Wireless', 'Organic', "Women's", "Men's", 'Deluxe']
+TITLE_NOUNS = ['T-Shirt', 'Hoodie', 'Jeans', 'Leggings', 'Mug', 'Poster', 'Keychain', 'Earbuds', 'Charger', 'Smartwatch',
+               'Lamp', 'Candle', 'Massage Gun', 'Hair Dryer', 'Skin Serum', 'Wig', 'Grooming Kit', 'Bra', 'Backpack', 'Water Bottle']
+TAG_VOCABULARY = ['new', 'sale', 'summer', 'winter', 'gift', 'bestseller', 'eco', 'cotton', 'kitchen', 'fitness',
+                  'beauty', 'usb', 'bluetooth', 'garden', 'decor', 'merch', 'care', 'travel', 'kids', 'limited']
+DESCRIPTION_WORDS = ['quality', 'comfortable', 'durable', 'design', 'material', 'perfect', 'daily', 'use', 'easy', 'clean',
+                     'lightweight', 'gift', 'size', 'color', 'premium', 'soft', 'fit', 'style', '&amp;', '&nbsp;', '100%', '&quot;new&quot;']
+VENDORS = ['KaziHub', 'Northwind', 'Acme Goods', 'Blue Harbor', 'Studio Nine']
+OPTION_SETS = [
+    ('Color', ['Black', 'White', 'Red', 'Blue', 'Green', 'Navy', 'Grey', 'Pink', 'Beige', 'Brown', 'Purple', 'Yellow']),
+    ('Size', ['XS', 'S', 'M', 'L', 'XL', 'XXL', '3XL', '4XL']),
+    ('Material', ['Cotton', 'Polyester', 'Linen', 'Wool', 'Silk', 'Leather']),
+]
+
+# --- Synthetic Export Generator ---
+def draw_variant_counts(rng, target_rows, mean_variants, distribution):
+    """Draws the variant count of each product until the counts add up to exactly target_rows."""
+    counts = []
+    total = 0
+    while total < target_rows:
+        batch_size = max(target_rows // max(mean_variants, 1), 1)
+        if distribution == 'fixed':
+            batch = np.full(batch_size, mean_variants)
+        elif distribution == 'uniform':
+            batch = rng.integers(1, 2 * mean_variants, size=batch_size, endpoint=False)
+        else:
+            batch = rng.geometric(1 / mean_variants, size=batch_size)
+        counts.extend(int(count) for count in np.maximum(batch, 1))
+        total = sum(counts)
+    counts = np.array(counts)
+    cumulative = np.cumsum(counts)
+    last = int(np.searchsorted(cumulative, target_rows))
+    counts = counts[:last + 1]
+    counts[-1] -= cumulative[last] - target_rows
+    return counts
+
+def product_body_html(rng, number, html_bytes, image_count):
+    """Builds a description of about html_bytes characters with image_count embedded <img> tags."""
+    parts = [f'<div class="detailmodule_html"><p><strong>Product {number}</strong></p>']
+    length = len(parts[0])
+    images_left = image_count
+    while length < html_bytes or images_left:
+        words = ' '.join(rng.choice(DESCRIPTION_WORDS, size=int(rng.integers(8, 30))))
+        paragraph = f'<p>{words}.</p>\n' if rng.random() < 0.7 else f'<ul><li>{words}</li></ul>\n'
+        if images_left and (length >= html_bytes or rng.random() < 0.3):
+            paragraph += f'<img src="https://cdn.example.com/products/{number}/body-{images_left}.jpg" alt="{words[:20]}">\n'
+            images_left -= 1
+        parts.append(paragraph)
+        length += len(paragraph)
+    parts.append('</div>')
+    return ''.join(parts)
+
+def product_rows(rng, number, variant_count, html_bytes, body_images, tag_count):
+    """Returns the export rows of one product as a dict of columns, in Shopify's layout.
+
+    Like a real export, product fields and option names are only on the first row,
+    and gallery images are spread over the product's first rows.
+    """
+    handle = f'synthetic-product-{number}'
+    option_count = 1 if variant_count <= len(OPTION_SETS[0][1]) else (2 if variant_count <= len(OPTION_SETS[0][1]) * len(OPTION_SETS[1][1]) else 3)
+    rows = {col: [''] * variant_count for col in SHOPIFY_EXPORT_COLUMNS}
+    first = {
+        'Title': f'{rng.choice(TITLE_ADJECTIVES)} {rng.choice(TITLE_NOUNS)} {number}',
+        'Body (HTML)': product_body_html(rng, number, html_bytes, body_images),
+        'Vendor': str(rng.choice(VENDORS)),
+        'Tags': ', '.join(rng.choice(TAG_VOCABULARY, size=min(tag_count, len(TAG_VOCABULARY)), replace=False)),
+        'Published': 'true',
+        'Gift Card': 'false',
+        'Status': 'active' if rng.random() < 0.9 else 'draft',
+    }
+    for option, (option_name, _) in enumerate(OPTION_SETS[:option_count], start=1):
+        first[f'Option{option} Name'] = option_name
+    for col, value in first.items():
+        rows[col][0] = value
+
+    prices = np.round(rng.uniform(5, 150, size=variant_count), 2)
+    for i in range(variant_count):
+        # Mixed-radix index over the option value lists, so variants get distinct combinations
+        remainder = i
+        for option, (_, values) in enumerate(OPTION_SETS[:option_count], start=1):
+            rows[f'Option{option} Value'][i] = values[remainder % len(values)]
+            remainder //= len(values)
+        rows['Handle'][i] = handle
+        rows['Variant SKU'][i] = f'SKU-{number}-{i}'
+        rows['Variant Grams'][i] = f'{rng.integers(0, 2000)}.0'
+        rows['Variant Inventory Tracker'][i] = 'shopify'
+        rows['Variant Inventory Policy'][i] = 'deny'
+        rows['Variant Fulfillment Service'][i] = 'manual'
+        rows['Variant Price'][i] = f'{prices[i]:.2f}'
+        rows['Variant Compare At Price'][i] = f'{prices[i] * 1.2:.2f}' if i % 3 == 0 else ''
+        rows['Variant Requires Shipping'][i] = 'true'
+        rows['Variant Taxable'][i] = 'true'
+        rows['Variant Barcode'][i] = f'{number:07d}{i:05d}' if i % 2 == 0 else ''
+        rows['Variant Weight Unit'][i] = 'kg'
+        rows['Cost per item'][i] = f'{prices[i] * 0.6:.2f}'
+        if i < 5:
+            rows['Image Src'][i] = f'https://cdn.example.com/products/{number}/gallery-{i + 1}.jpg'
+            rows['Image Position'][i] = str(i + 1)
+        if i % 4 == 0:
+            rows['Variant Image'][i] = f'https://cdn.example.com/products/{number}/variant-{i}.jpg'
+    return rows
+
+def generate_shopify_export(output_path, target_rows, mean_variants=DEFAULT_VARIANTS_PER_HANDLE, distribution='geometric',
+                            html_bytes=DEFAULT_HTML_BYTES, body_images=DEFAULT_BODY_IMAGES, tag_count=DEFAULT_TAGS, seed=0):
+    """Writes a Shopify export of exactly target_rows variant rows and returns its number of products."""
+    rng = np.random.default_rng(seed)
+    variant_counts = draw_variant_counts(rng, target_rows, mean_variants, distribution)
+    pd.DataFrame(columns=SHOPIFY_EXPORT_COLUMNS).to_csv(output_path, index=False)
+    for start in range(0, len(variant_counts), PRODUCTS_PER_WRITE):
+        batch = [product_rows(rng, number, int(variant_counts[number]), html_bytes, body_images, tag_count)
+                 for number in range(start, min(start + PRODUCTS_PER_WRITE, len(variant_counts)))]
+        columns = {col: [value for rows in batch for value in rows[col]] for col in SHOPIFY_EXPORT_COLUMNS}
+        pd.DataFrame(columns).to_csv(output_path, mode='a', header=False, index=False)
+    return len(variant_counts)
+
+# --- Benchmark ---
+def measure_conversion(script_path, input_path):
+    """Runs a converter's processing function on input_path in this process.
+
+    Returns {"seconds", "peak_rss_mb", "ok"}. Peak RSS is this process's high-water
+    mark, so it includes the interpreter and imported libraries.
+    """
+    namespace = {'__name__': 'converter', '__file__': script_path}
+    with open(script_path, encoding='utf-8') as f:
+        exec(compile(f.read(), script_path, 'exec'), namespace)
+    convert = namespace.get('process_shopify_data_for_medusa_csv') or namespace['process_shopify_data_to_csv']
+
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        result = convert(input_path)
+    seconds = time.perf_counter() - start
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 # KiB on Linux
+    return {'seconds': seconds, 'peak_rss_mb': peak_rss_mb, 'ok': result is not None}
+
+def run_conversion(version, input_path, timeout):
+    """Measures one converter version in a fresh process; returns None if it timed out or crashed."""
+    script_path = os.path.join(SCRIPT_DIR, f'shopify-to-csv-{version}.py')
+    command = [sys.executable, os.path.abspath(__file__), '--measure', script_path, input_path]
+    try:
+        completed = subprocess.run(command, capture_output=True, text=True, timeout=timeout, cwd=SCRIPT_DIR)
+    except subprocess.TimeoutExpired:
+        return None
+    if completed.returncode != 0:
+        print(completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else f"exit code {completed.returncode}", file=sys.stderr)
+        return None
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def benchmark_size(rows, args, export_dir):
+    """Generates one export size and prints a table row per converter version."""
+    export_path = os.path.join(export_dir, f'synthetic_products_{rows}.csv')
+    start = time.perf_counter()
+    products = generate_shopify_export(export_path, rows, args.variants_per_handle, args.variants_distribution,
+                                       args.html_bytes, args.body_images, args.tags, args.seed)
+    print(f"(generated {rows} rows / {products} products, {os.path.getsize(export_path) / (1024 * 1024):.1f} MB, in {time.perf_counter() - start:.1f}s)")
+
+    for version in args.scripts:
+        result = run_conversion(version, export_path, args.timeout)
+        if result is None:
+            print(f"{version:<8} {rows:>9} {products:>9} {'timed out or failed':>37}")
+        else:
+            status = '' if result['ok'] else '  (returned None)'
+            print(f"{version:<8} {rows:>9} {products:>9} {result['seconds']:>10.2f} {rows / result['seconds']:>12.0f} {result['peak_rss_mb']:>13.1f}{status}")
+
+# --- Run the benchmark ---
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == '--measure':
+        # Internal: measure one conversion in this (fresh) process and report it as JSON
+        print(json.dumps(measure_conversion(sys.argv[2], sys.argv[3])))
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(description="Generate synthetic Shopify exports and compare how the shopify-to-csv scripts scale with them.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_ROW_COUNTS, help="Variant rows of each generated export")
+    parser.add_argument('--scripts', nargs='+', default=DEFAULT_SCRIPT_VERSIONS, help="Converter versions to time (e.g. 005 006)")
+    parser.add_argument('--variants-per-handle', type=int, default=DEFAULT_VARIANTS_PER_HANDLE, help="Mean number of variants per product")
+    parser.add_argument('--variants-distribution', choices=VARIANT_DISTRIBUTIONS, default='geometric', help="How variant counts spread around the mean")
+    parser.add_argument('--html-bytes', type=int, default=DEFAULT_HTML_BYTES, help="Approximate size of each product's Body (HTML)")
+    parser.add_argument('--body-images', type=int, default=DEFAULT_BODY_IMAGES, help="<img> tags embedded in each Body (HTML)")
+    parser.add_argument('--tags', type=int, default=DEFAULT_TAGS, help="Tags per product")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed, so runs compare the same exports")
+    parser.add_argument('--timeout', type=int, default=DEFAULT_RUN_TIMEOUT, help="Seconds before a single conversion is reported as timed out")
+    parser.add_argument('--keep-exports', metavar='DIR', help="Write the generated exports to DIR instead of a temporary directory")
+    parser.add_argument('--generate-only', action='store_true', help="Only generate the exports (use with --keep-exports)")
+    args = parser.parse_args()
+    if args.generate_only and not args.keep_exports:
+        parser.error("--generate-only needs --keep-exports")
+
+    with contextlib.nullcontext(args.keep_exports) if args.keep_exports else tempfile.TemporaryDirectory() as export_dir:
+        os.makedirs(export_dir, exist_ok=True)
+        if args.generate_only:
+            for rows in args.sizes:
+                export_path = os.path.join(export_dir, f'synthetic_products_{rows}.csv')
+                products = generate_shopify_export(export_path, rows, args.variants_per_handle, args.variants_distribution,
+                                                   args.html_bytes, args.body_images, args.tags, args.seed)
+                print(f"Wrote {rows} rows / {products} products to {export_path}")
+            sys.exit(0)
+
+        print(f"{'script':<8} {'rows':>9} {'products':>9} {'seconds':>10} {'rows/s':>12} {'peak RSS MB':>13}")
+        for rows in args.sizes:
+            benchmark_size(rows, args, export_dir)
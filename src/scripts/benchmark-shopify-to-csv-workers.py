@@ -0,0 +1,68 @@
+import pandas as pd
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# --- Configuration ---
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CONVERTER_SCRIPT = os.path.join(SCRIPT_DIR, 'shopify-to-csv-006.py')
+SAMPLE_EXPORT = os.path.join(SCRIPT_DIR, 'products.csv')
+
+# Worker counts to compare, and the chunk size used for inputs too large to hold in memory
+DEFAULT_WORKER_COUNTS = [1, 2, 4, 8]
+LARGE_INPUT_CHUNKSIZE = 50000
+
+# --- Helper Functions ---
+def build_synthetic_export(sample_path, target_rows, output_path):
+    """Writes an export of at least target_rows rows by repeating the sample with suffixed handles."""
+    sample_df = pd.read_csv(sample_path, dtype=str, keep_default_na=False)
+    rows_written = 0
+    copy_number = 0
+    while rows_written < target_rows:
+        copy_df = sample_df.copy()
+        copy_df['Handle'] = copy_df['Handle'] + f'-copy-{copy_number}'
+        copy_df.to_csv(output_path, mode='a' if copy_number else 'w', header=not copy_number, index=False)
+        rows_written += len(copy_df)
+        copy_number += 1
+    return rows_written
+
+def time_conversion(input_path, workers, chunksize=0):
+    """Runs the converter in a fresh process and returns its wall time in seconds."""
+    with tempfile.TemporaryDirectory() as output_dir:
+        command = [sys.executable, CONVERTER_SCRIPT, input_path, '-o', os.path.join(output_dir, 'out.csv'), '--workers', str(workers)]
+        if chunksize:
+            command += ['--chunksize', str(chunksize)]
+        start = time.perf_counter()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        return time.perf_counter() - start
+
+def benchmark_input(label, input_path, rows, worker_counts, chunksize=0):
+    """Times one input for every worker count and prints a row per run."""
+    baseline = None
+    for workers in worker_counts:
+        seconds = time_conversion(input_path, workers, chunksize)
+        baseline = baseline or seconds
+        print(f"{label:<12} {rows:>9} {workers:>8} {seconds:>10.2f} {rows / seconds:>12.0f} {baseline / seconds:>8.2f}x")
+
+# --- Run the benchmark ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark shopify-to-csv-006.py with different --workers counts.")
+    parser.add_argument('--sample', default=SAMPLE_EXPORT, help="Shopify export used as-is and as the synthetic file's template")
+    parser.add_argument('--synthetic-rows', type=int, default=500000, help="Rows in the synthetic export (0 to skip it)")
+    parser.add_argument('--workers', type=int, nargs='+', default=DEFAULT_WORKER_COUNTS, help="Worker counts to compare")
+    args = parser.parse_args()
+
+    print(f"CPU cores available: {os.cpu_count()}")
+    print(f"\n{'input':<12} {'rows':>9} {'workers':>8} {'seconds':>10} {'rows/s':>12} {'speedup':>9}")
+
+    sample_rows = len(pd.read_csv(args.sample, usecols=['Handle']))
+    benchmark_input('sample', args.sample, sample_rows, args.workers)
+
+    if args.synthetic_rows:
+        with tempfile.TemporaryDirectory() as synthetic_dir:
+            synthetic_path = os.path.join(synthetic_dir, 'synthetic_products.csv')
+            synthetic_rows = build_synthetic_export(args.sample, args.synthetic_rows, synthetic_path)
+            benchmark_input('synthetic', synthetic_path, synthetic_rows, args.workers, LARGE_INPUT_CHUNKSIZE)
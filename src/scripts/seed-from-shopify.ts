@@ -22,13 +22,24 @@ import {
 import fs from 'fs';
 import csv from 'csv-parser';
 import path from "path";
+import readline from 'readline';
 
 
 
 
+// Products passed to each createProductsWorkflow run when seeding from NDJSON
+const NDJSON_PRODUCTS_PER_BATCH = 100;
+
+// Where the Shopify products are seeded from: the converter's wide CSV (default) or its NDJSON output.
+// Chosen with the first script argument (medusa exec ./src/scripts/seed-from-shopify.ts ndjson)
+// or the SHOPIFY_SEED_SOURCE environment variable.
+const PRODUCT_SOURCES = ['csv', 'ndjson'];
+const CONVERTER_OUTPUT_STEM = 'medusa_seed_products_006';
+
 interface Category {
     id: string;
     name: string;
+    handle?: string;
 }
 
 interface ShippingProfile {
@@ -306,6 +317,73 @@ const existingSkus = new Set<string>();
 }
 
 
+// One line of the converter's --ndjson output: a product ready for createProductsWorkflow,
+// except for the ids that only exist once the seeder has created them
+interface ProductDocument extends Omit<Product, 'category_ids' | 'shipping_profile_id' | 'sales_channels' | '_optionsAllowedValues'> {
+    category_handles: string[];
+}
+
+// The converter's NDJSON files in directory: <stem>.ndjson or <stem>_batch_NNNN.ndjson, never both,
+// since seeding both shapes would create every product twice
+export function findNDJSONFiles(directory: string): string[] {
+    const names = fs.readdirSync(directory);
+    const singleFile = names.filter(name => name === `${CONVERTER_OUTPUT_STEM}.ndjson`);
+    const batchFiles = names.filter(name => new RegExp(`^${CONVERTER_OUTPUT_STEM}_batch_\\d+\\.ndjson$`).test(name)).sort();
+    if (singleFile.length > 0 && batchFiles.length > 0) {
+        throw new Error(`[findNDJSONFiles] Found both ${CONVERTER_OUTPUT_STEM}.ndjson and ${batchFiles.length} ${CONVERTER_OUTPUT_STEM}_batch_*.ndjson files in ${directory}; remove the stale ones before seeding`);
+    }
+    return [...singleFile, ...batchFiles].map(name => path.join(directory, name));
+}
+
+export async function* loadProductBatchesFromNDJSON(
+    filePaths: string[],
+    batchSize: number,
+    categoryResult: Category[],
+    shippingProfile: ShippingProfile,
+    defaultSalesChannel: SalesChannel[]
+): AsyncGenerator<Product[]> {
+    if (!defaultSalesChannel || defaultSalesChannel.length === 0) {
+        throw new Error('[loadProductBatchesFromNDJSON] defaultSalesChannel array is empty');
+    }
+    const categoryIdsByHandle = new Map(categoryResult.map(cat => [cat.handle || slugifyString(cat.name), cat.id] as [string, string]));
+    const existingSkus = new Set<string>();
+
+    let batch: Product[] = [];
+    for (const filePath of filePaths) {
+        const lines = readline.createInterface({ input: fs.createReadStream(filePath), crlfDelay: Infinity });
+        for await (const line of lines) {
+            if (!line.trim()) continue;
+            try {
+                const { category_handles, ...document }: ProductDocument = JSON.parse(line);
+                batch.push({
+                    ...document,
+                    handle: slugifyString(document.handle),
+                    category_ids: category_handles
+                        .map(handle => categoryIdsByHandle.get(handle))
+                        .filter((id): id is string => !!id),
+                    variants: document.variants.map(variant => ({
+                        ...variant,
+                        sku: generateUniqueSku(variant.sku, existingSkus),
+                    })),
+                    shipping_profile_id: shippingProfile.id,
+                    sales_channels: [{ id: defaultSalesChannel[0].id }],
+                });
+            } catch (err) {
+                console.error(`[loadProductBatchesFromNDJSON] Error parsing line of ${filePath}: ${line.slice(0, 200)}`, err);
+                continue;
+            }
+            if (batch.length >= batchSize) {
+                yield batch;
+                batch = [];
+            }
+        }
+    }
+    if (batch.length > 0) {
+        yield batch;
+    }
+}
+
+
 const getMedusaProducts = async (categoryResult, shippingProfile, defaultSalesChannel) => {
     return [
         {
@@ -797,8 +875,17 @@ const getMedusaProducts = async (categoryResult, shippingProfile, defaultSalesCh
     ]
 }
 
-export default async function seedDemoData({ container }: ExecArgs) {
+export default async function seedDemoData({ container, args }: ExecArgs) {
     const logger = container.resolve(ContainerRegistrationKeys.LOGGER);
+    const productSource = (args?.[0] || process.env.SHOPIFY_SEED_SOURCE || 'csv').toLowerCase();
+    if (!PRODUCT_SOURCES.includes(productSource)) {
+        throw new Error(`Unknown product source '${productSource}', expected one of ${PRODUCT_SOURCES.join(', ')}`);
+    }
+    // Check the input files before seeding anything
+    const ndjsonFilePaths = findNDJSONFiles(__dirname);
+    if (productSource === 'ndjson' && ndjsonFilePaths.length === 0) {
+        throw new Error(`No ${CONVERTER_OUTPUT_STEM}.ndjson or ${CONVERTER_OUTPUT_STEM}_batch_*.ndjson in ${__dirname}; run shopify-to-csv-006.py --ndjson first`);
+    }
     const link = container.resolve(ContainerRegistrationKeys.LINK);
     const query = container.resolve(ContainerRegistrationKeys.QUERY);
     const fulfillmentModuleService = container.resolve(Modules.FULFILLMENT);
@@ -1161,14 +1248,38 @@ export default async function seedDemoData({ container }: ExecArgs) {
             ],
         },
     });
-    const csvFilePath = path.join(__dirname, 'medusa_seed_products_006.csv');
-    const shopifyProducts = await loadProductsFromCSV(csvFilePath, categoryResult, shippingProfile, defaultSalesChannel);
     const medusaProducts = await getMedusaProducts(categoryResult, shippingProfile, defaultSalesChannel);
-    await createProductsWorkflow(container).run({
-        input: {
-            products: [...shopifyProducts, ...medusaProducts],
-        },
-    });
+
+    // The converter's NDJSON output (shopify-to-csv-006.py --ndjson [--batch-size N]) is
+    // streamed into createProductsWorkflow batch by batch; the wide CSV is loaded at once
+    if (productSource === 'ndjson') {
+        logger.info(`Seeding Shopify products from NDJSON: ${ndjsonFilePaths.join(', ')}`);
+        for await (const shopifyProducts of loadProductBatchesFromNDJSON(ndjsonFilePaths, NDJSON_PRODUCTS_PER_BATCH, categoryResult, shippingProfile, defaultSalesChannel)) {
+            await createProductsWorkflow(container).run({
+                input: {
+                    products: shopifyProducts,
+                },
+            });
+            logger.info(`Seeded ${shopifyProducts.length} products from NDJSON.`);
+        }
+        await createProductsWorkflow(container).run({
+            input: {
+                products: medusaProducts,
+            },
+        });
+    } else {
+        const csvFilePath = path.join(__dirname, `${CONVERTER_OUTPUT_STEM}.csv`);
+        logger.info(`Seeding Shopify products from CSV: ${csvFilePath}`);
+        if (ndjsonFilePaths.length > 0) {
+            logger.warn(`Ignoring ${ndjsonFilePaths.length} NDJSON file(s) next to it; pass "ndjson" or set SHOPIFY_SEED_SOURCE=ndjson to seed from them instead`);
+        }
+        const shopifyProducts = await loadProductsFromCSV(csvFilePath, categoryResult, shippingProfile, defaultSalesChannel);
+        await createProductsWorkflow(container).run({
+            input: {
+                products: [...shopifyProducts, ...medusaProducts],
+            },
+        });
+    }
     logger.info("Finished seeding product data.");
 
     logger.info("Seeding inventory levels.");
@@ -1,249 +1,309 @@
-import pandas as pd
-from bs4 import BeautifulSoup
-import re
+import argparse
+import cProfile
 import json
+import os
 
-# --- Configuration ---
-# Your desired Medusa categories and keywords to match them from product titles
-# You can expand and refine these keywords based on your actual product data.
-CATEGORIES = {
-    "Shirts": ["shirt", "t-shirt", "tee"],
-    "Sweatshirts": ["sweatshirt", "hoodie", "jumper"],
-    "Pants": ["pants", "jeans", "trousers", "leggings", "shorts"],
-    "Merch": ["merch", "merchandise", "mug", "poster", "keychain"],
-    "Adult": ["adult", "lingerie", "intimate", "sexy", "thong", "bra"],
-    "Electronics": ["electronic", "earbud", "charger", "smartwatch", "bluetooth", "headphone", "device", "gadget", "usb"],
-    "Home & Living": ["home", "decor", "kitchen", "lamp", "light", "candle", "garden", "furniture"],
-    "Health & Wellness": ["health", "wellness", "care", "steamers", "scar", "massage", "therapy", "beauty", "hair", "skin", "body", "medical", "fitness"],
-    "Women's Essentials": ["women's", "wig", "cosmetic", "makeup", "feminine"],
-    "Men's Essentials": ["men's", "grooming", "male"],
-}
-
-# List of possible Shopify option columns
-SHOPIFY_OPTION_NAMES = ['Option1 Name', 'Option2 Name', 'Option3 Name']
-SHOPIFY_OPTION_VALUES = ['Option1 Value', 'Option2 Value', 'Option3 Value']
-
-# --- Currency Conversion Settings ---
-# IMPORTANT: These exchange rates are as of May 26, 2025.
-# For accurate conversions, please update these rates periodically!
-# Assuming your Shopify prices are in USD (your store's base currency).
-EXCHANGE_RATES = {
-    "USD": { # Base currency of your Shopify export
-        "EUR": 0.88,
-        "CAD": 1.37,
-        "XOF": 576.24 # 1 USD = 576.24 XOF
-    }
-}
-
-# Multiplier for each currency to convert to its smallest unit (e.g., dollars to cents)
-# XOF typically has no decimals, so its smallest unit multiplier is 1.
-CURRENCY_MULTIPLIERS = {
-    "USD": 100,
-    "EUR": 100,
-    "CAD": 100,
-    "XOF": 1 # XOF does not use sub-units like cents
-}
-
-# --- Helper Functions ---
-def clean_html(html_content):
-    """Strips HTML tags from a string."""
-    if pd.isna(html_content) or not isinstance(html_content, str):
-        return ""
-    soup = BeautifulSoup(html_content, 'html.parser')
-    for s in soup(['script', 'style']):
-        s.decompose()
-    text = soup.get_text(separator=' ', strip=True)
-    return text
-
-def extract_image_urls_from_html(html_content):
-    """Extracts image URLs from HTML content."""
-    if pd.isna(html_content) or not isinstance(html_content, str):
-        return []
-    soup = BeautifulSoup(html_content, 'html.parser')
-    img_urls = []
-    for img in soup.find_all('img', src=True):
-        img_urls.append(img['src'])
-    return img_urls
-
-def infer_category(title, shopify_tags):
-    """Infers Medusa categories based on product title and existing Shopify tags."""
-    title_lower = title.lower()
-    inferred_categories = []
-
-    for category_name, keywords in CATEGORIES.items():
-        for keyword in keywords:
-            if keyword.lower() in title_lower:
-                inferred_categories.append(category_name)
-                break 
-
-    for tag in shopify_tags:
-        for category_name, keywords in CATEGORIES.items():
-            for keyword in keywords:
-                if keyword.lower() == tag.lower():
-                    if category_name not in inferred_categories:
-                        inferred_categories.append(category_name)
-                    break
-            
-    if not inferred_categories:
-        return ["General"] 
-    return list(set(inferred_categories))
-
-# --- Main Processing Logic ---
-def process_shopify_data_for_medusa_csv(file_path):
-    try:
-        df = pd.read_csv(file_path, sep=',', quotechar='"', escapechar='\\', na_values=[''])
-    except FileNotFoundError:
-        print(f"Error: The file '{file_path}' was not found. Please ensure it's in the same directory as the script.")
-        return None
-    except Exception as e:
-        print(f"An error occurred while reading the CSV file: {e}")
-        return None
-
-    df = df.fillna('')
-
-    # Create new columns for processed data
-    df['Medusa_Description'] = ''
-    df['Medusa_Categories'] = ''
-    df['Medusa_Images'] = ''
-    df['Medusa_Product_Options'] = '' 
-    df['Medusa_Variant_Options'] = '' 
-
-    # Prepare price columns for conversion
-    price_cols_to_convert = ['Variant Price', 'Variant Compare At Price', 'Cost per item']
-    for col in price_cols_to_convert:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0.0)
-        else:
-            df[col] = 0.0 # Add column if it doesn't exist, fill with 0
-
-    # Add Medusa-specific price columns for each currency
-    # Assuming original Shopify prices are in USD
-    df['Medusa_Price_USD_Amount'] = (df['Variant Price'] * CURRENCY_MULTIPLIERS["USD"]).astype(int)
-    df['Medusa_Price_EUR_Amount'] = (df['Variant Price'] * EXCHANGE_RATES["USD"]["EUR"] * CURRENCY_MULTIPLIERS["EUR"]).astype(int)
-    df['Medusa_Price_CAD_Amount'] = (df['Variant Price'] * EXCHANGE_RATES["USD"]["CAD"] * CURRENCY_MULTIPLIERS["CAD"]).astype(int)
-    df['Medusa_Price_XOF_Amount'] = (df['Variant Price'] * EXCHANGE_RATES["USD"]["XOF"] * CURRENCY_MULTIPLIERS["XOF"]).astype(int)
-    
-    # You can extend this for 'Compare At Price' and 'Cost per item' if needed for multiple currencies
-    df['Medusa_Compare_At_Price_USD_Amount'] = (df['Variant Compare At Price'] * CURRENCY_MULTIPLIERS["USD"]).astype(int)
-    df['Medusa_Cost_Per_Item_USD_Amount'] = (df['Cost per item'] * CURRENCY_MULTIPLIERS["USD"]).astype(int)
-
-    # Process each product (identified by unique Handle)
-    unique_handles = df['Handle'].unique()
-
-    for handle in unique_handles:
-        product_rows = df[df['Handle'] == handle].copy() 
-        first_row_idx = product_rows.index[0] 
-
-        # --- Product-level data processing (description, categories, images) ---
-        cleaned_description = clean_html(df.at[first_row_idx, 'Body (HTML)'])
-        
-        shopify_tags = [tag.strip() for tag in df.at[first_row_idx, 'Tags'].split(',') if tag.strip()] if df.at[first_row_idx, 'Tags'] else []
-        inferred_categories = infer_category(df.at[first_row_idx, 'Title'], shopify_tags)
-        
-        all_images = []
-        if df.at[first_row_idx, 'Image Src']: 
-            all_images.append(df.at[first_row_idx, 'Image Src'])
-        all_images.extend(extract_image_urls_from_html(df.at[first_row_idx, 'Body (HTML)'])) 
-
-        for _, variant_row in product_rows.iterrows():
-            if variant_row['Variant Image']: 
-                all_images.append(variant_row['Variant Image'])
-        all_images = list(set(all_images)) 
-
-        # --- Options processing ---
-        product_options = [] 
-        
-        option_names_map = {} 
-        for i in range(len(SHOPIFY_OPTION_NAMES)):
-            option_name_col = SHOPIFY_OPTION_NAMES[i]
-            option_name = df.at[first_row_idx, option_name_col]
-            if option_name: 
-                option_names_map[option_name] = i + 1 
-
-        for option_name, col_num in option_names_map.items():
-            unique_values = set()
-            for _, variant_row in product_rows.iterrows():
-                option_value = variant_row[f'Option{col_num} Value']
-                if option_value:
-                    unique_values.add(option_value)
-            
-            if unique_values:
-                product_options.append({
-                    'name': option_name,
-                    'values': sorted(list(unique_values)) 
-                })
-        
-        # Store product-level processed data (propagated to all variants of this product)
-        df.loc[df['Handle'] == handle, 'Medusa_Description'] = cleaned_description
-        df.loc[df['Handle'] == handle, 'Medusa_Categories'] = ', '.join(inferred_categories)
-        df.loc[df['Handle'] == handle, 'Medusa_Images'] = ', '.join(all_images)
-        df.loc[df['Handle'] == handle, 'Medusa_Product_Options'] = json.dumps(product_options)
-
-        # --- Variant-level options processing ---
-        for idx, variant_row in product_rows.iterrows():
-            variant_options = {}
-            for option_name, col_num in option_names_map.items():
-                option_value = variant_row[f'Option{col_num} Value']
-                if option_value:
-                    variant_options[option_name] = option_value
-            df.loc[idx, 'Medusa_Variant_Options'] = json.dumps(variant_options)
-
-    # Define the columns to keep in the final output
-    desired_columns = [
-        'Handle',
-        'Title',
-        'Vendor',
-        'Variant SKU',
-        'Variant Grams',
-        'Variant Inventory Tracker',
-        'Variant Inventory Policy',
-        'Variant Fulfillment Service',
-        'Variant Requires Shipping',
-        'Variant Taxable',
-        'Variant Barcode',
-        'Status',
-        
-        # Original price columns (kept for reference)
-        'Variant Price',
-        'Variant Compare At Price',
-        'Cost per item',
-
-        # Medusa-specific processed columns
-        'Medusa_Description',
-        'Medusa_Categories',
-        'Medusa_Images',
-        'Medusa_Product_Options',   
-        'Medusa_Variant_Options',
-        
-        # New multi-currency price columns
-        'Medusa_Price_USD_Amount',          # USD Price in cents
-        'Medusa_Price_EUR_Amount',          # EUR Price in cents
-        'Medusa_Price_CAD_Amount',          # CAD Price in cents
-        'Medusa_Price_XOF_Amount',          # XOF Price (no cents)
-        'Medusa_Compare_At_Price_USD_Amount', # Compare at price in USD cents
-        'Medusa_Cost_Per_Item_USD_Amount'   # Cost per item in USD cents
-    ]
-
-    final_output_df = pd.DataFrame(columns=desired_columns)
-    for col in desired_columns:
-        if col in df.columns:
-            final_output_df[col] = df[col]
-        else:
-            final_output_df[col] = '' 
-            
-    return final_output_df
+from shopify_to_csv import (
+    EXPORT_READERS,
+    COLUMNAR_FORMATS,
+    DEFAULT_SLOWEST_HANDLES,
+    MAX_VARIANTS_PER_PRODUCT,
+    CONFLICT_POLICIES,
+    DEFAULT_CONFLICT_POLICY,
+    DEFAULT_DUPLICATE_THRESHOLD,
+    FEED_FORMATS,
+    FEED_WRITERS,
+    DEFAULT_STORE_URL,
+    DEFAULT_HTML_CACHE_BYTES,
+    EXCHANGE_RATES,
+    CURRENCY_MULTIPLIERS,
+    PRICE_ROUNDING_MODES,
+    DEFAULT_PRICE_ROUNDING,
+    PriceEngine,
+    HtmlContentCache,
+    RunReport,
+    run_stage,
+    split_output_path,
+    write_csv,
+    file_bytes,
+    CollisionIndex,
+    report_collisions,
+    OptionValidator,
+    report_option_rejects,
+    report_quarantine,
+    report_duplicates,
+    report_export_memory,
+    read_shopify_export,
+    NormalizedOutputWriter,
+    NdjsonOutputWriter,
+    ShardedOutputWriter,
+    ColumnarOutputWriter,
+    writer_input_columns,
+    write_output,
+    seed_frame,
+    save_incremental_state,
+    store_ranks,
+    process_store_exports,
+    Converter,
+    pa,
+    zstandard,
+)
+from shopify_to_csv import process_shopify_data_for_medusa_csv # noqa: F401 (timed from this script by benchmark-shopify-to-csv-scaling.py)
 
 # --- Run the script and save output ---
 if __name__ == "__main__":
-    input_filename = 'products.csv'
-    processed_df = process_shopify_data_for_medusa_csv(input_filename)
-
-    if processed_df is not None:
-        output_filename = "medusa_seed_products_006.csv"
-        processed_df.to_csv(output_filename, index=False, encoding='utf-8')
-
-        print(f"\nAwesome! Your fully cleaned product data with multi-currency prices and options is saved in: {output_filename}")
-        print("\n--- Here's a quick look at the first few rows: ---")
-        print(processed_df.head().to_string())
-        print("\n--- And these are all the columns you'll find: ---")
-        print(processed_df.columns.tolist())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Convert a Shopify product export into a Medusa seed CSV.")
+    parser.add_argument('input', nargs='*', default=['products.csv'], help="Shopify products export (default: products.csv); several exports are converted in parallel and merged into one output")
+    parser.add_argument('-o', '--output', default='medusa_seed_products_006.csv', help="Output CSV (default: medusa_seed_products_006.csv)")
+    parser.add_argument('--chunksize', type=int, default=0, help="Stream the export in chunks of about this many rows, keeping memory flat")
+    parser.add_argument('--workers', type=int, default=1, help="Run the per-product transforms on this many worker processes")
+    parser.add_argument('--html-cache', help="SQLite file caching cleaned descriptions and images between runs")
+    parser.add_argument('--html-cache-size-mb', type=int, default=DEFAULT_HTML_CACHE_BYTES // (1024 * 1024), help="Size limit of the HTML cache before least recently used entries are evicted")
+    parser.add_argument('--checkpoint', metavar='CHECKPOINT_FILE', help="With --chunksize, save progress to CHECKPOINT_FILE after every chunk and resume from it if the run is restarted; "
+                        "products that cannot be read or converted go to <output stem>_quarantine.csv instead of aborting the run")
+    parser.add_argument('--incremental', metavar='STATE_FILE', help="Only convert products that changed since the run that wrote STATE_FILE, copying the rest from the previous output")
+    parser.add_argument('--memory-report', action='store_true', help="Also load the export with every column and default dtypes, and compare memory footprints")
+    parser.add_argument('--rates', help="JSON file with the base currency, exchange rates and smallest-unit multipliers to use instead of the built-in ones")
+    parser.add_argument('--normalized', action='store_true', help="Write separate products, variants, prices and images tables linked by Handle instead of one wide row per variant (seed-from-shopify.ts does not read these yet)")
+    parser.add_argument('--compare-wide', action='store_true', help="With --normalized, also write the wide CSV to a scratch directory and report the size, write and load time normalizing saves")
+    parser.add_argument('--ndjson', action='store_true', help="Write one createProductsWorkflow-shaped product per line to <output stem>.ndjson instead of the CSV")
+    parser.add_argument('--batch-size', type=int, default=0, help="With --ndjson, split the products into files of this many products (<output stem>_batch_0001.ndjson, ...)")
+    parser.add_argument('--rounding', choices=PRICE_ROUNDING_MODES, default=DEFAULT_PRICE_ROUNDING, help="How converted prices are rounded to the smallest currency unit")
+    parser.add_argument('--shards', type=int, default=0, help="Split the output CSV into this many shards by a stable hash of Handle, with a <output stem>_shards.json manifest")
+    parser.add_argument('--reader', choices=EXPORT_READERS, default='pandas', help="CSV parser for the export: pandas' C reader or PyArrow's multithreaded reader (needs pyarrow)")
+    parser.add_argument('--arrow-cache', metavar='ARROW_FILE', help="Save the parsed export as an Arrow IPC file and memory-map it on re-runs while the CSV is unchanged (needs pyarrow)")
+    parser.add_argument('--columnar-output', choices=COLUMNAR_FORMATS, help="Also write the output as <output stem>.parquet or .arrow next to the CSV (needs pyarrow)")
+    parser.add_argument('--fix-collisions', action='store_true', help="Disambiguate duplicate SKUs, duplicate barcodes and handles sharing a slug instead of only reporting them")
+    parser.add_argument('--max-variants', type=int, default=MAX_VARIANTS_PER_PRODUCT, help="Variants a product may have before option validation rejects it")
+    parser.add_argument('--drop-option-rejects', action='store_true', help="Leave the rows that fail option validation out of the output")
+    parser.add_argument('--find-duplicates', action='store_true', help="Report products listed several times with slightly different titles and descriptions (MinHash/LSH) in <output stem>_duplicates.json")
+    parser.add_argument('--collapse-duplicates', action='store_true', help="Also keep only the first product of each near-duplicate cluster in the output (not with --chunksize)")
+    parser.add_argument('--duplicate-threshold', type=float, default=DEFAULT_DUPLICATE_THRESHOLD, help="Estimated Jaccard similarity of title and description shingles at which products count as duplicates")
+    parser.add_argument('--feed', action='append', choices=FEED_FORMATS, default=[], help="Also write this feed from the same pass over the export: a Google Merchant Center <output stem>_google_shopping.tsv, "
+                        "or an XML <output stem>_sitemap.xml with the SEO titles and descriptions in <output stem>_seo.csv (repeatable)")
+    parser.add_argument('--store-url', default=DEFAULT_STORE_URL, help="Storefront address the feed product links point to")
+    parser.add_argument('--conflict-policy', choices=CONFLICT_POLICIES, default=DEFAULT_CONFLICT_POLICY, help="With several exports, which store keeps a product they share by Handle or SKU: the newest export, --prefer-store, or all of them with suffixed handles and SKUs")
+    parser.add_argument('--prefer-store', help="With --conflict-policy prefer, the store (export file name without extension) whose products win")
+    parser.add_argument('--slowest-handles', type=int, default=DEFAULT_SLOWEST_HANDLES, help="Number of slowest handles listed in the run report")
+    parser.add_argument('--report-dir', help="Write the run report, the collision groups, the option rejects and the multi-store merge report into this directory "
+                        "(<output stem>_run_report.json, _collisions.json, _option_rejects.csv, _merge.json); without it only their summaries are printed")
+    parser.add_argument('--profile', action='store_true', help="Also dump a cProfile of the whole run to <output stem>_profile.prof (view with snakeviz or pstats)")
+    args = parser.parse_args()
+    if args.checkpoint and (args.chunksize <= 0 or args.normalized or args.ndjson or args.shards or args.columnar_output or split_output_path(args.output)[2]):
+        parser.error("--checkpoint needs --chunksize and an uncompressed CSV output (no --normalized, --ndjson, --shards or --columnar-output)")
+    if args.collapse_duplicates and args.chunksize > 0:
+        parser.error("--collapse-duplicates needs the whole output before writing it and cannot be combined with --chunksize (use --find-duplicates)")
+    if (args.find_duplicates or args.collapse_duplicates) and args.checkpoint:
+        parser.error("--find-duplicates and --collapse-duplicates cannot be combined with --checkpoint")
+    if args.feed and (args.checkpoint or args.incremental or len(args.input) > 1):
+        parser.error("--feed cannot be combined with --checkpoint, --incremental or several exports")
+    if not 0 < args.duplicate_threshold <= 1:
+        parser.error("--duplicate-threshold must be above 0 and at most 1")
+    if args.incremental and args.chunksize > 0:
+        parser.error("--incremental cannot be combined with --chunksize")
+    if args.incremental and (args.normalized or args.ndjson):
+        parser.error("--incremental cannot be combined with --normalized or --ndjson")
+    if args.compare_wide and not args.normalized:
+        parser.error("--compare-wide needs --normalized")
+    if args.normalized and args.ndjson:
+        parser.error("--normalized cannot be combined with --ndjson")
+    if args.shards < 0 or (args.shards and (args.normalized or args.ndjson or args.incremental)):
+        parser.error("--shards needs a positive number of shards and the plain CSV output (no --normalized, --ndjson or --incremental)")
+    if args.batch_size < 0 or (args.batch_size and not args.ndjson):
+        parser.error("--batch-size needs --ndjson and a positive number of products")
+    if args.max_variants < 1:
+        parser.error("--max-variants needs a positive number of variants")
+    if args.chunksize > 0 and (args.reader != 'pandas' or args.arrow_cache):
+        parser.error("--reader pyarrow and --arrow-cache read the whole export and cannot be combined with --chunksize")
+    if pa is None and (args.reader == 'pyarrow' or args.arrow_cache or args.columnar_output):
+        parser.error("--reader pyarrow, --arrow-cache and --columnar-output need PyArrow (pip install pyarrow)")
+    if zstandard is None and any(split_output_path(path)[2] == '.zst' for path in args.input + [args.output]):
+        parser.error(".zst exports and outputs need zstandard (pip install zstandard)")
+    input_path = args.input[0]
+    store_names = [split_output_path(os.path.basename(path))[0] for path in args.input]
+    multi_store = len(args.input) > 1
+    if multi_store and (args.chunksize > 0 or args.incremental or args.arrow_cache or args.workers > 1):
+        parser.error("several exports cannot be combined with --chunksize, --incremental, --arrow-cache or --workers (each export gets its own worker)")
+    if len(set(store_names)) < len(store_names):
+        parser.error("several exports need distinct file names, which name their stores")
+    if (args.conflict_policy == 'prefer') != bool(args.prefer_store) or (args.prefer_store and args.prefer_store not in store_names):
+        parser.error(f"--conflict-policy prefer needs --prefer-store naming one of the stores: {', '.join(store_names)}")
+
+    if args.rates:
+        price_engine = PriceEngine.from_rates_file(args.rates, args.rounding)
+    else:
+        price_engine = PriceEngine("USD", EXCHANGE_RATES["USD"], CURRENCY_MULTIPLIERS, args.rounding)
+    html_cache = HtmlContentCache(args.html_cache, args.html_cache_size_mb * 1024 * 1024) if args.html_cache else None
+    run_report = RunReport(args.slowest_handles)
+    converter = Converter(price_engine, html_cache, args.workers, args.reader, args.arrow_cache, fix_collisions=args.fix_collisions,
+                          max_variants=args.max_variants, drop_option_rejects=args.drop_option_rejects, run_report=run_report,
+                          find_duplicates=args.find_duplicates, collapse_duplicates=args.collapse_duplicates, duplicate_threshold=args.duplicate_threshold)
+
+    if args.memory_report:
+        for path in args.input:
+            loaded_df = read_shopify_export(path, converter.export_reader)
+            if loaded_df is not None:
+                report_export_memory(path, loaded_df)
+                del loaded_df
+
+    output_filename = args.output
+    output_stem = split_output_path(output_filename)[0]
+    if args.report_dir:
+        os.makedirs(args.report_dir, exist_ok=True)
+
+    def report_path(suffix):
+        """Where a diagnostic report goes: the --report-dir, named after the output, or nowhere."""
+        return os.path.join(args.report_dir, os.path.basename(output_stem) + suffix) if args.report_dir else None
+
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler is not None:
+        profiler.enable()
+
+    normalized_writer = NormalizedOutputWriter(output_filename, price_engine, args.compare_wide) if args.normalized else None
+    ndjson_writer = NdjsonOutputWriter(output_filename, args.batch_size, price_engine) if args.ndjson else None
+    sharded_writer = ShardedOutputWriter(output_filename, args.shards, price_engine) if args.shards else None
+    columnar_writer = ColumnarOutputWriter(output_filename, args.columnar_output, price_engine) if args.columnar_output else None
+    feed_writers = [FEED_WRITERS[feed](output_filename, price_engine, args.store_url) for feed in dict.fromkeys(args.feed)]
+    output_writer = normalized_writer or ndjson_writer or sharded_writer
+    processed_df = rows_written = None
+    store_results = []
+    if args.checkpoint:
+        result = converter.convert_with_checkpoints(input_path, output_filename, args.checkpoint, output_stem + '_quarantine.csv', args.chunksize)
+        if result is not None:
+            rows_written, resumed_chunks = result
+            resumed = f" (resumed after {resumed_chunks} chunks)" if resumed_chunks else ""
+            print(f"\nAwesome! Streamed {rows_written} rows of cleaned product data with multi-currency prices and options into: {output_filename}{resumed}")
+    elif args.chunksize > 0:
+        rows_written = converter.convert_to_csv(input_path, output_filename, args.chunksize, output_writer, columnar_writer, feed_writers)
+        if rows_written is not None and normalized_writer is not None:
+            normalized_writer.report()
+            print(f"\nAwesome! Streamed {rows_written} rows of cleaned product data into the normalized tables above.")
+        elif rows_written is not None and ndjson_writer is not None:
+            ndjson_paths = ndjson_writer.close()
+            print(f"\nAwesome! Streamed {ndjson_writer.products_written} products ({rows_written} variants) into {len(ndjson_paths)} NDJSON file(s): {', '.join(ndjson_paths)}")
+        elif rows_written is not None and sharded_writer is not None:
+            sharded_writer.close()
+            print(f"\nAwesome! Streamed {rows_written} rows of cleaned product data into {args.shards} shards (manifest: {sharded_writer.manifest_path})")
+        elif rows_written is not None:
+            print(f"\nAwesome! Streamed {rows_written} rows of cleaned product data with multi-currency prices and options into: {output_filename}")
+    elif args.incremental:
+        result = converter.convert_incrementally(input_path, output_filename, args.incremental)
+
+        if result is not None:
+            processed_df, changeset, fingerprints = result
+            with run_stage(run_report, 'to_csv', len(processed_df)):
+                write_csv(processed_df, output_filename)
+            save_incremental_state(args.incremental, fingerprints, output_filename, price_engine)
+
+            changeset_filename = output_stem + '_changeset.json'
+            with open(changeset_filename, 'w', encoding='utf-8') as f:
+                json.dump(changeset, f, indent=2)
+
+            print(f"\nAwesome! Your product data is up to date in: {output_filename}")
+            print(f"{len(changeset['added'])} added, {len(changeset['changed'])} changed, {len(changeset['removed'])} removed, {changeset['unchanged']} unchanged (see {changeset_filename})")
+    else:
+        if multi_store:
+            ranks = store_ranks(store_names, args.conflict_policy, [os.stat(path).st_mtime_ns for path in args.input], args.prefer_store)
+            result = process_store_exports(args.input, store_names, ranks, args.conflict_policy == 'keep-both', price_engine, args.reader, html_cache,
+                                           args.slowest_handles, CollisionIndex(args.fix_collisions), OptionValidator(args.max_variants, args.drop_option_rejects), run_report,
+                                           writer_input_columns([output_writer]))
+            if result is not None:
+                processed_df, conflicts, store_results = result
+                merge_filename = report_path('_merge.json')
+                if merge_filename is not None:
+                    with open(merge_filename, 'w', encoding='utf-8') as f:
+                        json.dump({
+                            'policy': args.conflict_policy,
+                            'stores': [
+                                {'name': name, 'input': path, 'rank': int(rank), 'rows': len(store_result['output'])}
+                                for name, path, rank, store_result in zip(store_names, args.input, ranks, store_results)
+                            ],
+                            'conflicts': conflicts,
+                        }, f, indent=2, ensure_ascii=False)
+                see = f" (see {merge_filename})" if merge_filename is not None else ""
+                print(f"Merged {len(store_names)} stores into {len(processed_df)} rows: {len(conflicts)} products shared between stores were resolved by '{args.conflict_policy}'{see}")
+                # The merged stores are checked together, so listings repeated across stores are found too
+                processed_df = converter.check_duplicates(processed_df)
+                if output_writer is not None:
+                    with run_stage(run_report, 'to_csv', len(processed_df)):
+                        write_output(processed_df, output_writer, price_engine)
+                processed_df = seed_frame(processed_df, price_engine)
+        else:
+            processed_df = converter.convert(input_path, feed_writers, output_writer)
+
+        if processed_df is not None and normalized_writer is not None:
+            normalized_writer.report()
+            print(f"\nAwesome! Your {processed_df['Handle'].nunique()} products are saved in the normalized tables above.")
+        elif processed_df is not None and ndjson_writer is not None:
+            ndjson_paths = ndjson_writer.close()
+            print(f"\nAwesome! Your {ndjson_writer.products_written} products are saved in {len(ndjson_paths)} NDJSON file(s): {', '.join(ndjson_paths)}")
+        elif processed_df is not None and sharded_writer is not None:
+            manifest = sharded_writer.close()
+            for shard in manifest['shards']:
+                print(f"{shard['path']}: {shard['products']} products, {shard['rows']} rows, sha256 {shard['sha256'][:12]}...")
+            print(f"\nAwesome! Your {manifest['products']} products are split into {args.shards} shards (manifest: {sharded_writer.manifest_path})")
+        elif processed_df is not None:
+            with run_stage(run_report, 'to_csv', len(processed_df)):
+                write_csv(processed_df, output_filename)
+
+            print(f"\nAwesome! Your fully cleaned product data with multi-currency prices and options is saved in: {output_filename}")
+            print("\n--- Here's a quick look at the first few rows: ---")
+            print(processed_df.head().to_string())
+            print("\n--- And these are all the columns you'll find: ---")
+            print(processed_df.columns.tolist())
+
+    if columnar_writer is not None and (processed_df is not None or rows_written is not None):
+        if processed_df is not None:
+            with run_stage(run_report, 'columnar_output', len(processed_df)):
+                columnar_writer.write(processed_df)
+        print(f"Columnar copy of the output saved in: {columnar_writer.close()}")
+    feed_paths = []
+    if feed_writers and (processed_df is not None or rows_written is not None):
+        for feed_writer in feed_writers:
+            feed_paths += feed_writer.close()
+        print(f"Feeds written from the same pass: {', '.join(feed_paths)}")
+    if store_results:
+        for store_name, store_result in zip(store_names, store_results):
+            report_collisions(store_result['collision_index'], report_path(f'_{store_name}_collisions.json'))
+            report_option_rejects(store_result['option_validator'], report_path(f'_{store_name}_option_rejects.csv'))
+    elif converter.collision_index is not None:
+        report_collisions(converter.collision_index, report_path('_collisions.json'))
+        report_option_rejects(converter.option_validator, report_path('_option_rejects.csv'))
+    if converter.quarantine is not None:
+        report_quarantine(converter.quarantine)
+    if converter.duplicate_detector is not None and (processed_df is not None or rows_written is not None):
+        report_duplicates(converter.duplicate_detector, output_stem + '_duplicates.json', args.collapse_duplicates)
+    converter.close()
+    if converter.export_reader.cache_hit:
+        print(f"Parsed export memory-mapped from the Arrow cache: {args.arrow_cache}")
+
+    if html_cache is not None:
+        html_cache.hits += sum(store_result['html_cache_hits'] for store_result in store_results)
+        html_cache.misses += sum(store_result['html_cache_misses'] for store_result in store_results)
+        html_cache.close()
+        print(f"\nHTML cache ({html_cache.path}): {html_cache.hits} hits, {html_cache.misses} misses")
+
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(output_stem + '_profile.prof')
+        print(f"cProfile of the run saved in: {output_stem}_profile.prof")
+
+    # Bytes on disk, i.e. compressed for .gz, .zst and .bz2 files
+    if normalized_writer is not None:
+        output_paths = list(normalized_writer.paths.values())
+    else:
+        output_paths = ndjson_writer.paths if ndjson_writer is not None else sharded_writer.paths if sharded_writer is not None else [output_filename]
+    output_paths = output_paths + ([columnar_writer.path] if columnar_writer is not None else []) + feed_paths
+    bytes_read = file_bytes([args.arrow_cache] if converter.export_reader.cache_hit else args.input)
+    bytes_written = file_bytes(output_paths)
+    print(f"I/O: read {bytes_read / (1024 * 1024):.2f} MB, wrote {bytes_written / (1024 * 1024):.2f} MB in {len(output_paths)} file(s)")
+
+    report_filename = report_path('_run_report.json')
+    if report_filename is not None:
+        store_reports = {'stores': [store_result['run_report'] for store_result in store_results]} if store_results else {}
+        run_report.write(report_filename, input=args.input if multi_store else input_path, output=output_filename, workers=args.workers, chunksize=args.chunksize, incremental=bool(args.incremental), checkpoint=bool(args.checkpoint),
+                         bytes_read=bytes_read, bytes_written=bytes_written, **store_reports)
+    slowest_stage = max(run_report.stages.values(), key=lambda stats: stats['wall_seconds'], default=None)
+    if slowest_stage is not None:
+        slowest = f"slowest stage: {slowest_stage['name']}, {slowest_stage['wall_seconds']:.2f}s"
+        print(f"Run report saved in: {report_filename} ({slowest})" if report_filename is not None else f"Run report: {slowest} (save it with --report-dir)")
@@ -0,0 +1,326 @@
+import pandas as pd
+import argparse
+import asyncio
+import ipaddress
+import json
+import os
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+from shopify_to_csv import (
+    EXCHANGE_RATES, CURRENCY_MULTIPLIERS, PRICE_ROUNDING_MODES, DEFAULT_PRICE_ROUNDING,
+    NDJSON_INPUT_COLUMNS, PriceEngine, iter_product_chunks, transform_shopify_frame, output_columns, iter_product_documents, encode_ndjson_line,
+)
+
+# --- Configuration ---
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8787
+
+# Conversions running at once, and how many more may wait for a slot before new uploads get a 503
+DEFAULT_MAX_ACTIVE_REQUESTS = 2
+DEFAULT_MAX_QUEUED_REQUESTS = 8
+
+# Rows per chunk handed to a pool worker; smaller chunks send the first products back sooner
+DEFAULT_CHUNKSIZE = 5000
+# Chunks of one request converting at once, so one large upload cannot fill the whole pool queue
+CHUNKS_IN_FLIGHT_PER_REQUEST = 2
+
+MAX_UPLOAD_BYTES = 2 * 1024 * 1024 * 1024
+UPLOAD_READ_BYTES = 1024 * 1024
+METRICS_HISTORY = 100 # Recent requests kept for /metrics and its latency percentiles
+
+OUTPUT_FORMATS = {'csv': 'text/csv; charset=utf-8', 'ndjson': 'application/x-ndjson'}
+HTTP_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 411: 'Length Required', 413: 'Payload Too Large', 503: 'Service Unavailable'}
+
+# --- Pool Worker ---
+def convert_chunk(chunk, output_format, price_engine, header):
+    """Converts one product-aligned chunk on a pool worker; returns (encoded output, rows, products)."""
+    if output_format == 'ndjson':
+        output_df = transform_shopify_frame(chunk, price_engine=price_engine, extra_columns=NDJSON_INPUT_COLUMNS)
+        documents = list(iter_product_documents(output_df, price_engine))
+        return b''.join(map(encode_ndjson_line, documents)), len(output_df), len(documents)
+    output_df = transform_shopify_frame(chunk, price_engine=price_engine)
+    return output_df.to_csv(index=False, header=header).encode('utf-8'), len(output_df), output_df['Handle'].nunique()
+
+# --- HTTP Helpers ---
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+async def read_request_head(reader):
+    """Returns (method, path, query, headers) of the next request, or None if the client sent nothing."""
+    request_line = await reader.readline()
+    if not request_line.strip():
+        return None
+    try:
+        method, target, _ = request_line.decode('latin-1').split()
+    except ValueError:
+        raise HttpError(400, "Malformed request line")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    url = urlsplit(target)
+    return method.upper(), url.path, parse_qs(url.query), headers
+
+def response_head(status, content_type, extra_headers=()):
+    lines = [f'HTTP/1.1 {status} {HTTP_REASONS.get(status, "")}', f'Content-Type: {content_type}', 'Connection: close', *extra_headers]
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+async def send_json(writer, status, document, extra_headers=()):
+    body = json.dumps(document, indent=2).encode('utf-8')
+    writer.write(response_head(status, 'application/json', [f'Content-Length: {len(body)}', *extra_headers]) + body)
+    await writer.drain()
+
+async def send_chunk(writer, data):
+    """Writes one piece of a chunked response and waits while the client is slower than the conversion."""
+    if data:
+        writer.write(f'{len(data):X}\r\n'.encode('latin-1') + data + b'\r\n')
+        await writer.drain()
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+# --- Conversion Service ---
+class ConversionService:
+    """Converts uploaded exports on a warm process pool and streams the output back as chunks finish.
+
+    At most max_active conversions run at once and max_queued more wait for a slot;
+    beyond that uploads are refused with a 503 before their body is read. Each
+    request keeps at most CHUNKS_IN_FLIGHT_PER_REQUEST chunks on the pool, and stops
+    reading the next chunk while the client has not taken the output already sent.
+    """
+
+    def __init__(self, workers, max_active=DEFAULT_MAX_ACTIVE_REQUESTS, max_queued=DEFAULT_MAX_QUEUED_REQUESTS, chunksize=DEFAULT_CHUNKSIZE, price_engine=None, upload_dir=None):
+        self.workers = workers
+        self.pool = ProcessPoolExecutor(max_workers=workers)
+        self.active_slots = asyncio.Semaphore(max_active)
+        self.max_active = max_active
+        self.max_queued = max_queued
+        self.chunksize = chunksize
+        self.price_engine = price_engine
+        self.upload_dir = upload_dir
+        self.started = time.time()
+        self.next_request_id = 1
+        self.queued = 0
+        self.active = 0
+        self.totals = {'completed': 0, 'failed': 0, 'rejected': 0, 'rows': 0, 'products': 0, 'bytes_in': 0, 'bytes_out': 0, 'busy_seconds': 0.0}
+        self.recent = deque(maxlen=METRICS_HISTORY)
+
+    async def handle_connection(self, reader, writer):
+        try:
+            request = await read_request_head(reader)
+            if request is None:
+                return
+            method, path, query, headers = request
+            if path == '/convert':
+                if method != 'POST':
+                    raise HttpError(405, "Use POST with the export as the request body")
+                await self.convert(query, headers, reader, writer)
+            elif path == '/metrics' and method == 'GET':
+                await send_json(writer, 200, self.metrics())
+            elif path == '/health' and method == 'GET':
+                await send_json(writer, 200, {'status': 'ok'})
+            else:
+                raise HttpError(404, f"No route for {method} {path}")
+        except HttpError as e:
+            await send_json(writer, e.status, {'error': str(e)}, ['Retry-After: 5'] if e.status == 503 else [])
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass # The client went away; its conversion, if any, was already accounted for
+        except Exception as e:
+            print(f"Request failed: {e!r}")
+        finally:
+            writer.close()
+
+    async def convert(self, query, headers, reader, writer):
+        output_format = query.get('format', ['csv'])[0]
+        if output_format not in OUTPUT_FORMATS:
+            raise HttpError(400, f"format must be one of {', '.join(OUTPUT_FORMATS)}")
+        if 'content-length' not in headers:
+            raise HttpError(411, "Send the export with a Content-Length")
+        try:
+            content_length = int(headers['content-length'])
+        except ValueError:
+            raise HttpError(400, "Content-Length must be a number")
+        if content_length > MAX_UPLOAD_BYTES:
+            raise HttpError(413, f"Exports are limited to {MAX_UPLOAD_BYTES} bytes")
+        # Uploads still arriving count as queued, so a burst cannot slip in before the slots fill
+        if self.active + self.queued >= self.max_active + self.max_queued:
+            self.totals['rejected'] += 1
+            raise HttpError(503, f"{self.active} conversions running and {self.queued} queued; retry later")
+
+        request_id = self.next_request_id
+        self.next_request_id += 1
+        stats = {'id': request_id, 'format': output_format, 'bytes_in': content_length, 'bytes_out': 0, 'rows': 0, 'products': 0, 'ok': False}
+        received = time.perf_counter()
+        self.queued += 1
+        upload_path = None
+        try:
+            if headers.get('expect', '').lower() == '100-continue':
+                writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+                await writer.drain()
+            upload_path = await self.receive_upload(reader, content_length)
+            async with self.active_slots:
+                self.queued -= 1
+                self.active += 1
+                stats['queue_seconds'] = time.perf_counter() - received
+                try:
+                    await self.stream_conversion(upload_path, output_format, writer, stats, received)
+                finally:
+                    self.active -= 1
+        finally:
+            if 'queue_seconds' not in stats:
+                self.queued -= 1
+            if upload_path is not None:
+                os.remove(upload_path)
+            self.record(stats, received)
+
+    async def receive_upload(self, reader, content_length):
+        """Copies the request body to a temporary file, so the export never sits in memory whole."""
+        fd, upload_path = tempfile.mkstemp(prefix='shopify_upload_', suffix='.csv', dir=self.upload_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                remaining = content_length
+                while remaining:
+                    data = await reader.readexactly(min(UPLOAD_READ_BYTES, remaining))
+                    f.write(data)
+                    remaining -= len(data)
+        except BaseException:
+            os.remove(upload_path)
+            raise
+        return upload_path
+
+    async def stream_conversion(self, upload_path, output_format, writer, stats, received):
+        loop = asyncio.get_running_loop()
+        chunks = iter_product_chunks(upload_path, self.chunksize)
+        pending = deque()
+        started_response = exhausted = False
+        try:
+            while True:
+                # Parsing runs on a thread, converting on the pool, writing here, all overlapping
+                chunk = None
+                if not exhausted and len(pending) < CHUNKS_IN_FLIGHT_PER_REQUEST:
+                    chunk = await loop.run_in_executor(None, next, chunks, None)
+                    exhausted = chunk is None
+                if chunk is not None:
+                    header = not started_response and not pending
+                    pending.append(loop.run_in_executor(self.pool, convert_chunk, chunk, output_format, self.price_engine, header))
+                    if not started_response:
+                        writer.write(response_head(200, OUTPUT_FORMATS[output_format], ['Transfer-Encoding: chunked', f'X-Request-Id: {stats["id"]}']))
+                        started_response = True
+                    continue
+                if not pending:
+                    break
+                data, rows, products = await pending.popleft()
+                stats['first_byte_seconds'] = stats.get('first_byte_seconds', time.perf_counter() - received)
+                await send_chunk(writer, data)
+                stats['bytes_out'] += len(data)
+                stats['rows'] += rows
+                stats['products'] += products
+        except (pd.errors.ParserError, UnicodeDecodeError, ValueError, KeyError) as e:
+            if started_response:
+                raise # Too late for an error status; the client sees the response cut short
+            raise HttpError(400, f"Could not convert the export: {e!r}")
+        finally:
+            for future in pending:
+                future.cancel()
+
+        if not started_response:
+            # An export with no products still gets the CSV header
+            writer.write(response_head(200, OUTPUT_FORMATS[output_format], ['Transfer-Encoding: chunked', f'X-Request-Id: {stats["id"]}']))
+            if output_format == 'csv':
+                data = pd.DataFrame(columns=output_columns(self.price_engine)).to_csv(index=False).encode('utf-8')
+                await send_chunk(writer, data)
+                stats['bytes_out'] += len(data)
+        writer.write(b'0\r\n\r\n')
+        await writer.drain()
+        stats['ok'] = True
+
+    def record(self, stats, received):
+        stats['total_seconds'] = time.perf_counter() - received
+        conversion_seconds = stats['total_seconds'] - stats.get('queue_seconds', stats['total_seconds'])
+        stats['rows_per_second'] = stats['rows'] / conversion_seconds if conversion_seconds > 0 else None
+        self.totals['completed' if stats['ok'] else 'failed'] += 1
+        for key in ['rows', 'products', 'bytes_in', 'bytes_out']:
+            self.totals[key] += stats[key]
+        self.totals['busy_seconds'] += conversion_seconds
+        self.recent.append(stats)
+        print(f"#{stats['id']} {stats['format']} {'ok' if stats['ok'] else 'failed'}: {stats['rows']} rows, {stats['products']} products, "
+              f"{stats.get('queue_seconds', 0.0):.2f}s queued, {stats['total_seconds']:.2f}s total")
+
+    def metrics(self):
+        latencies = [stats['total_seconds'] for stats in self.recent if stats['ok']]
+        first_bytes = [stats['first_byte_seconds'] for stats in self.recent if 'first_byte_seconds' in stats]
+        return {
+            'uptime_seconds': time.time() - self.started,
+            'workers': self.workers,
+            'max_active_requests': self.max_active,
+            'max_queued_requests': self.max_queued,
+            'active_requests': self.active,
+            'queued_requests': self.queued,
+            'totals': self.totals,
+            'rows_per_busy_second': self.totals['rows'] / self.totals['busy_seconds'] if self.totals['busy_seconds'] else None,
+            'recent_latency_seconds': {'p50': percentile(latencies, 0.5), 'p95': percentile(latencies, 0.95), 'max': max(latencies, default=None)},
+            'recent_first_byte_seconds': {'p50': percentile(first_bytes, 0.5), 'p95': percentile(first_bytes, 0.95)},
+            'recent_requests': list(self.recent),
+        }
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+def is_loopback(host):
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+async def serve(host, port, service):
+    server = await asyncio.start_server(service.handle_connection, host, port)
+    print(f"Converting Shopify exports on http://{host}:{port} with {service.workers} workers")
+    print(f"  curl --data-binary @products.csv 'http://{host}:{port}/convert?format=csv' -o medusa_seed_products_006.csv")
+    print(f"  curl http://{host}:{port}/metrics")
+    async with server:
+        await server.serve_forever()
+
+# --- Run the service ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve shopify-to-csv-006 conversions over HTTP on localhost, from a warm process pool.")
+    parser.add_argument('--host', default=DEFAULT_HOST, help="Loopback address to listen on (default: 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f"Port to listen on (default: {DEFAULT_PORT})")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Processes converting chunks (default: one per CPU core)")
+    parser.add_argument('--max-active', type=int, default=DEFAULT_MAX_ACTIVE_REQUESTS, help="Conversions running at once")
+    parser.add_argument('--max-queued', type=int, default=DEFAULT_MAX_QUEUED_REQUESTS, help="Uploads waiting for a conversion slot before new ones are refused with 503")
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE, help="Rows per chunk converted and streamed back at a time")
+    parser.add_argument('--rates', help="JSON file with the base currency, exchange rates and smallest-unit multipliers to use instead of the built-in ones")
+    parser.add_argument('--rounding', choices=PRICE_ROUNDING_MODES, default=DEFAULT_PRICE_ROUNDING, help="How converted prices are rounded to the smallest currency unit")
+    parser.add_argument('--upload-dir', help="Directory for uploaded exports while they convert (default: the system temp directory)")
+    args = parser.parse_args()
+    if not is_loopback(args.host):
+        parser.error("the service only listens on loopback addresses (127.0.0.1, ::1 or localhost)")
+    if args.workers < 1 or args.max_active < 1 or args.max_queued < 0 or args.chunksize < 1:
+        parser.error("--workers, --max-active and --chunksize must be positive and --max-queued not negative")
+
+    if args.rates:
+        price_engine = PriceEngine.from_rates_file(args.rates, args.rounding)
+    else:
+        price_engine = PriceEngine("USD", EXCHANGE_RATES["USD"], CURRENCY_MULTIPLIERS, args.rounding)
+
+    service = ConversionService(args.workers, args.max_active, args.max_queued, args.chunksize, price_engine, args.upload_dir)
+    try:
+        asyncio.run(serve(args.host, args.port, service))
+    except KeyboardInterrupt:
+        print("\nStopped")
+    finally:
+        service.close()
@@ -0,0 +1,2931 @@
+"""Shopify product export to Medusa seed data conversion, as an importable library.
+
+shopify-to-csv-006.py is the command line front end; long-running workers can use
+Converter directly to convert many exports in one process.
+"""
+import pandas as pd
+import numpy as np
+from bs4.builder import HTMLParserTreeBuilder
+from bs4.dammit import EntitySubstitution, UnicodeDammit
+from html.parser import HTMLParser
+import re
+import json
+import bz2
+import gzip
+import io
+import itertools
+import os
+import hashlib
+import heapq
+import shutil
+import sqlite3
+import tempfile
+import time
+import unicodedata
+from urllib.request import pathname2url
+from fractions import Fraction
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext
+from functools import partial
+from xml.sax.saxutils import escape as xml_escape
+
+try:
+    import orjson # Optional, faster NDJSON encoding
+except ImportError:
+    orjson = None
+
+try:
+    import pyarrow as pa # Optional multithreaded CSV reader, Arrow cache and Parquet/Arrow output
+    import pyarrow.csv as pa_csv
+    import pyarrow.ipc as pa_ipc
+    import pyarrow.parquet as pa_parquet
+except ImportError:
+    pa = None
+
+try:
+    import zstandard # Optional, .zst exports and outputs
+except ImportError:
+    zstandard = None
+
+try:
+    import resource # Peak RSS in the run report (Unix only)
+except ImportError:
+    resource = None
+
+# --- Configuration ---
+# Your desired Medusa categories and keywords to match them from product titles
+# You can expand and refine these keywords based on your actual product data.
+CATEGORIES = {
+    "Shirts": ["shirt", "t-shirt", "tee"],
+    "Sweatshirts": ["sweatshirt", "hoodie", "jumper"],
+    "Pants": ["pants", "jeans", "trousers", "leggings", "shorts"],
+    "Merch": ["merch", "merchandise", "mug", "poster", "keychain"],
+    "Adult": ["adult", "lingerie", "intimate", "sexy", "thong", "bra"],
+    "Electronics": ["electronic", "earbud", "charger", "smartwatch", "bluetooth", "headphone", "device", "gadget", "usb"],
+    "Home & Living": ["home", "decor", "kitchen", "lamp", "light", "candle", "garden", "furniture"],
+    "Health & Wellness": ["health", "wellness", "care", "steamers", "scar", "massage", "therapy", "beauty", "hair", "skin", "body", "medical", "fitness"],
+    "Women's Essentials": ["women's", "wig", "cosmetic", "makeup", "feminine"],
+    "Men's Essentials": ["men's", "grooming", "male"],
+}
+
+# List of possible Shopify option columns
+SHOPIFY_OPTION_NAMES = ['Option1 Name', 'Option2 Name', 'Option3 Name']
+SHOPIFY_OPTION_VALUES = ['Option1 Value', 'Option2 Value', 'Option3 Value']
+
+# The columns to keep in the final output
+DESIRED_COLUMNS = [
+    'Handle',
+    'Title',
+    'Vendor',
+    'Variant SKU',
+    'Variant Grams',
+    'Variant Inventory Tracker',
+    'Variant Inventory Policy',
+    'Variant Fulfillment Service',
+    'Variant Requires Shipping',
+    'Variant Taxable',
+    'Variant Barcode',
+    'Status',
+
+    # Original price columns (kept for reference)
+    'Variant Price',
+    'Variant Compare At Price',
+    'Cost per item',
+
+    # Medusa-specific processed columns
+    'Medusa_Description',
+    'Medusa_Categories',
+    'Medusa_Images',
+    'Medusa_Product_Options',   
+    'Medusa_Variant_Options',
+
+    # The multi-currency amount columns (e.g. Medusa_Price_USD_Amount, in the
+    # currency's smallest unit) are appended by the price engine, see output_columns()
+]
+
+# Medusa columns computed once per product and shared by all of its variant rows
+PRODUCT_LEVEL_COLUMNS = ['Medusa_Description', 'Medusa_Categories', 'Medusa_Images', 'Medusa_Product_Options']
+
+# Columns always read as text, so chunked reads cannot infer a different dtype per chunk
+# (e.g. numeric-looking sizes or barcodes turning into floats in only some chunks)
+SHOPIFY_TEXT_COLUMNS = ['Handle', 'Title', 'Body (HTML)', 'Product Category', 'Tags', 'Variant SKU', 'Variant Barcode', 'Image Src', 'Variant Image'] + SHOPIFY_OPTION_NAMES + SHOPIFY_OPTION_VALUES
+
+# Export columns read by the transforms besides the ones copied to the output
+TRANSFORM_INPUT_COLUMNS = ['Body (HTML)', 'Tags', 'Image Src', 'Variant Image'] + SHOPIFY_OPTION_NAMES + SHOPIFY_OPTION_VALUES
+
+# Low-cardinality columns held as categoricals instead of one string object per row
+SHOPIFY_CATEGORICAL_COLUMNS = ['Vendor', 'Status', 'Variant Inventory Policy', 'Variant Fulfillment Service'] + SHOPIFY_OPTION_NAMES
+
+# Options shared by every read of a Shopify export. Only the columns the output and the
+# transforms need are loaded; SEO, Google Shopping, gift card etc. columns are skipped
+# unless a feed writer asks for them (see shopify_read_csv_options).
+SHOPIFY_READ_CSV_OPTIONS = {
+    'sep': ',',
+    'quotechar': '"',
+    'escapechar': '\\',
+    'na_values': [''],
+    'usecols': lambda col: col in SHOPIFY_INPUT_COLUMNS,
+    'dtype': {
+        **{col: str for col in SHOPIFY_TEXT_COLUMNS},
+        **{col: 'category' for col in SHOPIFY_CATEGORICAL_COLUMNS},
+    },
+}
+
+# Products sent to a worker process per task in --workers mode (amortizes pickling and IPC)
+PRODUCTS_PER_WORKER_TASK = 32
+
+# --- Normalized Output Settings ---
+# Tables written by --normalized instead of one wide row per variant, linked by Handle
+# (variants and prices also by Variant Position, the variant's 1-based row within its product)
+NORMALIZED_TABLES = ['products', 'variants', 'prices', 'images']
+PRODUCT_TABLE_COLUMNS = ['Handle', 'Title', 'Vendor', 'Status', 'Medusa_Description', 'Medusa_Categories', 'Medusa_Product_Options']
+VARIANT_TABLE_COLUMNS = [
+    'Handle',
+    'Variant Position',
+    'Variant SKU',
+    'Variant Grams',
+    'Variant Inventory Tracker',
+    'Variant Inventory Policy',
+    'Variant Fulfillment Service',
+    'Variant Requires Shipping',
+    'Variant Taxable',
+    'Variant Barcode',
+    'Variant Price',
+    'Variant Compare At Price',
+    'Cost per item',
+    'Medusa_Variant_Options',
+]
+
+# --- NDJSON Output Settings ---
+# Shopify statuses and the Medusa product status each becomes (anything else is published)
+MEDUSA_PRODUCT_STATUSES = {'active': 'published', 'published': 'published', 'draft': 'draft'}
+# Export columns the product documents read besides the output: the option values that
+# tell variant rows from Shopify's image-only rows, and the images of those rows
+NDJSON_INPUT_COLUMNS = ['Image Src'] + SHOPIFY_OPTION_VALUES
+
+# --- Columnar (PyArrow) Settings ---
+EXPORT_READERS = ['pandas', 'pyarrow']
+COLUMNAR_FORMATS = ['parquet', 'arrow']
+
+# Bump this whenever the columns or dtypes of a parsed export change, so --arrow-cache files are rebuilt
+ARROW_CACHE_VERSION = 1
+
+# What pandas' default CSV reader turns into NaN or booleans, given to PyArrow so both readers agree
+PANDAS_NA_VALUES = ['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null']
+PANDAS_TRUE_VALUES = ['True', 'TRUE', 'true']
+PANDAS_FALSE_VALUES = ['False', 'FALSE', 'false']
+
+# --- Feed Output Settings ---
+# Feeds written next to the Medusa seed from the same read-and-transform pass (--feed)
+FEED_FORMATS = ['google-shopping', 'sitemap']
+DEFAULT_STORE_URL = 'http://localhost:8000' # The Medusa Next.js storefront's default address
+PRODUCT_URL_PATH = '/products/{handle}'
+GOOGLE_SHOPPING_COLUMNS = [
+    'id', 'item_group_id', 'title', 'description', 'link', 'image_link', 'additional_image_link',
+    'availability', 'price', 'sale_price', 'brand', 'gtin', 'mpn', 'identifier_exists', 'condition',
+    'google_product_category', 'product_type', 'gender', 'age_group', 'color', 'size', 'shipping_weight',
+    'custom_label_0', 'custom_label_1', 'custom_label_2', 'custom_label_3', 'custom_label_4',
+]
+GOOGLE_SHOPPING_MAX_ADDITIONAL_IMAGES = 10
+GOOGLE_SHOPPING_MAX_DESCRIPTION = 5000
+SITEMAP_MAX_URLS = 50000 # Per sitemap file (sitemaps.org); more URLs are split over several files and an index
+SEO_DESCRIPTION_LENGTH = 160 # Fallback meta descriptions are cut at a word boundary to about this many characters
+
+# --- Compression Settings ---
+# Exports and outputs ending in these extensions are (de)compressed on the fly, e.g. products.csv.gz
+COMPRESSION_EXTENSIONS = {'.gz': 'gzip', '.zst': 'zstd', '.bz2': 'bz2'}
+GZIP_LEVEL = 6 # zlib's default; level 9 costs a lot more CPU for a few percent
+ZSTD_LEVEL = 3
+
+# --- Converter Settings ---
+# Rows per chunk when Converter.iter_products reads an export (and its default for convert_to_csv)
+DEFAULT_CHUNKSIZE = 50000
+
+# --- Run Report Settings ---
+# Handles listed in the run report's "slowest_handles" (HTML parsing + product transforms)
+DEFAULT_SLOWEST_HANDLES = 10
+
+# --- Option Validation Settings ---
+# Variants allowed per product before the whole product is rejected (Shopify's classic limit)
+MAX_VARIANTS_PER_PRODUCT = 100
+# Why a row is rejected, in the order the checks are applied (a row gets the first that applies)
+OPTION_REJECT_REASONS = ['no_option_values', 'missing_value', 'unexpected_value', 'untrimmed_name', 'duplicate_combination', 'too_many_variants', 'product_rejected']
+
+# --- Checkpoint Settings ---
+# Why a product is quarantined instead of converted, in the order they are checked
+QUARANTINE_REASONS = ['missing_handle', 'invalid_encoding', 'conversion_error']
+# What undecodable bytes become when a checkpointed run reads the export with encoding_errors='replace'
+REPLACEMENT_CHARACTER = '�'
+CHECKPOINT_VERSION = 1
+
+# --- Near-Duplicate Detection Settings ---
+# MinHash signature length, split into LSH_BANDS bands of MINHASH_PERMUTATIONS // LSH_BANDS values. Two products
+# share a bucket with probability 1 - (1 - s^8)^16 for Jaccard similarity s: about 50% at s = 0.67, 95% at 0.8
+MINHASH_PERMUTATIONS = 128
+LSH_BANDS = 16
+MINHASH_SEED = 1 # Fixed, so signatures and clusters are the same on every run
+SHINGLE_WORDS = 3 # Words per shingle of a product's lowercased title and description
+SHINGLE_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15) # Odd, mixes the word hashes of a shingle into one
+DUPLICATE_TOKEN_PATTERN = re.compile(r'\w+')
+# Estimated Jaccard similarity of their shingles at which two products count as duplicates
+DEFAULT_DUPLICATE_THRESHOLD = 0.8
+# Products shingled at once, and shingles permuted (or candidate pairs compared) at once,
+# bounding the word lists and the (shingles x permutations) scratch array to about 50 MB
+MINHASH_BATCH_PRODUCTS = 5000
+MINHASH_BATCH_SHINGLES = 50000
+
+# --- Multi-Store Merge Settings ---
+# How products that several exports share (by Handle or Variant SKU) are resolved
+CONFLICT_POLICIES = ['newest', 'prefer', 'keep-both']
+DEFAULT_CONFLICT_POLICY = 'newest'
+
+# --- HTML Cache Settings ---
+# Bump this whenever extract_html_content changes its output, so cached results are not reused
+HTML_CLEANER_VERSION = 1
+DEFAULT_HTML_CACHE_BYTES = 256 * 1024 * 1024
+SQLITE_BATCH_SIZE = 500 # Keys per "IN (...)" query, below SQLite's bound-parameter limit
+
+# --- Currency Conversion Settings ---
+# IMPORTANT: These exchange rates are as of May 26, 2025.
+# For accurate conversions, please update these rates periodically!
+# Assuming your Shopify prices are in USD (your store's base currency).
+EXCHANGE_RATES = {
+    "USD": { # Base currency of your Shopify export
+        "EUR": 0.88,
+        "CAD": 1.37,
+        "XOF": 576.24 # 1 USD = 576.24 XOF
+    }
+}
+
+# Multiplier for each currency to convert to its smallest unit (e.g., dollars to cents)
+# XOF typically has no decimals, so its smallest unit multiplier is 1.
+CURRENCY_MULTIPLIERS = {
+    "USD": 100,
+    "EUR": 100,
+    "CAD": 100,
+    "XOF": 1 # XOF does not use sub-units like cents
+}
+
+# Shopify price columns, and the prefix of the Medusa amount columns computed from each
+# (one <prefix>_<CURRENCY>_Amount column per currency)
+PRICE_COLUMNS = {
+    'Variant Price': 'Medusa_Price',
+    'Variant Compare At Price': 'Medusa_Compare_At_Price',
+    'Cost per item': 'Medusa_Cost_Per_Item',
+}
+
+# Every export column the converter loads
+SHOPIFY_INPUT_COLUMNS = set(DESIRED_COLUMNS) | set(TRANSFORM_INPUT_COLUMNS) | set(PRICE_COLUMNS)
+
+# How converted amounts are rounded to the currency's smallest unit:
+# half_up (0.5 away from zero), half_even (banker's rounding), down (toward zero), up (away from zero)
+PRICE_ROUNDING_MODES = ['half_up', 'half_even', 'down', 'up']
+DEFAULT_PRICE_ROUNDING = 'half_up'
+
+# Shopify prices have at most two decimals, so they are loaded as integer cents
+# (hundredths of the base currency) and converted exactly from there
+PRICE_CENTS = 100
+
+# --- Price Engine ---
+def divide_rounded(numerators, denominators, rounding):
+    """Divides integer arrays (positive denominators) and rounds the quotients with the given mode."""
+    magnitudes = np.abs(numerators)
+    quotients, remainders = magnitudes // denominators, magnitudes % denominators
+    if rounding == 'half_up':
+        quotients = quotients + (2 * remainders >= denominators)
+    elif rounding == 'half_even':
+        quotients = quotients + ((2 * remainders > denominators) | ((2 * remainders == denominators) & (quotients % 2 == 1)))
+    elif rounding == 'up':
+        quotients = quotients + (remainders > 0)
+    elif rounding != 'down':
+        raise ValueError(f"Unknown rounding mode '{rounding}', expected one of {PRICE_ROUNDING_MODES}")
+    return np.where(numerators < 0, -quotients, quotients)
+
+class PriceEngine:
+    """Converts the Shopify price columns into integer amounts for every currency.
+
+    Each currency's factor (exchange rate x smallest-unit multiplier / PRICE_CENTS)
+    is kept as an exact fraction and prices arrive as integer cents, so an amount is
+    one integer multiply and one rounded integer division. All price columns
+    and currencies are computed together in one vectorized NumPy pass.
+    """
+
+    def __init__(self, base_currency, exchange_rates, currency_multipliers, rounding=DEFAULT_PRICE_ROUNDING):
+        if rounding not in PRICE_ROUNDING_MODES:
+            raise ValueError(f"Unknown rounding mode '{rounding}', expected one of {PRICE_ROUNDING_MODES}")
+        self.base_currency = base_currency
+        self.rounding = rounding
+        self.currencies = [base_currency] + [currency for currency in exchange_rates if currency != base_currency]
+        self.multipliers = {currency: int(currency_multipliers[currency]) for currency in self.currencies}
+
+        factors = []
+        for currency in self.currencies:
+            rate = Fraction(1) if currency == base_currency else Fraction(str(exchange_rates[currency]))
+            factors.append(rate * int(currency_multipliers[currency]) / PRICE_CENTS)
+        self.numerators = np.array([factor.numerator for factor in factors], dtype=object)
+        self.denominators = np.array([factor.denominator for factor in factors], dtype=object)
+
+        self.amount_columns = [f'{prefix}_{currency}_Amount' for prefix in PRICE_COLUMNS.values() for currency in self.currencies]
+
+    @classmethod
+    def from_rates_file(cls, path, rounding=DEFAULT_PRICE_ROUNDING):
+        """Loads {"base": ..., "rates": {currency: rate}, "multipliers": {currency: n}} from a JSON file."""
+        with open(path, encoding='utf-8') as f:
+            settings = json.load(f, parse_float=Fraction)
+        return cls(settings['base'], settings['rates'], settings['multipliers'], rounding)
+
+    def settings(self):
+        """The conversion settings as plain JSON values, e.g. for fingerprinting."""
+        return {
+            'currencies': self.currencies,
+            'factors': [f'{n}/{d}' for n, d in zip(self.numerators, self.denominators)],
+            'rounding': self.rounding,
+        }
+
+    def compute(self, df):
+        """Returns a frame with every amount column, computed from df's integer-cent price columns."""
+        cents = df[list(PRICE_COLUMNS)].to_numpy(dtype=np.int64)
+        numerators, denominators = self.numerators, self.denominators
+        largest_product = int(np.abs(cents).max(initial=0)) * max(abs(n) for n in numerators)
+        if largest_product < np.iinfo(np.int64).max:
+            numerators, denominators = numerators.astype(np.int64), denominators.astype(np.int64)
+        else:
+            # Too large for int64: fall back to exact Python integers
+            cents = cents.astype(object)
+
+        # (rows, price columns, 1) x (currencies,) -> (rows, price columns, currencies)
+        amounts = divide_rounded(cents[:, :, None] * numerators, denominators, self.rounding)
+        return pd.DataFrame(amounts.reshape(len(df), len(self.amount_columns)), columns=self.amount_columns, index=df.index)
+
+PRICE_ENGINE = PriceEngine("USD", EXCHANGE_RATES["USD"], CURRENCY_MULTIPLIERS)
+
+def output_columns(price_engine=None):
+    """The output CSV columns: DESIRED_COLUMNS followed by the engine's amount columns."""
+    return DESIRED_COLUMNS + (price_engine or PRICE_ENGINE).amount_columns
+
+# --- Category Matching ---
+def _trie_pattern(node):
+    """Turns a character trie into a regex that prefers the longest keyword at a position."""
+    branches = [re.escape(char) + _trie_pattern(child) for char, child in sorted(node.items()) if char]
+    if not branches:
+        return ''
+    is_keyword_end = '' in node
+    if len(branches) == 1 and not is_keyword_end:
+        return branches[0]
+    pattern = '(?:' + '|'.join(branches) + ')'
+    return pattern + '?' if is_keyword_end else pattern
+
+class CategoryMatcher:
+    """Keyword matcher compiled once from a {category: [keywords]} mapping.
+
+    Titles are scanned once by a single trie-shaped regex that reports, at every
+    position, the longest keyword starting there; every shorter keyword matching at
+    the same position is one of its prefixes, so its categories are precomputed.
+    Tags are resolved through a lowercase keyword -> categories hash index.
+    """
+
+    def __init__(self, categories):
+        self.category_names = list(categories)
+        self.tag_index = {}
+        keyword_ranks = {}
+        self.always_matched = set()
+        for rank, keywords in enumerate(categories.values()):
+            for keyword in keywords:
+                keyword = keyword.lower()
+                keyword_ranks.setdefault(keyword, set()).add(rank)
+                tag_ranks = self.tag_index.setdefault(keyword, [])
+                if rank not in tag_ranks:
+                    tag_ranks.append(rank)
+                if not keyword:
+                    # An empty keyword is a substring of every title
+                    self.always_matched.add(rank)
+
+        trie = {}
+        for keyword in keyword_ranks:
+            if keyword:
+                node = trie
+                for char in keyword:
+                    node = node.setdefault(char, {})
+                node[''] = True
+        self.pattern = re.compile('(?=(' + _trie_pattern(trie) + '))') if trie else None
+
+        # Categories of a keyword and of every shorter keyword that is its prefix
+        self.keyword_ranks = {}
+        for keyword in keyword_ranks:
+            ranks = set()
+            for end in range(1, len(keyword) + 1):
+                ranks.update(keyword_ranks.get(keyword[:end], ()))
+            self.keyword_ranks[keyword] = ranks
+
+    def _combine(self, matched_keywords, shopify_tags):
+        ranks = set(self.always_matched)
+        for keyword in matched_keywords:
+            ranks.update(self.keyword_ranks[keyword])
+        inferred_categories = [self.category_names[rank] for rank in sorted(ranks)]
+
+        for tag in shopify_tags:
+            for rank in self.tag_index.get(tag.lower(), ()):
+                if self.category_names[rank] not in inferred_categories:
+                    inferred_categories.append(self.category_names[rank])
+
+        if not inferred_categories:
+            return ["General"]
+        return list(set(inferred_categories))
+
+    def infer(self, title, shopify_tags):
+        """Returns the categories for one title and its list of Shopify tags."""
+        matched_keywords = set(self.pattern.findall(title.lower())) if self.pattern else ()
+        return self._combine(matched_keywords, shopify_tags)
+
+    def infer_many(self, titles, tags):
+        """Vectorized infer(): takes a Series of titles and a Series of raw Tags cells."""
+        if self.pattern:
+            matched_keywords = titles.str.lower().str.findall(self.pattern)
+        else:
+            matched_keywords = pd.Series([()] * len(titles), index=titles.index)
+        return pd.Series(
+            [self._combine(set(keywords), split_shopify_tags(raw_tags)) for keywords, raw_tags in zip(matched_keywords, tags)],
+            index=titles.index,
+            dtype=object,
+        )
+
+CATEGORY_MATCHER = CategoryMatcher(CATEGORIES)
+
+# --- HTML Parsing ---
+# Mirror BeautifulSoup's html.parser tree builder: void tags are closed as soon as they
+# open, and text inside script/style/template/rt/rp is left out of get_text().
+_HTML_TREE_BUILDER = HTMLParserTreeBuilder()
+HTML_VOID_ELEMENTS = frozenset(_HTML_TREE_BUILDER.empty_element_tags)
+HTML_HIDDEN_TEXT_TAGS = frozenset(_HTML_TREE_BUILDER.string_containers)
+
+class HTMLContentExtractor(HTMLParser):
+    """Streams HTML once, collecting the visible text and every <img src> URL.
+
+    Text is split into strings at the same boundaries BeautifulSoup uses, so
+    ' '.join(text_parts) matches soup.get_text(separator=' ', strip=True) after
+    script and style tags have been removed, without building a tree.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.text_parts = []
+        self.image_urls = []
+        self._pending_data = []
+        self._open_tags = []
+        self._hidden_depth = 0
+        self._already_closed_void_tags = []
+
+    def _end_data(self, is_cdata=False):
+        if not self._pending_data:
+            return
+        text = ''.join(self._pending_data).strip()
+        self._pending_data = []
+        if text and (is_cdata or not self._hidden_depth):
+            self.text_parts.append(text)
+
+    def _pop_to_tag(self, tag):
+        if tag not in self._open_tags:
+            return
+        idx = len(self._open_tags) - 1 - self._open_tags[::-1].index(tag)
+        self._hidden_depth -= sum(1 for name in self._open_tags[idx:] if name in HTML_HIDDEN_TEXT_TAGS)
+        del self._open_tags[idx:]
+
+    def handle_starttag(self, tag, attrs, handle_void_element=True):
+        self._end_data()
+        if tag == 'img':
+            src = None
+            for name, value in attrs:
+                if name == 'src':
+                    # Later duplicates win and a bare "src" counts as "", as in BeautifulSoup
+                    src = value if value is not None else ''
+            if src is not None:
+                self.image_urls.append(src)
+        if tag in HTML_VOID_ELEMENTS and handle_void_element:
+            self._already_closed_void_tags.append(tag)
+            return
+        self._open_tags.append(tag)
+        if tag in HTML_HIDDEN_TEXT_TAGS:
+            self._hidden_depth += 1
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs, handle_void_element=False)
+        self.handle_endtag(tag, check_already_closed=False)
+
+    def handle_endtag(self, tag, check_already_closed=True):
+        if check_already_closed and tag in self._already_closed_void_tags:
+            # A redundant </br>-style end tag; BeautifulSoup ignores it without ending the text run
+            self._already_closed_void_tags.remove(tag)
+            return
+        self._end_data()
+        self._pop_to_tag(tag)
+
+    def handle_data(self, data):
+        self._pending_data.append(data)
+
+    def handle_entityref(self, name):
+        character = EntitySubstitution.HTML_ENTITY_TO_CHARACTER.get(name)
+        self._pending_data.append(character if character is not None else f'&{name}')
+
+    def handle_charref(self, name):
+        base = 16 if name[:1] in ('x', 'X') else 10
+        digits = name[1:] if base == 16 else name
+        try:
+            character, _ = UnicodeDammit.numeric_character_reference(int(digits, base))
+        except ValueError:
+            character = name
+        self._pending_data.append(character)
+
+    def unknown_decl(self, data):
+        self._end_data()
+        if data.upper().startswith('CDATA['):
+            self._pending_data.append(data[len('CDATA['):])
+            self._end_data(is_cdata=True)
+
+    def handle_comment(self, data):
+        self._end_data()
+
+    def handle_decl(self, decl):
+        self._end_data()
+
+    def handle_pi(self, data):
+        self._end_data()
+
+    def close(self):
+        super().close()
+        self._end_data()
+
+# --- HTML Content Cache ---
+class HtmlContentCache:
+    """SQLite cache of extract_html_content results, keyed by a hash of the HTML.
+
+    Keys include HTML_CLEANER_VERSION, so changing the extractor invalidates old
+    entries. Once the stored text and image lists exceed max_bytes, the least
+    recently used entries are evicted. hits/misses count distinct bodies looked up.
+
+    With read_only=True (the worker processes of the multi-store mode), the file is
+    only read: new entries and the keys looked up collect in pending_rows and
+    used_keys, for the process owning the cache to write_back() once the workers are
+    done, so that no two processes write the SQLite file at the same time.
+    """
+
+    def __init__(self, path, max_bytes=DEFAULT_HTML_CACHE_BYTES, read_only=False):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.read_only = read_only
+        self.hits = 0
+        self.misses = 0
+        self.pending_rows = []
+        self.used_keys = set()
+        if read_only:
+            self.connection = sqlite3.connect(f'file:{pathname2url(os.path.abspath(path))}?mode=ro', uri=True)
+            return
+        self.connection = sqlite3.connect(path)
+        with self.connection:
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS html_content ('
+                'key TEXT PRIMARY KEY, text TEXT NOT NULL, images TEXT NOT NULL, '
+                'size INTEGER NOT NULL, last_used INTEGER NOT NULL)'
+            )
+            self.connection.execute('CREATE INDEX IF NOT EXISTS html_content_last_used ON html_content (last_used)')
+
+    @staticmethod
+    def key(html_content):
+        return hashlib.sha256(f'{HTML_CLEANER_VERSION}\0{html_content}'.encode('utf-8')).hexdigest()
+
+    def get_many(self, html_contents):
+        """Returns {html: (text, image URLs)} for those of the given HTML strings that are cached."""
+        html_by_key = {self.key(html): html for html in html_contents}
+        keys = list(html_by_key)
+        found = {}
+        for start in range(0, len(keys), SQLITE_BATCH_SIZE):
+            batch = keys[start:start + SQLITE_BATCH_SIZE]
+            placeholders = ','.join('?' * len(batch))
+            for key, text, images in self.connection.execute(f'SELECT key, text, images FROM html_content WHERE key IN ({placeholders})', batch):
+                found[key] = (text, json.loads(images))
+
+        if self.read_only:
+            self.used_keys.update(found)
+        else:
+            self._touch(found)
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return {html_by_key[key]: content for key, content in found.items()}
+
+    def put_many(self, html_contents):
+        """Stores {html: (text, image URLs)} and evicts least recently used entries over the size limit."""
+        now = time.time_ns()
+        rows = []
+        for html, (text, image_urls) in html_contents.items():
+            images = json.dumps(image_urls)
+            rows.append((self.key(html), text, images, len(text.encode('utf-8')) + len(images.encode('utf-8')), now))
+        if self.read_only:
+            self.pending_rows.extend(rows)
+            return
+        with self.connection:
+            self.connection.executemany('INSERT OR REPLACE INTO html_content VALUES (?, ?, ?, ?, ?)', rows)
+            self._evict()
+
+    def write_back(self, pending_rows, used_keys):
+        """Stores the entries and last-used times a read_only copy of this cache collected."""
+        self._touch(used_keys)
+        with self.connection:
+            self.connection.executemany('INSERT OR REPLACE INTO html_content VALUES (?, ?, ?, ?, ?)', pending_rows)
+            self._evict()
+
+    def _touch(self, keys):
+        now = time.time_ns()
+        with self.connection:
+            self.connection.executemany('UPDATE html_content SET last_used = ? WHERE key = ?', [(now, key) for key in keys])
+
+    def _evict(self):
+        total_bytes = self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM html_content').fetchone()[0]
+        if total_bytes <= self.max_bytes:
+            return
+        bytes_to_free = total_bytes - self.max_bytes
+        evicted = []
+        for key, size in self.connection.execute('SELECT key, size FROM html_content ORDER BY last_used'):
+            evicted.append((key,))
+            bytes_to_free -= size
+            if bytes_to_free <= 0:
+                break
+        self.connection.executemany('DELETE FROM html_content WHERE key = ?', evicted)
+
+    def close(self):
+        self.connection.close()
+
+# --- Run Instrumentation ---
+def current_rss_mb():
+    """Resident set size of this process, from /proc on Linux (falls back to the peak elsewhere)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return peak_rss_mb()
+
+def peak_rss_mb():
+    if resource is None:
+        return 0.0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 # KiB on Linux
+
+class RunReport:
+    """Records the wall time, CPU time, rows and memory of each stage of a run, and the slowest handles.
+
+    A stage run several times (e.g. once per chunk) is accumulated under its name.
+    CPU time and RSS are those of the main process; work done on --workers
+    processes shows up as wall time only.
+    """
+
+    def __init__(self, slowest_handles=DEFAULT_SLOWEST_HANDLES):
+        self.stages = {}
+        self.slowest_handles = slowest_handles
+        self.handle_seconds = [] # Min-heap of the slowest (seconds, handle) pairs seen so far
+        self.started_wall = time.perf_counter()
+        self.started_cpu = time.process_time()
+
+    @contextmanager
+    def stage(self, name, rows=0):
+        rss_before, peak_before = current_rss_mb(), peak_rss_mb()
+        wall_before, cpu_before = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            stats = self.stages.setdefault(name, {'name': name, 'calls': 0, 'rows': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'rss_delta_mb': 0.0, 'peak_rss_growth_mb': 0.0, 'peak_rss_mb': 0.0})
+            stats['calls'] += 1
+            stats['rows'] += rows
+            stats['wall_seconds'] += time.perf_counter() - wall_before
+            stats['cpu_seconds'] += time.process_time() - cpu_before
+            stats['rss_delta_mb'] += current_rss_mb() - rss_before
+            stats['peak_rss_growth_mb'] += peak_rss_mb() - peak_before
+            stats['peak_rss_mb'] = max(stats['peak_rss_mb'], peak_rss_mb())
+
+    def count_rows(self, name, rows):
+        """Adds rows to a finished stage, for stages whose row count is only known afterwards."""
+        self.stages[name]['rows'] += rows
+
+    def record_handles(self, handles, seconds):
+        for handle, handle_seconds in zip(handles, seconds):
+            if len(self.handle_seconds) < self.slowest_handles:
+                heapq.heappush(self.handle_seconds, (handle_seconds, handle))
+            elif self.slowest_handles and handle_seconds > self.handle_seconds[0][0]:
+                heapq.heapreplace(self.handle_seconds, (handle_seconds, handle))
+
+    def to_dict(self, **run_info):
+        return {
+            **run_info,
+            'total': {
+                'wall_seconds': time.perf_counter() - self.started_wall,
+                'cpu_seconds': time.process_time() - self.started_cpu,
+                'peak_rss_mb': peak_rss_mb(),
+            },
+            'stages': list(self.stages.values()),
+            'slowest_handles': [{'handle': handle, 'seconds': seconds} for seconds, handle in sorted(self.handle_seconds, reverse=True)],
+        }
+
+    def write(self, path, **run_info):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(**run_info), f, indent=2)
+
+def run_stage(run_report, name, rows=0):
+    """run_report.stage(name, rows), or a no-op context when no report is being recorded."""
+    return run_report.stage(name, rows) if run_report is not None else nullcontext()
+
+def timed_call(function, argument):
+    """Returns (function(argument), seconds taken); picklable with partial for worker processes."""
+    start = time.perf_counter()
+    result = function(argument)
+    return result, time.perf_counter() - start
+
+# --- Helper Functions ---
+def extract_html_content(html_content):
+    """Parses HTML once and returns its cleaned text and the list of image URLs it embeds."""
+    if pd.isna(html_content) or not isinstance(html_content, str):
+        return "", []
+    extractor = HTMLContentExtractor()
+    extractor.feed(html_content)
+    extractor.close()
+    return ' '.join(extractor.text_parts), extractor.image_urls
+
+def clean_html(html_content):
+    """Strips HTML tags from a string."""
+    return extract_html_content(html_content)[0]
+
+def extract_image_urls_from_html(html_content):
+    """Extracts image URLs from HTML content."""
+    return extract_html_content(html_content)[1]
+
+def split_shopify_tags(tags):
+    """Splits a Shopify comma-separated Tags cell into a list of stripped, non-empty tags."""
+    return [tag.strip() for tag in tags.split(',') if tag.strip()] if tags else []
+
+def infer_category(title, shopify_tags):
+    """Infers Medusa categories based on product title and existing Shopify tags."""
+    return CATEGORY_MATCHER.infer(title, shopify_tags)
+
+def worker_pool(workers, executor=None):
+    """Context for the executor the per-product transforms run on: executor when one is
+    given (it is left open), else a new pool of workers processes, or None for one worker."""
+    if executor is not None or workers <= 1:
+        return nullcontext(executor)
+    return ProcessPoolExecutor(max_workers=workers)
+
+def extract_html_contents(bodies, executor=None, html_cache=None, parse_seconds=None):
+    """Returns {body: (text, image URLs)} for every distinct non-empty HTML body.
+
+    Each body is parsed at most once per run, and not at all when the cache already
+    holds it. Parsing runs on the executor's workers when one is given. When a
+    parse_seconds dict is given, it receives the parsing time of each parsed body.
+    """
+    unique_bodies = [body for body in dict.fromkeys(bodies) if isinstance(body, str) and body]
+    html_contents = html_cache.get_many(unique_bodies) if html_cache is not None else {}
+    bodies_to_parse = [body for body in unique_bodies if body not in html_contents]
+
+    timed_extract = partial(timed_call, extract_html_content)
+    if executor is not None:
+        results = executor.map(timed_extract, bodies_to_parse, chunksize=PRODUCTS_PER_WORKER_TASK)
+    else:
+        results = map(timed_extract, bodies_to_parse)
+    parsed = {}
+    for body, (html_content, seconds) in zip(bodies_to_parse, results):
+        parsed[body] = html_content
+        if parse_seconds is not None:
+            parse_seconds[body] = seconds
+
+    if html_cache is not None and parsed:
+        html_cache.put_many(parsed)
+    html_contents.update(parsed)
+    return html_contents
+
+def group_rows_by_handle(handles):
+    """Returns the unique handles in order of first appearance and the row positions of each one."""
+    codes, unique_handles = pd.factorize(handles)
+    if not len(unique_handles):
+        return unique_handles, []
+    order = np.argsort(codes, kind='stable')
+    boundaries = np.cumsum(np.bincount(codes, minlength=len(unique_handles)))[:-1]
+    return unique_handles, np.split(order, boundaries)
+
+def build_product_payloads(df, row_positions, categories, html_contents):
+    """Packs the inputs of each product into a compact tuple of plain Python values.
+
+    Payloads are what worker processes receive, so they only carry the cells the
+    product transforms read instead of a DataFrame slice. The body HTML is already
+    reduced to its (text, image URLs) by extract_html_contents.
+    """
+    columns = {col: df[col].to_numpy() for col in ['Body (HTML)', 'Image Src', 'Variant Image']}
+    for positions, inferred_categories in zip(row_positions, categories):
+        first_row = positions[0]
+        yield (
+            html_contents.get(columns['Body (HTML)'][first_row], ("", [])),
+            columns['Image Src'][first_row],
+            columns['Variant Image'][positions].tolist(),
+            inferred_categories,
+        )
+
+def process_product_payload(payload):
+    """Builds the product-level Medusa description, category and image fields for one product."""
+    html_content, image_src, variant_images, inferred_categories = payload
+
+    cleaned_description, description_images = html_content
+
+    all_images = []
+    if image_src:
+        all_images.append(image_src)
+    all_images.extend(description_images)
+    all_images.extend(image for image in variant_images if image)
+    all_images = list(set(all_images))
+
+    return {
+        'Medusa_Description': cleaned_description,
+        'Medusa_Categories': ', '.join(inferred_categories),
+        'Medusa_Images': ', '.join(all_images),
+    }
+
+def split_output_path(path):
+    """Splits path into (stem, extension, compression extension), e.g. ('out', '.csv', '.gz') for out.csv.gz."""
+    base, compression = os.path.splitext(path)
+    if compression not in COMPRESSION_EXTENSIONS:
+        base, compression = path, ''
+    stem, extension = os.path.splitext(base)
+    return stem, extension, compression
+
+def open_text_stream(path, mode='r'):
+    """Opens path as one UTF-8 text stream, compressed or decompressed on the fly by its extension."""
+    compression = COMPRESSION_EXTENSIONS.get(split_output_path(path)[2])
+    if compression == 'gzip':
+        stream = gzip.GzipFile(path, mode + 'b', compresslevel=GZIP_LEVEL, mtime=0)
+    elif compression == 'bz2':
+        stream = bz2.BZ2File(path, mode + 'b')
+    elif compression == 'zstd':
+        stream = zstandard.open(path, mode + 'b', cctx=zstandard.ZstdCompressor(level=ZSTD_LEVEL) if 'w' in mode else None)
+    else:
+        return open(path, mode, encoding='utf-8', newline='')
+    return io.TextIOWrapper(stream, encoding='utf-8', newline='')
+
+def write_csv(df, path):
+    with open_text_stream(path, 'w') as f:
+        df.to_csv(f, index=False)
+
+def file_bytes(paths):
+    """Total size on disk of those of paths that exist."""
+    return sum(os.path.getsize(path) for path in paths if os.path.exists(path))
+
+def text_values(df, col):
+    """The column as an object array of strings, with '' for missing values."""
+    return df[col].astype(object).where(df[col].notna(), '').to_numpy(dtype=object)
+
+def encode_json_strings(values):
+    """JSON-encodes an array of strings, calling the encoder once per distinct value."""
+    codes, uniques = pd.factorize(values)
+    encoded = np.array([json.dumps(value) for value in uniques] + [''], dtype=object)
+    return encoded[codes]
+
+def build_option_columns(df, row_positions):
+    """Builds the Medusa_Product_Options of every product and the Medusa_Variant_Options of every row.
+
+    Each product's option names come from its first row; a name repeated across
+    Option1..3 keeps its first position and reads the values of its last column.
+    The JSON is assembled from per-value encodings with whole-column operations,
+    producing exactly what json.dumps gives for the equivalent dicts and lists.
+    """
+    if not row_positions:
+        return np.empty(0, dtype=object), np.empty(0, dtype=object)
+    n_rows = len(df)
+    n_products = len(row_positions)
+    product_codes = np.empty(n_rows, dtype=np.intp)
+    product_codes[np.concatenate(row_positions)] = np.repeat(np.arange(n_products), [len(positions) for positions in row_positions])
+
+    # Resolve the option slots once per distinct combination of option names
+    first_rows = [positions[0] for positions in row_positions]
+    option_names = [df[col].to_numpy(dtype=object)[first_rows] for col in SHOPIFY_OPTION_NAMES]
+    combo_codes, combos = pd.factorize(pd.Series(list(zip(*option_names)), dtype=object))
+    slot_count = len(SHOPIFY_OPTION_NAMES)
+    slot_sources = np.full((len(combos), slot_count), -1, dtype=np.intp)
+    slot_names = np.full((len(combos), slot_count), '', dtype=object)
+    for c, combo in enumerate(combos):
+        option_names_map = {}
+        for i, option_name in enumerate(combo):
+            if option_name:
+                option_names_map[option_name] = i
+        for k, (option_name, i) in enumerate(option_names_map.items()):
+            slot_sources[c, k] = i
+            slot_names[c, k] = json.dumps(option_name)
+
+    row_combos = combo_codes[product_codes]
+    rows = np.arange(n_rows)
+    option_values = np.column_stack([df[col].to_numpy(dtype=object) for col in SHOPIFY_OPTION_VALUES])
+    encoded_values = encode_json_strings(option_values.ravel()).reshape(option_values.shape)
+
+    variant_options = np.full(n_rows, '', dtype=object)
+    entries = []
+    for k in range(slot_count):
+        sources = slot_sources[row_combos, k]
+        source_columns = np.where(sources >= 0, sources, 0)
+        values = option_values[rows, source_columns]
+        valid = (sources >= 0) & (values != '')
+        fragments = slot_names[row_combos, k] + ': ' + encoded_values[rows, source_columns]
+        separators = np.where(variant_options == '', '', ', ')
+        variant_options = np.where(valid, variant_options + separators + fragments, variant_options)
+        entries.append((product_codes[valid], np.full(valid.sum(), k), values[valid], encoded_values[rows, source_columns][valid]))
+    variant_options = '{' + variant_options + '}'
+
+    # Sort the distinct values of each (product, slot) like sorted() and join them per product
+    entry_products, entry_slots, entry_values, entry_encoded = (np.concatenate(parts) for parts in zip(*entries))
+    value_codes, unique_values = pd.factorize(entry_values)
+    value_ranks = np.empty(len(unique_values), dtype=np.intp)
+    value_ranks[sorted(range(len(unique_values)), key=list(unique_values).__getitem__)] = np.arange(len(unique_values))
+    value_codes = value_ranks[value_codes]
+    order = np.lexsort((value_codes, entry_slots, entry_products))
+    keys = np.column_stack([entry_products, entry_slots, value_codes])[order]
+    distinct = np.ones(len(keys), dtype=bool)
+    distinct[1:] = (keys[1:] != keys[:-1]).any(axis=1)
+    keys, entry_encoded = keys[distinct], entry_encoded[order][distinct]
+
+    group_starts = np.flatnonzero(np.r_[True, (keys[1:, :2] != keys[:-1, :2]).any(axis=1)]) if len(keys) else np.empty(0, dtype=np.intp)
+    group_products = keys[group_starts, 0]
+    group_names = slot_names[combo_codes[group_products], keys[group_starts, 1]]
+    group_options = [
+        '{"name": ' + name + ', "values": [' + ', '.join(values) + ']}'
+        for name, values in zip(group_names, np.split(entry_encoded, group_starts[1:]))
+    ]
+    product_options = np.full(n_products, '[]', dtype=object)
+    product_starts = np.flatnonzero(np.r_[True, group_products[1:] != group_products[:-1]]) if len(group_products) else group_starts
+    for product, options in zip(group_products[product_starts], np.split(np.array(group_options, dtype=object), product_starts[1:])):
+        product_options[product] = '[' + ', '.join(options) + ']'
+
+    return product_options, variant_options
+
+# --- Collision Detection ---
+def slugify_handles(handles):
+    """Vectorized port of slugifyString in seed-from-shopify.ts: the handle a product is seeded with."""
+    slugs = pd.Series(handles, dtype=object).fillna('').astype(str).str.normalize('NFD')
+    slugs = slugs.str.replace('[\u0300-\u036f]', '', regex=True) # Diacritics, e.g. "café" -> "cafe"
+    slugs = slugs.str.lower().str.strip()
+    slugs = slugs.str.replace(r'\s+', '-', regex=True)
+    slugs = slugs.str.replace(r'[^A-Za-z0-9_-]+', '', regex=True) # JavaScript's \w is ASCII only
+    slugs = slugs.str.replace(r'--+', '-', regex=True).str.replace(r'^-+|-+$', '', regex=True)
+    return slugs.to_numpy(dtype=object)
+
+class CollisionIndex:
+    """Hash indexes over Variant SKU, Variant Barcode and slugified Handle, fed the export in row order.
+
+    check() indexes a frame of consecutive export rows (the whole export or the next
+    chunk) and records every value seen on more than one row, and every slug shared
+    by different handles, with their row numbers (1-based, header excluded). Each
+    key is hashed once per row, so a run stays O(N).
+
+    With fix=True, check() also disambiguates deterministically: the first row keeps
+    its value, later duplicate SKUs get the first free "-2", "-3", ... suffix, later
+    duplicate barcodes are cleared, and later handles colliding with an earlier
+    slug are renamed to the first free "<slug>-2", "<slug>-3", ...
+
+    A suffix is free if no earlier row and no row of the current frame holds it, and a
+    generated value is indexed like a real one, so the fixed SKUs and slugs are always
+    unique. Rows of later chunks are not known yet, though: when a later chunk holds a
+    value already generated for an earlier row, that later row is the one suffixed
+    again ("tee-2" -> "tee-2-2"). So the fixed values of chunked runs can depend on the
+    chunk size; the whole export in one frame gives the fewest renames.
+    """
+
+    def __init__(self, fix=False):
+        self.fix = fix
+        self.rows_seen = 0
+        self.first_rows = {'sku': {}, 'barcode': {}} # value -> first row
+        self.value_collisions = {'sku': {}, 'barcode': {}} # value -> every row holding it
+        self.slug_handles = {} # slug -> {handle: first row} for every handle seeded under it
+        self.renamed_handles = {} # handle -> disambiguated handle
+        self.fixes = {'sku': 0, 'barcode': 0, 'handle': 0}
+
+    def check(self, df):
+        row_numbers = np.arange(self.rows_seen + 1, self.rows_seen + len(df) + 1)
+        self.rows_seen += len(df)
+        for key, col in [('sku', 'Variant SKU'), ('barcode', 'Variant Barcode')]:
+            if col in df.columns:
+                df = self._check_values(df, key, col, row_numbers)
+        if 'Handle' in df.columns:
+            df = self._check_handles(df, row_numbers)
+        return df
+
+    def _check_values(self, df, key, col, row_numbers):
+        values = text_values(df, col)
+        codes, uniques = pd.factorize(values)
+        first_rows, collisions = self.first_rows[key], self.value_collisions[key]
+
+        # A value collides if an earlier frame holds it or it appears twice in this one
+        seen_before = np.fromiter((value in first_rows for value in uniques), dtype=bool, count=len(uniques))
+        colliding = ((np.bincount(codes, minlength=len(uniques)) > 1) | seen_before) & (uniques != '')
+
+        fixed_positions, fixed_values = [], []
+        frame_values = set(uniques) if self.fix and key == 'sku' and colliding.any() else None
+        for position in np.flatnonzero(colliding[codes]):
+            value, row = values[position], int(row_numbers[position])
+            first_row = first_rows.setdefault(value, row)
+            if first_row == row:
+                collisions.setdefault(value, []).append(row)
+                continue
+            collisions.setdefault(value, [first_row]).append(row)
+            if self.fix:
+                fixed_positions.append(position)
+                fixed_values.append(self._free_sku(value, row, frame_values) if key == 'sku' else None)
+                self.fixes[key] += 1
+
+        # Index the values that collide with nothing (yet) in one bulk update
+        unique_rows = row_numbers[np.unique(codes, return_index=True)[1]]
+        indexed = ~colliding & (uniques != '')
+        first_rows.update(zip(uniques[indexed], unique_rows[indexed].tolist()))
+
+        if fixed_positions:
+            column = df[col].copy()
+            column.iloc[fixed_positions] = fixed_values
+            df = df.assign(**{col: column})
+        return df
+
+    def _free_sku(self, value, row, frame_values):
+        """The first "<value>-N" (N >= 2) held by no earlier row and no row of the current frame."""
+        first_rows = self.first_rows['sku']
+        suffix = 2
+        while f'{value}-{suffix}' in first_rows or f'{value}-{suffix}' in frame_values:
+            suffix += 1
+        first_rows[f'{value}-{suffix}'] = row
+        return f'{value}-{suffix}'
+
+    def _check_handles(self, df, row_numbers):
+        handles = text_values(df, 'Handle')
+        codes, unique_handles = pd.factorize(handles)
+        first_positions = np.full(len(unique_handles), len(handles), dtype=np.intp)
+        np.minimum.at(first_positions, codes, np.arange(len(handles)))
+        slugs = slugify_handles(unique_handles)
+        frame_slugs = set(slugs)
+        renames = {}
+        for handle, slug, position in zip(unique_handles, slugs, first_positions):
+            if not slug or handle in self.renamed_handles:
+                continue
+            seeded = self.slug_handles.setdefault(slug, {})
+            if handle in seeded:
+                continue
+            seeded[handle] = int(row_numbers[position])
+            if len(seeded) > 1 and self.fix:
+                suffix = 2
+                while f'{slug}-{suffix}' in self.slug_handles or f'{slug}-{suffix}' in frame_slugs:
+                    suffix += 1
+                # Seeded under its new slug, so a later handle with that slug still collides with it
+                self.renamed_handles[handle] = f'{slug}-{suffix}'
+                self.slug_handles[f'{slug}-{suffix}'] = {handle: seeded[handle]}
+                self.fixes['handle'] += 1
+            if handle in self.renamed_handles:
+                renames[handle] = self.renamed_handles[handle]
+        # Rows of a handle renamed in an earlier chunk are renamed too
+        renames.update({handle: self.renamed_handles[handle] for handle in unique_handles if handle in self.renamed_handles})
+        if renames:
+            df = df.copy()
+            df['Handle'] = df['Handle'].replace(renames)
+        return df
+
+    def report(self):
+        """Every collision group, as plain JSON values."""
+        return {
+            'rows_checked': self.rows_seen,
+            'sku': [{'value': value, 'rows': rows} for value, rows in self.value_collisions['sku'].items()],
+            'barcode': [{'value': value, 'rows': rows} for value, rows in self.value_collisions['barcode'].items()],
+            'handle': [
+                {'slug': slug, 'handles': list(handles), 'rows': list(handles.values())}
+                for slug, handles in self.slug_handles.items() if len(handles) > 1
+            ],
+            'fixed': self.fixes if self.fix else None,
+            'renamed_handles': self.renamed_handles,
+        }
+
+def report_collisions(collision_index, report_path=None):
+    """Prints a summary of the collisions found and, given a report_path, writes every group to it, if there were any."""
+    report = collision_index.report()
+    if not (report['sku'] or report['barcode'] or report['handle']):
+        return
+    if report_path is not None:
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    see = f" (see {report_path})" if report_path is not None else ""
+    print(f"\nCollisions: {len(report['sku'])} duplicate SKUs, {len(report['barcode'])} duplicate barcodes, {len(report['handle'])} handles sharing a slug{see}")
+    if report['fixed'] is not None:
+        fixed = report['fixed']
+        print(f"Fixed {fixed['sku']} SKUs, {fixed['barcode']} barcodes and {fixed['handle']} handles")
+    else:
+        print("Run with --fix-collisions to disambiguate them")
+
+# --- Option Validation ---
+def trimmed_option_values(df):
+    """The Option1..3 Value cells of df, raw and trimmed like the seeder reads them, as two (rows, 3) arrays."""
+    raw_values = np.column_stack([text_values(df, col) for col in SHOPIFY_OPTION_VALUES])
+    values = pd.Series(raw_values.ravel(), dtype=object).str.strip().to_numpy(dtype=object).reshape(raw_values.shape)
+    return raw_values, values
+
+def has_option_values(values):
+    """Marks the rows of a trimmed option value array holding any value; Shopify's image-only rows hold none."""
+    return (values != '').any(axis=1)
+
+class OptionValidator:
+    """Pre-flight check that every variant row fits its product's options, before anything is written.
+
+    The seeder builds each product's options from its first row, trimming names and
+    values, and falls back to the first allowed value, one warning per row, for any
+    variant whose value is blank or not among them. check() finds those rows up front
+    with whole-column operations, giving each the first OPTION_REJECT_REASONS that
+    applies: rows without any option value (image-only rows), a blank value for an
+    option the product declares, a value for an option it does not declare, an option
+    name with surrounding whitespace (the seeder trims it and then finds no value
+    under it), a repeat of an earlier variant's (trimmed) option combination, a
+    product with more than max_variants variants, and every row of a product whose
+    first row is rejected.
+
+    With drop=True, filter() removes the rejected rows from the converted output.
+    """
+
+    def __init__(self, max_variants=MAX_VARIANTS_PER_PRODUCT, drop=False):
+        self.max_variants = max_variants
+        self.drop = drop
+        self.rows_seen = 0
+        self.reason_counts = dict.fromkeys(OPTION_REJECT_REASONS, 0)
+        self.rejects = [] # one frame of rejected rows per checked frame
+
+    def check(self, df):
+        """Returns a boolean array marking the rows of df (whole products) that pass every check."""
+        row_numbers = np.arange(self.rows_seen + 1, self.rows_seen + len(df) + 1)
+        self.rows_seen += len(df)
+        handles = text_values(df, 'Handle')
+        product_codes, unique_handles = pd.factorize(handles)
+        first_positions = np.unique(product_codes, return_index=True)[1]
+        names = np.column_stack([text_values(df, col)[first_positions][product_codes] for col in SHOPIFY_OPTION_NAMES])
+        raw_values, values = trimmed_option_values(df)
+        stripped_names = pd.Series(names.ravel(), dtype=object).str.strip().to_numpy(dtype=object).reshape(names.shape)
+        labels = np.where(names != '', names, np.array(SHOPIFY_OPTION_VALUES, dtype=object))
+        details = labels + ': ' + encode_json_strings(raw_values.ravel()).reshape(raw_values.shape)
+        name_details = np.array(SHOPIFY_OPTION_NAMES, dtype=object) + ': ' + encode_json_strings(names.ravel()).reshape(names.shape)
+
+        reasons = np.full(len(df), '', dtype=object)
+        reason_details = np.full(len(df), '', dtype=object)
+        def flag(reason, rows, row_details):
+            new = rows & (reasons == '')
+            reasons[new] = reason
+            reason_details[new] = row_details[new]
+
+        # Per-slot checks report the first offending option of the row
+        has_values = has_option_values(values)
+        flag('no_option_values', ~has_values, np.full(len(df), '', dtype=object))
+        for reason, slots, slot_details in [
+            ('missing_value', has_values[:, None] & (names != '') & (values == ''), details),
+            ('unexpected_value', (values != '') & (names == ''), details),
+            ('untrimmed_name', has_values[:, None] & (names != stripped_names), name_details),
+        ]:
+            flag(reason, slots.any(axis=1), slot_details[np.arange(len(df)), slots.argmax(axis=1)])
+
+        # Repeats of an option combination already taken by an earlier variant of the product
+        candidates = np.flatnonzero(reasons == '')
+        combos = pd.DataFrame(values[candidates]).assign(product=product_codes[candidates])
+        combo_codes = combos.groupby(list(combos.columns), sort=False).ngroup().to_numpy()
+        first_combo_rows = np.full(combo_codes.max(initial=-1) + 1, len(df), dtype=np.intp)
+        np.minimum.at(first_combo_rows, combo_codes, candidates)
+        duplicates = np.zeros(len(df), dtype=bool)
+        duplicates[candidates] = first_combo_rows[combo_codes] != candidates
+        combo_details = np.full(len(df), '', dtype=object)
+        combo_details[candidates] = 'same options as row ' + row_numbers[first_combo_rows[combo_codes]].astype(str).astype(object)
+        flag('duplicate_combination', duplicates, combo_details)
+
+        variant_counts = np.bincount(product_codes[reasons == ''], minlength=len(unique_handles))
+        flag('too_many_variants', variant_counts[product_codes] > self.max_variants, (variant_counts.astype(str).astype(object) + ' variants')[product_codes])
+
+        # The seeder takes a product's fields from its first row, so a product cannot lose it
+        first_rejected = reasons[first_positions] != ''
+        flag('product_rejected', first_rejected[product_codes], ('first row ' + row_numbers[first_positions].astype(str).astype(object) + ' rejected')[product_codes])
+
+        rejected = reasons != ''
+        for reason, count in zip(*np.unique(reasons[rejected], return_counts=True)):
+            self.reason_counts[reason] += int(count)
+        if rejected.any():
+            self.rejects.append(pd.DataFrame({
+                'Row': row_numbers[rejected],
+                'Handle': handles[rejected],
+                'Reason': reasons[rejected],
+                'Detail': reason_details[rejected],
+            }))
+        return ~rejected
+
+    def filter(self, output_df, keep):
+        """Drops the rejected rows from output_df (row-aligned with the checked frame) when drop is set."""
+        if not self.drop or keep.all():
+            return output_df
+        return output_df[keep]
+
+    def rejected_rows(self):
+        return sum(len(rejects_df) for rejects_df in self.rejects)
+
+    def write_rejects(self, path):
+        """Writes every rejected row to path as CSV and returns the number written (nothing is written for 0)."""
+        if not self.rejects:
+            return 0
+        rejects_df = pd.concat(self.rejects, ignore_index=True)
+        rejects_df.to_csv(path, index=False, encoding='utf-8')
+        return len(rejects_df)
+
+def report_option_rejects(option_validator, rejects_path=None):
+    """Prints a summary of the option checks and, given a rejects_path, writes the rejected rows to it, if there were any."""
+    rejected = option_validator.write_rejects(rejects_path) if rejects_path is not None else option_validator.rejected_rows()
+    if not rejected:
+        return
+    counts = ', '.join(f"{count} {reason}" for reason, count in option_validator.reason_counts.items() if count)
+    see = f"; see {rejects_path}" if rejects_path is not None else ""
+    print(f"\nOption validation: {rejected} rows the seeder would fall back on ({counts}{see})")
+    if option_validator.drop:
+        print("They were left out of the output")
+    else:
+        print("Run with --drop-option-rejects to leave them out of the output")
+
+# --- Near-Duplicate Detection ---
+def shingle_hashes(texts):
+    """Hashes the SHINGLE_WORDS-word shingles of each text, lowercased; a shorter text is one shingle.
+
+    Each word is hashed once and the hashes of a shingle's words are combined with
+    whole-array arithmetic, instead of building a string per shingle. Returns the
+    shingle hashes of all texts, in order, and the number of shingles of each text.
+    """
+    word_lists = [DUPLICATE_TOKEN_PATTERN.findall(text.lower()) for text in texts]
+    word_counts = np.array([len(words) for words in word_lists], dtype=np.intp)
+    word_hashes = pd.util.hash_array(np.array([word for words in word_lists for word in words], dtype=object))
+    owners = np.repeat(np.arange(len(texts)), word_counts)
+    text_ends = np.cumsum(word_counts)[owners]
+    positions = np.arange(len(word_hashes))
+
+    combined = np.zeros(len(word_hashes), dtype=np.uint64)
+    for offset in range(SHINGLE_WORDS):
+        following = positions + offset
+        in_text = following < text_ends
+        combined = combined * SHINGLE_MULTIPLIER + np.where(in_text, word_hashes[np.minimum(following, len(word_hashes) - 1)], np.uint64(0))
+    starts_shingle = (positions + SHINGLE_WORDS <= text_ends) | (positions == text_ends - word_counts[owners])
+    return combined[starts_shingle], np.bincount(owners[starts_shingle], minlength=len(texts))
+
+class DuplicateDetector:
+    """Finds products listed several times under different handles with slightly different wording.
+
+    add() takes converted output frames in export order and keeps a MinHash signature
+    of the shingles of each product's Title and Medusa_Description. clusters() buckets
+    the signatures by LSH band and only compares products sharing a bucket, each with
+    the first and the previous product of the bucket, so the work grows with the
+    catalog instead of its square. Pairs whose estimated Jaccard similarity reaches
+    threshold are duplicates, and duplicates of duplicates join the same cluster.
+    The first product of a cluster in export order is the one kept.
+    """
+
+    def __init__(self, threshold=DEFAULT_DUPLICATE_THRESHOLD, permutations=MINHASH_PERMUTATIONS, bands=LSH_BANDS):
+        if permutations % bands:
+            raise ValueError(f"{permutations} MinHash permutations cannot be split into {bands} equal bands")
+        self.threshold = threshold
+        self.bands = bands
+        # Permutation i maps a shingle hash h to the top 32 bits of a_i * h + b_i (mod 2^64), with a_i odd
+        random = np.random.default_rng(MINHASH_SEED)
+        self.multipliers = random.integers(0, 1 << 64, size=permutations, dtype=np.uint64) | np.uint64(1)
+        self.increments = random.integers(0, 1 << 64, size=permutations, dtype=np.uint64)
+        self.handles = []
+        self.signatures = []
+        self.products_without_text = 0
+        self._signature_matrix = None
+        self._clusters = None
+
+    def add(self, output_df):
+        first_rows = output_df.drop_duplicates('Handle')
+        handles = text_values(first_rows, 'Handle')
+        texts = (pd.Series(text_values(first_rows, 'Title'), dtype=object) + ' ' + pd.Series(text_values(first_rows, 'Medusa_Description'), dtype=object)).tolist()
+        for start in range(0, len(texts), MINHASH_BATCH_PRODUCTS):
+            hashes, shingle_counts = shingle_hashes(texts[start:start + MINHASH_BATCH_PRODUCTS])
+            has_text = shingle_counts > 0
+            self.products_without_text += int((~has_text).sum())
+            if has_text.any():
+                self.handles.extend(handles[start:start + MINHASH_BATCH_PRODUCTS][has_text])
+                self.signatures.append(self._signatures(hashes, shingle_counts[has_text]))
+        self._clusters = None
+
+    def _signatures(self, hashes, shingle_counts):
+        """One row of MINHASH_PERMUTATIONS minimum permuted hashes per product, from its shingle_counts hashes."""
+        offsets = np.concatenate([[0], np.cumsum(shingle_counts)])
+        signatures = np.empty((len(shingle_counts), len(self.multipliers)), dtype=np.uint32)
+        start = 0
+        while start < len(shingle_counts):
+            end = max(start + 1, np.searchsorted(offsets, offsets[start] + MINHASH_BATCH_SHINGLES, side='right') - 1)
+            permuted = np.multiply(hashes[offsets[start]:offsets[end], None], self.multipliers)
+            permuted += self.increments
+            # The top bits are monotonic in the full value, so the minimum is taken before shifting
+            signatures[start:end] = np.minimum.reduceat(permuted, offsets[start:end] - offsets[start], axis=0) >> np.uint64(32)
+            start = end
+        return signatures
+
+    def clusters(self):
+        """Lists the clusters of duplicate products, as sorted arrays of product numbers (see self.handles)."""
+        if self._clusters is not None:
+            return self._clusters
+        signatures = np.concatenate(self.signatures) if self.signatures else np.empty((0, len(self.multipliers)), dtype=np.uint32)
+        products = np.arange(len(signatures))
+
+        # Candidates: products whose signatures agree on every value of at least one band
+        candidate_pairs = []
+        for band in np.split(signatures, self.bands, axis=1):
+            buckets = pd.util.hash_pandas_object(pd.DataFrame(band), index=False).to_numpy()
+            bucket_codes, _ = pd.factorize(buckets)
+            order = np.argsort(bucket_codes, kind='stable')
+            first_products = order[np.unique(bucket_codes[order], return_index=True)[1]]
+            same_bucket = bucket_codes[order[1:]] == bucket_codes[order[:-1]]
+            candidate_pairs.append(np.column_stack([first_products[bucket_codes], products]))
+            candidate_pairs.append(np.column_stack([order[:-1][same_bucket], order[1:][same_bucket]]))
+        pairs = np.concatenate(candidate_pairs) if candidate_pairs else np.empty((0, 2), dtype=np.intp)
+        pairs = np.unique(np.sort(pairs[pairs[:, 0] != pairs[:, 1]], axis=1), axis=0)
+
+        # The share of equal MinHash values estimates the Jaccard similarity of the shingle sets
+        similarities = np.concatenate([
+            (signatures[batch[:, 0]] == signatures[batch[:, 1]]).mean(axis=1)
+            for batch in np.array_split(pairs, len(pairs) // MINHASH_BATCH_SHINGLES + 1)
+        ])
+        duplicate_pairs = pairs[similarities >= self.threshold]
+
+        parents = np.arange(len(signatures))
+        def find(product):
+            while parents[product] != product:
+                parents[product] = parents[parents[product]]
+                product = parents[product]
+            return product
+        for first, second in duplicate_pairs.tolist():
+            root, other = find(first), find(second)
+            if root != other:
+                parents[max(root, other)] = min(root, other)
+        roots = np.array([find(product) for product in products], dtype=np.intp)
+        cluster_roots, cluster_sizes = np.unique(roots, return_counts=True)
+        clustered = np.isin(roots, cluster_roots[cluster_sizes > 1])
+        _, member_positions = group_rows_by_handle(roots[clustered])
+        self._signature_matrix = signatures
+        self._clusters = [products[clustered][positions] for positions in member_positions]
+        return self._clusters
+
+    def duplicate_handles(self):
+        """The handles of every clustered product but the first of its cluster."""
+        return {self.handles[product] for cluster in self.clusters() for product in cluster[1:]}
+
+    def report(self):
+        """Every cluster, with each product's estimated similarity to the one kept, as plain JSON values."""
+        clusters = self.clusters()
+        return {
+            'threshold': self.threshold,
+            'permutations': len(self.multipliers),
+            'bands': self.bands,
+            'products_checked': len(self.handles),
+            'products_without_text': self.products_without_text,
+            'duplicates': sum(len(cluster) - 1 for cluster in clusters),
+            'clusters': [
+                {
+                    'keep': self.handles[cluster[0]],
+                    'duplicates': [
+                        {'handle': self.handles[product], 'similarity': round(float((self._signature_matrix[product] == self._signature_matrix[cluster[0]]).mean()), 3)}
+                        for product in cluster[1:]
+                    ],
+                }
+                for cluster in clusters
+            ],
+        }
+
+    def collapse(self, output_df):
+        """Drops the rows of every duplicate product from output_df, keeping the first of each cluster."""
+        duplicate_handles = self.duplicate_handles()
+        if not duplicate_handles:
+            return output_df
+        return output_df[~output_df['Handle'].isin(duplicate_handles)].reset_index(drop=True)
+
+def report_duplicates(duplicate_detector, report_path, collapsed=False):
+    """Prints a summary of the duplicate clusters found and writes them to report_path, if there were any."""
+    report = duplicate_detector.report()
+    if not report['clusters']:
+        return
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\nNear-duplicates: {len(report['clusters'])} clusters holding {report['duplicates']} duplicate products (similarity >= {report['threshold']}; see {report_path})")
+    if collapsed:
+        print("Only the first product of each cluster was kept")
+    else:
+        print("Run with --collapse-duplicates to keep only the first product of each cluster")
+
+# --- Main Processing Logic ---
+def compact_shopify_frame(df):
+    """Finishes a freshly read export frame: prices become integer cents (int32 when they
+    fit), and categoricals get an '' category so the transforms can fill blanks with it."""
+    for col in SHOPIFY_CATEGORICAL_COLUMNS:
+        if col in df.columns and '' not in df[col].cat.categories:
+            df[col] = df[col].cat.add_categories('')
+
+    for col in PRICE_COLUMNS:
+        if col in df.columns:
+            cents = np.rint(pd.to_numeric(df[col], errors='coerce').fillna(0.0).to_numpy() * PRICE_CENTS)
+            fits_int32 = np.abs(cents).max(initial=0) <= np.iinfo(np.int32).max
+            df[col] = cents.astype(np.int32 if fits_int32 else np.int64)
+    return df
+
+def frame_memory_mb(df):
+    return df.memory_usage(deep=True).sum() / (1024 * 1024)
+
+def report_export_memory(file_path, df):
+    """Prints the compact frame's footprint next to that of a plain read of every column."""
+    full_df = pd.read_csv(file_path, sep=',', quotechar='"', escapechar='\\', na_values=['']).fillna('')
+    print(f"Memory footprint of '{file_path}': {frame_memory_mb(full_df):.1f} MB with all {len(full_df.columns)} columns as read by default, "
+          f"{frame_memory_mb(df):.1f} MB with the {len(df.columns)} columns loaded and compact dtypes")
+
+def shopify_read_csv_options(extra_columns=()):
+    """SHOPIFY_READ_CSV_OPTIONS, also loading extra_columns (as text) for outputs that need more of the export."""
+    if not extra_columns:
+        return SHOPIFY_READ_CSV_OPTIONS
+    input_columns = SHOPIFY_INPUT_COLUMNS | set(extra_columns)
+    return {
+        **SHOPIFY_READ_CSV_OPTIONS,
+        'usecols': lambda col: col in input_columns,
+        'dtype': {**{col: str for col in extra_columns}, **SHOPIFY_READ_CSV_OPTIONS['dtype']},
+    }
+
+class ShopifyExportReader:
+    """Parses a Shopify export with pandas' C reader or PyArrow's multithreaded one.
+
+    Both readers load the same columns with the same dtypes. With an arrow_cache
+    path, the parsed (compacted) export is also saved as an Arrow IPC file, and
+    later reads of the unchanged CSV memory-map that file instead of parsing it.
+    """
+
+    def __init__(self, engine='pandas', arrow_cache=None):
+        if engine not in EXPORT_READERS:
+            raise ValueError(f"Unknown export reader '{engine}', expected one of {EXPORT_READERS}")
+        if pa is None and (engine == 'pyarrow' or arrow_cache):
+            raise ImportError("The pyarrow reader and the Arrow cache need PyArrow (pip install pyarrow)")
+        self.engine = engine
+        self.arrow_cache = arrow_cache
+        self.cache_hit = False
+
+    def read(self, file_path, extra_columns=()):
+        """Returns the compacted export frame, with extra_columns if the export has them; raises FileNotFoundError or a parser error.
+
+        file_path may also be a file object, which is always parsed: only paths can be fingerprinted for the Arrow cache.
+        """
+        source = None
+        if self.arrow_cache and isinstance(file_path, (str, os.PathLike)):
+            source = self._source_fingerprint(file_path, extra_columns)
+        if source is not None:
+            df = self._read_arrow_cache(source)
+            if df is not None:
+                self.cache_hit = True
+                return df
+        if self.engine == 'pyarrow':
+            df = compact_shopify_frame(self._read_with_pyarrow(file_path, extra_columns))
+        else:
+            df = compact_shopify_frame(pd.read_csv(file_path, **shopify_read_csv_options(extra_columns)))
+        if source is not None:
+            self._write_arrow_cache(df, source)
+        return df
+
+    def _source_fingerprint(self, file_path, extra_columns=()):
+        stat = os.stat(file_path)
+        return json.dumps({'version': ARROW_CACHE_VERSION, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'columns': sorted(SHOPIFY_INPUT_COLUMNS | set(extra_columns))})
+
+    def _read_with_pyarrow(self, file_path, extra_columns=()):
+        read_csv_options = shopify_read_csv_options(extra_columns)
+        if not isinstance(file_path, (str, os.PathLike)):
+            # A file object is read up to three times below, and PyArrow only reads bytes
+            data = file_path.read()
+            file_path = io.BytesIO(data.encode('utf-8') if isinstance(data, str) else data)
+        # Keep the export's column order, like pandas' usecols does
+        header = pd.read_csv(file_path, nrows=0, **{k: v for k, v in read_csv_options.items() if k != 'dtype'}).columns
+        if isinstance(file_path, io.BytesIO):
+            file_path.seek(0)
+        column_types = {col: pa.string() for col in [*SHOPIFY_TEXT_COLUMNS, *extra_columns]}
+        column_types.update({col: pa.dictionary(pa.int32(), pa.string()) for col in SHOPIFY_CATEGORICAL_COLUMNS})
+        table = pa_csv.read_csv(
+            file_path,
+            read_options=pa_csv.ReadOptions(use_threads=True),
+            parse_options=pa_csv.ParseOptions(delimiter=',', quote_char='"', escape_char='\\', newlines_in_values=True),
+            convert_options=pa_csv.ConvertOptions(
+                include_columns=list(header),
+                column_types={col: column_type for col, column_type in column_types.items() if col in header},
+                null_values=PANDAS_NA_VALUES,
+                true_values=PANDAS_TRUE_VALUES,
+                false_values=PANDAS_FALSE_VALUES,
+                strings_can_be_null=True,
+            ),
+        )
+        if table.num_rows == 0:
+            # Nothing to parallelize, and empty Arrow-backed columns trip up pandas' joins
+            if isinstance(file_path, io.BytesIO):
+                file_path.seek(0)
+            return pd.read_csv(file_path, **read_csv_options)
+        df = table.to_pandas()
+        # PyArrow types an all-empty column as null (object); pandas reads it as float NaN
+        for col in df.columns:
+            if pa.types.is_null(table.schema.field(col).type):
+                df[col] = np.nan
+        return df
+
+    def _read_arrow_cache(self, source):
+        if not os.path.exists(self.arrow_cache):
+            return None
+        with pa.memory_map(self.arrow_cache) as source_file:
+            table = pa_ipc.open_file(source_file).read_all()
+        # An empty export is parsed again: empty Arrow-backed columns trip up pandas' joins
+        if (table.schema.metadata or {}).get(b'source') != source.encode('utf-8') or table.num_rows == 0:
+            return None
+        return table.to_pandas()
+
+    def _write_arrow_cache(self, df, source):
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), b'source': source.encode('utf-8')})
+        with pa_ipc.new_file(self.arrow_cache, table.schema) as writer:
+            writer.write_table(table)
+
+def read_shopify_export(file_path, export_reader=None, extra_columns=()):
+    """Reads the whole Shopify export, or prints the problem and returns None."""
+    try:
+        if export_reader is not None:
+            return export_reader.read(file_path, extra_columns)
+        return compact_shopify_frame(pd.read_csv(file_path, **shopify_read_csv_options(extra_columns)))
+    except FileNotFoundError:
+        print(f"Error: The file '{file_path}' was not found. Please ensure it's in the same directory as the script.")
+        return None
+    except Exception as e:
+        print(f"An error occurred while reading the CSV file: {e}")
+        return None
+
+def process_shopify_data_for_medusa_csv(file_path, workers=1, html_cache=None, price_engine=None, run_report=None, export_reader=None, collision_index=None, option_validator=None, executor=None,
+                                        extra_columns=()):
+    with run_stage(run_report, 'read_csv'):
+        df = read_shopify_export(file_path, export_reader, extra_columns)
+    if df is None:
+        return None
+    if run_report is not None:
+        run_report.count_rows('read_csv', len(df))
+    if collision_index is not None:
+        with run_stage(run_report, 'collisions', len(df)):
+            df = collision_index.check(df)
+    if option_validator is not None:
+        with run_stage(run_report, 'validate_options', len(df)):
+            keep = option_validator.check(df)
+
+    with worker_pool(workers, executor) as executor:
+        output_df = transform_shopify_frame(df, executor, html_cache, price_engine, run_report, extra_columns)
+    if option_validator is not None:
+        output_df = option_validator.filter(output_df, keep)
+    return output_df
+
+def transform_shopify_frame(df, executor=None, html_cache=None, price_engine=None, run_report=None, extra_columns=()):
+    """Applies every Medusa transform to a frame holding all the rows of its products.
+
+    When a process pool executor is given, the per-product transforms run on its workers.
+    An HtmlContentCache lets descriptions seen in earlier runs skip HTML parsing, and
+    price_engine replaces the default PRICE_ENGINE built from the settings above.
+    A RunReport records each step as a stage, and the time spent on each handle.
+    extra_columns (export columns, e.g. for feed writers) are appended after the output columns.
+    """
+    rows = len(df)
+    with run_stage(run_report, 'fillna', rows):
+        df = df.fillna('')
+
+    with run_stage(run_report, 'prices', rows):
+        # Prepare price columns for conversion (already integer cents, see compact_shopify_frame)
+        for col in PRICE_COLUMNS:
+            if col not in df.columns:
+                df[col] = 0 # Add column if it doesn't exist, fill with 0
+
+        # Convert every price column into every currency in one vectorized pass
+        # Assuming original Shopify prices are in the price engine's base currency
+        price_engine = price_engine or PRICE_ENGINE
+        df = pd.concat([df, price_engine.compute(df)], axis=1)
+
+        # The original price columns are kept for reference in their usual decimal form
+        for col in PRICE_COLUMNS:
+            df[col] = df[col] / PRICE_CENTS
+
+    with run_stage(run_report, 'group_rows', rows):
+        # Group the rows of each product (identified by unique Handle) in one pass,
+        # keeping the handles in order of first appearance, like df['Handle'].unique().
+        unique_handles, row_positions = group_rows_by_handle(df['Handle'])
+        first_rows = df.iloc[[positions[0] for positions in row_positions]]
+
+    with run_stage(run_report, 'categories', len(first_rows)):
+        # Infer the categories of every product in one vectorized pass over each handle's first row
+        categories = CATEGORY_MATCHER.infer_many(first_rows['Title'], first_rows['Tags'])
+
+    with run_stage(run_report, 'html', len(first_rows)):
+        # Clean each distinct description and pull out its images, skipping bodies already in the cache
+        parse_seconds = {}
+        html_contents = extract_html_contents(first_rows['Body (HTML)'], executor, html_cache, parse_seconds)
+
+    with run_stage(run_report, 'product_fields', len(first_rows)):
+        payloads = build_product_payloads(df, row_positions, categories, html_contents)
+        timed_process = partial(timed_call, process_product_payload)
+        if executor is not None:
+            results = list(executor.map(timed_process, payloads, chunksize=PRODUCTS_PER_WORKER_TASK))
+        else:
+            results = list(map(timed_process, payloads))
+        product_records = [product_fields for product_fields, _ in results]
+
+    if run_report is not None:
+        # A handle's time is parsing its description (unless it was cached or shared) plus its product transforms
+        bodies = first_rows['Body (HTML)'].to_numpy()
+        run_report.record_handles(unique_handles, [
+            parse_seconds.pop(body, 0.0) + seconds
+            for body, (_, seconds) in zip(bodies, results)
+        ])
+
+    with run_stage(run_report, 'options', rows):
+        # Option JSON is built for all products and variants at once in the main process
+        product_options, variant_options = build_option_columns(df, row_positions)
+
+    with run_stage(run_report, 'join', rows):
+        # Broadcast product-level data back to every variant row with one join
+        product_df = pd.DataFrame(product_records, index=pd.Index(unique_handles, dtype=df['Handle'].dtype), columns=PRODUCT_LEVEL_COLUMNS, dtype=object)
+        product_df['Medusa_Product_Options'] = product_options
+        df = df.join(product_df, on='Handle')
+        df['Medusa_Variant_Options'] = variant_options
+
+    with run_stage(run_report, 'final_output', rows):
+        final_columns = output_columns(price_engine) + [col for col in extra_columns if col not in output_columns(price_engine)]
+        final_output_df = pd.DataFrame(columns=final_columns)
+        for col in final_columns:
+            if col in df.columns:
+                final_output_df[col] = df[col]
+            else:
+                final_output_df[col] = ''
+
+    return final_output_df
+
+# --- Streaming (chunked) Mode ---
+def iter_product_chunks(file_path, chunksize, encoding_errors='strict', extra_columns=()):
+    """Reads the export in chunks of about chunksize rows, never splitting a handle's rows.
+
+    Shopify writes all rows of a product next to each other, so only the trailing
+    handle of a chunk can continue into the next one; it is carried over.
+    Chunks keep the export's running row index (0 for the first row after the header).
+    """
+    carry = None
+    with pd.read_csv(file_path, chunksize=chunksize, encoding_errors=encoding_errors, **shopify_read_csv_options(extra_columns)) as reader:
+        for chunk in reader:
+            chunk = compact_shopify_frame(chunk)
+            if carry is not None:
+                chunk = pd.concat([carry, chunk])
+            if chunk.empty:
+                continue
+            handles = chunk['Handle'].fillna('').to_numpy()
+            other_handle_positions = (handles != handles[-1]).nonzero()[0]
+            if len(other_handle_positions) == 0:
+                carry = chunk
+                continue
+            boundary = other_handle_positions[-1] + 1
+            yield chunk.iloc[:boundary]
+            carry = chunk.iloc[boundary:]
+    if carry is not None and len(carry):
+        yield carry
+
+def iter_converted_chunks(file_path, chunksize, executor=None, html_cache=None, price_engine=None, run_report=None, collision_index=None, option_validator=None, extra_columns=()):
+    """Yields the converted output of the export chunk by chunk (see iter_product_chunks).
+
+    A CollisionIndex and an OptionValidator check every chunk in order before it is
+    transformed. Read errors are raised, as FileNotFoundError or a parser error.
+    """
+    chunks = iter_product_chunks(file_path, chunksize, extra_columns=extra_columns)
+    while True:
+        with run_stage(run_report, 'read_csv'):
+            chunk = next(chunks, None)
+        if chunk is None:
+            return
+        if run_report is not None:
+            run_report.count_rows('read_csv', len(chunk))
+        if collision_index is not None:
+            with run_stage(run_report, 'collisions', len(chunk)):
+                chunk = collision_index.check(chunk)
+        if option_validator is not None:
+            with run_stage(run_report, 'validate_options', len(chunk)):
+                keep = option_validator.check(chunk)
+        output_df = transform_shopify_frame(chunk, executor, html_cache, price_engine, run_report, extra_columns)
+        if option_validator is not None:
+            output_df = option_validator.filter(output_df, keep)
+        yield output_df
+
+def stream_shopify_data_to_medusa_csv(file_path, output_path, chunksize, workers=1, html_cache=None, price_engine=None, output_writer=None, run_report=None, columnar_writer=None, collision_index=None, option_validator=None, executor=None,
+                                      duplicate_detector=None, feed_writers=()):
+    """Converts the export chunk by chunk, appending each result to output_path.
+
+    Memory stays bounded by the chunk size instead of the file size. With an
+    output_writer (NormalizedOutputWriter or NdjsonOutputWriter), chunks go to it
+    instead of output_path; a ColumnarOutputWriter gets every chunk as well. A
+    DuplicateDetector sees every chunk too, but only for its report: chunks already
+    written cannot be collapsed. Feed writers (e.g. GoogleShoppingFeedWriter) get every
+    chunk with the extra export columns they read, from the same pass, and so does an
+    output_writer that reads some (see write_output).
+    Returns the number of rows written, or None if the export could not be read.
+    """
+    rows_written = 0
+    wrote_header = False
+    output_stream = None
+    try:
+        with worker_pool(workers, executor) as executor:
+            chunks = iter_converted_chunks(file_path, chunksize, executor, html_cache, price_engine, run_report, collision_index, option_validator,
+                                           writer_input_columns([*feed_writers, output_writer]))
+            for converted_df in chunks:
+                output_df = write_feeds(converted_df, feed_writers, price_engine, run_report)
+                with run_stage(run_report, 'to_csv', len(output_df)):
+                    if output_writer is not None:
+                        write_output(converted_df, output_writer, price_engine)
+                    else:
+                        output_stream = output_stream or open_text_stream(output_path, 'w')
+                        output_df.to_csv(output_stream, header=not wrote_header, index=False)
+                if columnar_writer is not None:
+                    with run_stage(run_report, 'columnar_output', len(output_df)):
+                        columnar_writer.write(output_df)
+                if duplicate_detector is not None:
+                    with run_stage(run_report, 'duplicates', len(output_df)):
+                        duplicate_detector.add(output_df)
+                wrote_header = True
+                rows_written += len(output_df)
+    except FileNotFoundError:
+        print(f"Error: The file '{file_path}' was not found. Please ensure it's in the same directory as the script.")
+        return None
+    except pd.errors.ParserError as e:
+        print(f"An error occurred while reading the CSV file: {e}")
+        return None
+    finally:
+        if output_stream is not None:
+            output_stream.close()
+
+    if not wrote_header and output_writer is None:
+        write_csv(pd.DataFrame(columns=output_columns(price_engine)), output_path)
+    return rows_written
+
+# --- Normalized Output ---
+def normalize_output_frame(output_df, price_engine=None):
+    """Splits the one-row-per-variant output into the NORMALIZED_TABLES, returned as a dict of frames.
+
+    Product fields appear once per product instead of on every variant row, prices
+    become one row per variant and currency, and images one row per product image.
+    """
+    price_engine = price_engine or PRICE_ENGINE
+    handles = output_df['Handle']
+    first_rows = ~handles.duplicated().to_numpy()
+
+    variants = output_df.assign(**{'Variant Position': handles.groupby(handles, sort=False).cumcount() + 1})
+
+    # (variants, currencies) amount grids flattened variant-major, one row per variant and currency
+    currencies = price_engine.currencies
+    prices = pd.DataFrame({
+        'Handle': np.repeat(handles.to_numpy(), len(currencies)),
+        'Variant Position': np.repeat(variants['Variant Position'].to_numpy(), len(currencies)),
+        'Currency': np.tile(currencies, len(output_df)),
+        **{
+            f'{prefix}_Amount': output_df[[f'{prefix}_{currency}_Amount' for currency in currencies]].to_numpy().ravel()
+            for prefix in PRICE_COLUMNS.values()
+        },
+    })
+
+    images = output_df.loc[first_rows, ['Handle', 'Medusa_Images']]
+    images = images.assign(**{'Image Src': images['Medusa_Images'].str.split(', ')}).explode('Image Src')
+    images = images[images['Image Src'].fillna('') != '']
+    images.insert(1, 'Image Position', images.groupby('Handle', sort=False).cumcount() + 1)
+
+    return {
+        'products': output_df.loc[first_rows, PRODUCT_TABLE_COLUMNS],
+        'variants': variants[VARIANT_TABLE_COLUMNS],
+        'prices': prices,
+        'images': images[['Handle', 'Image Position', 'Image Src']],
+    }
+
+def normalized_table_paths(output_path):
+    """Returns {table: path}, e.g. medusa_seed_products_006_products.csv for output_path medusa_seed_products_006.csv."""
+    stem, extension, compression = split_output_path(output_path)
+    return {name: f'{stem}_{name}{extension or ".csv"}{compression}' for name in NORMALIZED_TABLES}
+
+class NormalizedOutputWriter:
+    """Writes the normalized tables for output_path, one frame (or chunk) at a time.
+
+    With compare_wide=True, each frame is also written in the wide layout to a scratch
+    file, and both layouts are timed on the way out and on a read back to report what
+    normalizing saves.
+    """
+
+    def __init__(self, output_path, price_engine=None, compare_wide=False):
+        self.paths = normalized_table_paths(output_path)
+        self.price_engine = price_engine
+        self.compare_wide = compare_wide
+        self.wide_name = os.path.basename(output_path)
+        self.scratch_dir = None
+        self.wide_write_seconds = 0.0
+        self.normalized_write_seconds = 0.0
+        self.frames_written = 0
+
+    def write(self, output_df):
+        append = self.frames_written > 0
+        if self.compare_wide:
+            if not append:
+                self.scratch_dir = tempfile.mkdtemp(prefix='medusa_wide_')
+                self.wide_path = os.path.join(self.scratch_dir, self.wide_name)
+            start = time.perf_counter()
+            output_df.to_csv(self.wide_path, mode='a' if append else 'w', header=not append, index=False, encoding='utf-8')
+            self.wide_write_seconds += time.perf_counter() - start
+
+        start = time.perf_counter()
+        for name, table in normalize_output_frame(output_df, self.price_engine).items():
+            table.to_csv(self.paths[name], mode='a' if append else 'w', header=not append, index=False, encoding='utf-8')
+        self.normalized_write_seconds += time.perf_counter() - start
+        self.frames_written += 1
+
+    def report(self):
+        """Prints the size of every table and, with compare_wide, the size, write time and load time of both layouts."""
+        if not self.frames_written:
+            self.write(pd.DataFrame(columns=output_columns(self.price_engine)))
+
+        print("\n--- Normalized output ---")
+        for name, path in self.paths.items():
+            print(f"{name:<10} {os.path.getsize(path) / (1024 * 1024):>9.2f} MB  {path}")
+        if not self.compare_wide:
+            return
+
+        # Reading every table back as text stands in for the seeder's load of the files
+        start = time.perf_counter()
+        pd.read_csv(self.wide_path, dtype=str, keep_default_na=False)
+        wide_load_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        for path in self.paths.values():
+            pd.read_csv(path, dtype=str, keep_default_na=False)
+        normalized_load_seconds = time.perf_counter() - start
+
+        wide_bytes = os.path.getsize(self.wide_path)
+        normalized_bytes = sum(os.path.getsize(path) for path in self.paths.values())
+        shutil.rmtree(self.scratch_dir, ignore_errors=True)
+
+        print("\n--- Normalized output vs. one wide row per variant ---")
+        print(f"{'size':<10} {wide_bytes / (1024 * 1024):>9.2f} MB -> {normalized_bytes / (1024 * 1024):.2f} MB ({1 - normalized_bytes / max(wide_bytes, 1):.0%} smaller)")
+        print(f"{'write':<10} {self.wide_write_seconds:>9.2f} s  -> {self.normalized_write_seconds:.2f} s (saves {self.wide_write_seconds - self.normalized_write_seconds:.2f} s)")
+        print(f"{'load':<10} {wide_load_seconds:>9.2f} s  -> {normalized_load_seconds:.2f} s (saves {wide_load_seconds - normalized_load_seconds:.2f} s)")
+
+# --- NDJSON Output ---
+def category_handle(name):
+    """The handle Medusa generates for a category name, e.g. "Home & Living" -> "home-living"."""
+    name = ''.join(ch for ch in unicodedata.normalize('NFD', name) if not unicodedata.combining(ch))
+    name = re.sub(r'[^a-zA-Z0-9\s_-]', '', name).strip().lower()
+    return re.sub(r'[\s_-]+', '-', name)
+
+def major_amount(amount, multiplier):
+    """An amount in a currency's smallest unit in its major unit, as an int when it is whole (6500 cents -> 65)."""
+    amount = int(amount)
+    return amount // multiplier if amount % multiplier == 0 else amount / multiplier
+
+def iter_product_documents(output_df, price_engine=None):
+    """Yields one product per handle of the output frame, shaped like a createProductsWorkflow input.
+
+    output_df must also carry the NDJSON_INPUT_COLUMNS (see transform_shopify_frame's
+    extra_columns). Only rows with an option value become variants (a product without
+    any keeps its first row as its only variant); the Image Src of Shopify's image-only
+    rows is added to the product's images instead. Products carry category handles
+    instead of ids; the seeder resolves those, the shipping profile and the sales
+    channel once it has created them. Variant prices are the Medusa_Price amounts in
+    every currency, converted back from the smallest unit to the major unit Medusa
+    prices are given in (6550 USD cents -> 65.5, 37454 XOF -> 37454).
+    """
+    price_engine = price_engine or PRICE_ENGINE
+    unique_handles, row_positions = group_rows_by_handle(output_df['Handle'])
+    columns = {
+        col: output_df[col].to_numpy(dtype=object)
+        for col in ['Title', 'Status', 'Variant SKU', 'Variant Grams', 'Medusa_Description', 'Medusa_Categories', 'Medusa_Images', 'Medusa_Product_Options', 'Medusa_Variant_Options']
+    }
+    image_sources = text_values(output_df, 'Image Src')
+    variant_rows = has_option_values(trimmed_option_values(output_df)[1])
+    currency_codes = [currency.lower() for currency in price_engine.currencies]
+    multipliers = [price_engine.multipliers[currency] for currency in price_engine.currencies]
+    amounts = output_df[[f'Medusa_Price_{currency}_Amount' for currency in price_engine.currencies]].to_numpy(dtype=object)
+    handles_by_category = {name: category_handle(name) for name in CATEGORIES}
+
+    for handle, positions in zip(unique_handles, row_positions):
+        first_row = positions[0]
+        options = [{'title': option['name'], 'values': option['values']} for option in json.loads(columns['Medusa_Product_Options'][first_row])]
+
+        variants = []
+        for number, row in enumerate(positions[variant_rows[positions]] if variant_rows[positions].any() else positions[:1], start=1):
+            row_options = json.loads(columns['Medusa_Variant_Options'][row])
+            # Like the CSV loader, a variant missing an option takes the option's first value
+            variant_options = {option['title']: row_options.get(option['title']) or option['values'][0] for option in options}
+            variants.append({
+                'title': ' / '.join(variant_options.values()) or f'Variant {number}',
+                'sku': columns['Variant SKU'][row],
+                'options': variant_options,
+                'prices': [{'amount': major_amount(amount, multiplier), 'currency_code': code} for amount, code, multiplier in zip(amounts[row], currency_codes, multipliers)],
+            })
+
+        grams = columns['Variant Grams'][first_row]
+        categories = columns['Medusa_Categories'][first_row]
+        images = [url for url in columns['Medusa_Images'][first_row].split(', ') if url]
+        images += [url for url in dict.fromkeys(image_sources[positions]) if url and url not in images]
+        yield {
+            'title': columns['Title'][first_row] or 'Missing Title',
+            'description': columns['Medusa_Description'][first_row],
+            'handle': handle,
+            'weight': int(float(grams)) if grams != '' else 0,
+            'status': MEDUSA_PRODUCT_STATUSES.get(str(columns['Status'][first_row]).lower(), 'published'),
+            'category_handles': [handles_by_category.get(name, category_handle(name)) for name in categories.split(', ')] if categories else [],
+            'images': [{'url': url} for url in images],
+            'options': options,
+            'variants': variants,
+        }
+
+def encode_ndjson_line(document):
+    """Encodes a document as one compact UTF-8 JSON line, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(document) + b'\n'
+    return json.dumps(document, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+
+class NdjsonOutputWriter:
+    """Writes one product per line next to output_path, optionally split into files of batch_size products.
+
+    Without a batch size everything goes to <stem>.ndjson; otherwise to
+    <stem>_batch_0001.ndjson, <stem>_batch_0002.ndjson, ... so each file can be
+    handed to createProductsWorkflow as one batch. It reads the NDJSON_INPUT_COLUMNS
+    of the export besides the output (see write_output).
+    """
+
+    input_columns = NDJSON_INPUT_COLUMNS
+
+    def __init__(self, output_path, batch_size=0, price_engine=None):
+        self.stem = split_output_path(output_path)[0]
+        self.batch_size = batch_size
+        self.price_engine = price_engine
+        self.paths = []
+        self.products_written = 0
+        self.file = None
+
+    def _next_file(self):
+        if self.file is not None:
+            self.file.close()
+        path = f'{self.stem}_batch_{len(self.paths) + 1:04d}.ndjson' if self.batch_size else f'{self.stem}.ndjson'
+        self.paths.append(path)
+        self.file = open(path, 'wb')
+
+    def write(self, output_df):
+        for document in iter_product_documents(output_df, self.price_engine):
+            if self.file is None or (self.batch_size and self.products_written % self.batch_size == 0):
+                self._next_file()
+            self.file.write(encode_ndjson_line(document))
+            self.products_written += 1
+
+    def close(self):
+        if self.file is None and not self.batch_size:
+            self._next_file() # An empty export still gets its (empty) output file
+        if self.file is not None:
+            self.file.close()
+        return self.paths
+
+# --- Sharded Output ---
+def shard_numbers(handles, shard_count):
+    """Returns the shard of each row: a stable hash of its Handle (first 8 bytes of its SHA-1) modulo shard_count.
+
+    SHA-1 rather than Python's hash(), so a product lands in the same shard on every
+    run, machine and language. Each distinct handle is hashed once.
+    """
+    codes, unique_handles = pd.factorize(handles)
+    handle_shards = np.array([int.from_bytes(hashlib.sha1(str(handle).encode('utf-8')).digest()[:8], 'big') % shard_count for handle in unique_handles] + [0], dtype=np.int64)
+    return handle_shards[codes]
+
+class ShardedOutputWriter:
+    """Splits the output rows into shard_count CSV files by Handle, so every variant of a product is in one shard.
+
+    Shards are <output stem>_shard_00.csv, ... and close() writes <output stem>_shards.json,
+    listing each shard's rows, products and SHA-256 so parallel seeders can check their input.
+    """
+
+    def __init__(self, output_path, shard_count, price_engine=None):
+        if shard_count < 1:
+            raise ValueError("shard_count must be at least 1")
+        stem, extension, compression = split_output_path(output_path)
+        width = len(str(shard_count - 1))
+        self.paths = [f'{stem}_shard_{shard:0{width}d}{extension or ".csv"}{compression}' for shard in range(shard_count)]
+        self.manifest_path = f'{stem}_shards.json'
+        self.price_engine = price_engine
+        self.rows = [0] * shard_count
+        self.handles = [set() for _ in range(shard_count)]
+        self.frames_written = 0
+
+    def write(self, output_df):
+        append = self.frames_written > 0
+        shards = shard_numbers(output_df['Handle'], len(self.paths))
+        for shard, path in enumerate(self.paths):
+            shard_df = output_df[shards == shard]
+            shard_df.to_csv(path, mode='a' if append else 'w', header=not append, index=False, encoding='utf-8')
+            self.rows[shard] += len(shard_df)
+            self.handles[shard].update(shard_df['Handle'])
+        self.frames_written += 1
+
+    def close(self):
+        """Writes the manifest and returns it."""
+        if not self.frames_written:
+            self.write(pd.DataFrame(columns=output_columns(self.price_engine)))
+        manifest = {
+            'shard_key': 'Handle',
+            'hash': 'sha1(handle)[:8] mod shard_count',
+            'shard_count': len(self.paths),
+            'rows': sum(self.rows),
+            'products': sum(len(handles) for handles in self.handles),
+            'shards': [
+                {'shard': shard, 'path': os.path.basename(path), 'rows': rows, 'products': len(handles), 'sha256': file_sha256(path)}
+                for shard, (path, rows, handles) in enumerate(zip(self.paths, self.rows, self.handles))
+            ],
+        }
+        with open(self.manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        return manifest
+
+# --- Columnar Output ---
+def columnar_output_schema(price_engine=None):
+    """Arrow schema of the columnar output: Shopify prices as decimals, amounts as integers,
+    and every other column as the text the CSV holds, so chunks always share one schema."""
+    price_engine = price_engine or PRICE_ENGINE
+    fields = []
+    for col in output_columns(price_engine):
+        if col in PRICE_COLUMNS:
+            fields.append(pa.field(col, pa.float64()))
+        elif col in price_engine.amount_columns:
+            fields.append(pa.field(col, pa.int64()))
+        else:
+            fields.append(pa.field(col, pa.string()))
+    return pa.schema(fields)
+
+class ColumnarOutputWriter:
+    """Writes the output frames (or chunks) to <output stem>.parquet or .arrow next to the CSV.
+
+    The Arrow IPC file can be memory-mapped by later stages (pyarrow.memory_map +
+    pyarrow.ipc.open_file) instead of parsing the CSV text again.
+    """
+
+    def __init__(self, output_path, file_format, price_engine=None):
+        if pa is None:
+            raise ImportError("--columnar-output needs PyArrow (pip install pyarrow)")
+        if file_format not in COLUMNAR_FORMATS:
+            raise ValueError(f"Unknown columnar format '{file_format}', expected one of {COLUMNAR_FORMATS}")
+        self.path = f'{split_output_path(output_path)[0]}.{file_format}'
+        self.file_format = file_format
+        self.price_engine = price_engine
+        self.schema = columnar_output_schema(price_engine)
+        self.writer = None
+
+    def write(self, output_df):
+        arrays = []
+        for field in self.schema:
+            column = output_df[field.name]
+            if pa.types.is_string(field.type):
+                # The same text to_csv writes: '' for blanks, str() of numbers and booleans
+                column = column.astype(object).where(column.notna(), '').map(str)
+            arrays.append(pa.array(column.to_numpy(), type=field.type, from_pandas=True))
+        table = pa.Table.from_arrays(arrays, schema=self.schema)
+        if self.writer is None:
+            if self.file_format == 'parquet':
+                self.writer = pa_parquet.ParquetWriter(self.path, self.schema)
+            else:
+                self.writer = pa_ipc.new_file(self.path, self.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is None:
+            self.write(pd.DataFrame({col: pd.Series(dtype=object) for col in self.schema.names}))
+        self.writer.close()
+        return self.path
+
+# --- Feed Outputs ---
+def product_urls(handles, store_url):
+    """The storefront URL of each handle, using the slug the seeder creates the product under."""
+    return [store_url.rstrip('/') + PRODUCT_URL_PATH.format(handle=slug) for slug in slugify_handles(handles)]
+
+def feed_text(value):
+    """A cell as one line of trimmed text, for feeds that cannot hold tabs or newlines."""
+    return ' '.join(str(value).split())
+
+def truncate_words(text, length):
+    if len(text) <= length:
+        return text
+    return text[:length - 3].rsplit(' ', 1)[0].rstrip(' ,.;:') + '...'
+
+def is_published(status):
+    return MEDUSA_PRODUCT_STATUSES.get(str(status).lower(), 'published') == 'published'
+
+class GoogleShoppingFeedWriter:
+    """Writes a Google Merchant Center feed to <output stem>_google_shopping.tsv, one line per variant.
+
+    Only published products are listed, and only their variant rows with a price (not
+    Shopify's image-only rows). Product fields come from each product's first row, where
+    Shopify puts them. A variant's image is its Variant Image or else the product's Image
+    Src, and its price is Variant Price in the price engine's base currency; a higher
+    Variant Compare At Price becomes the price and Variant Price the sale price.
+    """
+
+    input_columns = [
+        'Image Src', 'Variant Image', 'Variant Inventory Qty',
+        'Google Shopping / Google Product Category', 'Google Shopping / Gender', 'Google Shopping / Age Group',
+        'Google Shopping / MPN', 'Google Shopping / Condition', 'Google Shopping / Custom Product',
+        'Google Shopping / Custom Label 0', 'Google Shopping / Custom Label 1', 'Google Shopping / Custom Label 2',
+        'Google Shopping / Custom Label 3', 'Google Shopping / Custom Label 4',
+    ]
+
+    def __init__(self, output_path, price_engine=None, store_url=DEFAULT_STORE_URL):
+        self.path = split_output_path(output_path)[0] + '_google_shopping.tsv'
+        self.paths = [self.path]
+        self.currency = (price_engine or PRICE_ENGINE).base_currency
+        self.store_url = store_url
+        self.file = None
+        self.items_written = 0
+
+    def write(self, output_df):
+        if self.file is None:
+            self.file = open(self.path, 'w', encoding='utf-8', newline='')
+            self.file.write('\t'.join(GOOGLE_SHOPPING_COLUMNS) + '\n')
+        unique_handles, row_positions = group_rows_by_handle(output_df['Handle'])
+        columns = {col: output_df[col].to_numpy(dtype=object) for col in output_df.columns}
+        lines = []
+        for handle, url, positions in zip(unique_handles, product_urls(unique_handles, self.store_url), row_positions):
+            product = {col: values[positions[0]] for col, values in columns.items()}
+            if not is_published(product['Status']):
+                continue
+            variant_rows = [row for row in positions if columns['Medusa_Variant_Options'][row] != '{}' and float(columns['Variant Price'][row] or 0) > 0]
+            images = [image for image in product['Medusa_Images'].split(', ') if image]
+            option_names = [option['name'] for option in json.loads(product['Medusa_Product_Options'])]
+            for number, row in enumerate(variant_rows, start=1):
+                lines.append(self._item(handle, url, number, len(variant_rows) > 1, option_names, images, product, {col: values[row] for col, values in columns.items()}))
+        if lines:
+            self.file.write(''.join('\t'.join(map(feed_text, line)) + '\n' for line in lines))
+            self.items_written += len(lines)
+
+    def _item(self, handle, url, number, has_variants, option_names, images, product, variant):
+        options = json.loads(variant['Medusa_Variant_Options'])
+        option_values = [options[name] for name in option_names if options.get(name) and name != 'Title']
+        options_by_name = {name.lower(): value for name, value in options.items()}
+        title = product['Title'] + (' - ' + ' / '.join(option_values) if option_values else '')
+
+        image = variant['Variant Image'] or product['Image Src'] or (images[0] if images else '')
+        price, compare_at_price = float(variant['Variant Price']), float(variant['Variant Compare At Price'] or 0)
+        on_sale = compare_at_price > price
+        quantity, policy = str(variant['Variant Inventory Qty']), str(variant['Variant Inventory Policy'])
+        out_of_stock = quantity.lstrip('-').isdigit() and int(quantity) <= 0 and policy != 'continue'
+        grams = float(variant['Variant Grams'] or 0)
+        mpn = product['Google Shopping / MPN'] or variant['Variant SKU']
+        custom_product = str(product['Google Shopping / Custom Product']).lower() == 'true'
+
+        return [
+            f'{handle}-{number}',
+            handle if has_variants else '',
+            truncate_words(feed_text(title), 150),
+            truncate_words(feed_text(product['Medusa_Description']), GOOGLE_SHOPPING_MAX_DESCRIPTION),
+            url,
+            image,
+            ','.join([other for other in images if other != image][:GOOGLE_SHOPPING_MAX_ADDITIONAL_IMAGES]),
+            'out_of_stock' if out_of_stock else 'in_stock',
+            f'{compare_at_price if on_sale else price:.2f} {self.currency}',
+            f'{price:.2f} {self.currency}' if on_sale else '',
+            product['Vendor'],
+            variant['Variant Barcode'],
+            mpn,
+            'no' if custom_product or not (variant['Variant Barcode'] or mpn) else '',
+            str(product['Google Shopping / Condition']).lower() or 'new',
+            product['Google Shopping / Google Product Category'],
+            product['Medusa_Categories'],
+            str(product['Google Shopping / Gender']).lower(),
+            str(product['Google Shopping / Age Group']).lower(),
+            options_by_name.get('color') or options_by_name.get('colour', ''),
+            options_by_name.get('size', ''),
+            f'{grams:g} g' if grams > 0 else '',
+            *(product[f'Google Shopping / Custom Label {label}'] for label in range(5)),
+        ]
+
+    def close(self):
+        if self.file is None:
+            self.write(pd.DataFrame(columns=output_columns() + self.input_columns)) # An empty export still gets the header
+        self.file.close()
+        return self.paths
+
+class SitemapWriter:
+    """Writes an XML sitemap of the published products, and their SEO titles and descriptions.
+
+    <output stem>_sitemap.xml lists each product page with its images. Past SITEMAP_MAX_URLS
+    pages the URLs go to <output stem>_sitemap_0001.xml, ... and <output stem>_sitemap.xml
+    becomes their sitemap index. <output stem>_seo.csv holds each page's SEO Title and SEO
+    Description, falling back on the title and the start of the cleaned description.
+    """
+
+    input_columns = ['Image Src', 'SEO Title', 'SEO Description']
+
+    def __init__(self, output_path, price_engine=None, store_url=DEFAULT_STORE_URL):
+        self.stem = split_output_path(output_path)[0]
+        self.store_url = store_url
+        self.path = self.stem + '_sitemap.xml'
+        self.seo_path = self.stem + '_seo.csv'
+        self.part_paths = []
+        self.file = None
+        self.urls_in_file = 0
+        self.urls_written = 0
+        self.seen_urls = set()
+        self.seo_file = None
+
+    def _next_file(self):
+        if self.file is not None:
+            self.file.write('</urlset>\n')
+            self.file.close()
+        self.part_paths.append(f'{self.stem}_sitemap_{len(self.part_paths) + 1:04d}.xml')
+        self.file = open(self.part_paths[-1], 'w', encoding='utf-8')
+        self.file.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                        '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9" xmlns:image="http://www.google.com/schemas/sitemap-image/1.1">\n')
+        self.urls_in_file = 0
+
+    def write(self, output_df):
+        if self.seo_file is None:
+            self.seo_file = open(self.seo_path, 'w', encoding='utf-8', newline='')
+            pd.DataFrame(columns=['Handle', 'URL', 'SEO Title', 'SEO Description']).to_csv(self.seo_file, index=False)
+        first_rows = output_df.drop_duplicates('Handle')
+        first_rows = first_rows[[is_published(status) for status in first_rows['Status']]]
+        urls = product_urls(first_rows['Handle'], self.store_url)
+        seo_rows = []
+        for url, (_, product) in zip(urls, first_rows.iterrows()):
+            if url in self.seen_urls:
+                continue # Handles sharing a slug are seeded as one page (see --fix-collisions)
+            self.seen_urls.add(url)
+            if self.file is None or self.urls_in_file == SITEMAP_MAX_URLS:
+                self._next_file()
+            images = dict.fromkeys([product['Image Src']] + product['Medusa_Images'].split(', '))
+            self.file.write(f'  <url><loc>{xml_escape(url)}</loc>'
+                            + ''.join(f'<image:image><image:loc>{xml_escape(image)}</image:loc></image:image>' for image in images if image)
+                            + '</url>\n')
+            self.urls_in_file += 1
+            self.urls_written += 1
+            seo_rows.append([
+                product['Handle'],
+                url,
+                feed_text(product['SEO Title']) or feed_text(product['Title']),
+                feed_text(product['SEO Description']) or truncate_words(feed_text(product['Medusa_Description']), SEO_DESCRIPTION_LENGTH),
+            ])
+        pd.DataFrame(seo_rows, columns=['Handle', 'URL', 'SEO Title', 'SEO Description']).to_csv(self.seo_file, header=False, index=False)
+
+    def close(self):
+        if self.file is None:
+            self._next_file() # An empty export still gets an (empty) sitemap
+        self.file.write('</urlset>\n')
+        self.file.close()
+        if self.seo_file is not None:
+            self.seo_file.close()
+        if len(self.part_paths) == 1:
+            os.replace(self.part_paths[0], self.path)
+            return [self.path, self.seo_path]
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write('<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n')
+            f.writelines(f'  <sitemap><loc>{xml_escape(self.store_url.rstrip("/") + "/" + os.path.basename(path))}</loc></sitemap>\n' for path in self.part_paths)
+            f.write('</sitemapindex>\n')
+        return [self.path, *self.part_paths, self.seo_path]
+
+FEED_WRITERS = {'google-shopping': GoogleShoppingFeedWriter, 'sitemap': SitemapWriter}
+
+def writer_input_columns(writers):
+    """The export columns the writers (None for none) read besides the Medusa output, their input_columns, in order."""
+    return list(dict.fromkeys(col for writer in writers if writer is not None for col in getattr(writer, 'input_columns', ())))
+
+def seed_frame(output_df, price_engine=None):
+    """output_df without the extra export columns some writers read: the Medusa output columns."""
+    columns = output_columns(price_engine)
+    return output_df if len(output_df.columns) == len(columns) else output_df[columns]
+
+def write_output(output_df, output_writer, price_engine=None):
+    """Hands output_df to output_writer, with the extra export columns only if the writer declares input_columns."""
+    output_writer.write(output_df if getattr(output_writer, 'input_columns', None) else seed_frame(output_df, price_engine))
+
+def write_feeds(output_df, feed_writers, price_engine=None, run_report=None):
+    """Hands output_df (with the feed writers' input columns) to every feed writer and returns its Medusa columns."""
+    if feed_writers:
+        with run_stage(run_report, 'feeds', len(output_df)):
+            for writer in feed_writers:
+                writer.write(output_df)
+    return seed_frame(output_df, price_engine)
+
+# --- Incremental Mode ---
+def settings_fingerprint(price_engine=None):
+    """Hashes every setting that shapes the output, so changing one forces a full rebuild."""
+    settings = [CATEGORIES, (price_engine or PRICE_ENGINE).settings(), HTML_CLEANER_VERSION, output_columns(price_engine)]
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()
+
+def fingerprint_handles(df, row_positions):
+    """Returns one fingerprint per product, hashing every input cell of its rows in order."""
+    row_hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    return [hashlib.sha1(row_hashes[positions].tobytes()).hexdigest() for positions in row_positions]
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def load_previous_run(state_path, output_path, price_engine=None):
+    """Returns (fingerprints, previous output rows) if the state still matches the output file.
+
+    The state is ignored, forcing a full conversion, when it is missing, was written
+    with different settings, or the output CSV has changed since it was written.
+    """
+    if not os.path.exists(state_path) or not os.path.exists(output_path):
+        return {}, None
+    with open(state_path, encoding='utf-8') as f:
+        state = json.load(f)
+    if state.get('settings') != settings_fingerprint(price_engine):
+        print("Conversion settings changed since the last run; converting every product.")
+        return {}, None
+    if state.get('output_sha256') != file_sha256(output_path):
+        print(f"'{output_path}' changed since the last run; converting every product.")
+        return {}, None
+    # Read everything as text so copied rows are written back exactly as they were
+    previous_output = pd.read_csv(output_path, dtype=str, keep_default_na=False)
+    return state['fingerprints'], previous_output
+
+def save_incremental_state(state_path, fingerprints, output_path, price_engine=None):
+    state = {
+        'settings': settings_fingerprint(price_engine),
+        'output_sha256': file_sha256(output_path),
+        'fingerprints': fingerprints,
+    }
+    with open(state_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+
+def process_shopify_data_incrementally(file_path, output_path, state_path, workers=1, html_cache=None, price_engine=None, run_report=None, export_reader=None, collision_index=None, option_validator=None, executor=None):
+    """Converts only new or changed products, copying the others from the previous output.
+
+    Returns (output DataFrame, changeset, fingerprints), where the changeset lists the
+    added, changed and removed handles, or None if the export could not be read.
+    """
+    with run_stage(run_report, 'read_csv'):
+        df = read_shopify_export(file_path, export_reader)
+    if df is None:
+        return None
+    if run_report is not None:
+        run_report.count_rows('read_csv', len(df))
+    if collision_index is not None:
+        with run_stage(run_report, 'collisions', len(df)):
+            df = collision_index.check(df)
+    keep = np.ones(len(df), dtype=bool)
+    if option_validator is not None:
+        with run_stage(run_report, 'validate_options', len(df)):
+            keep = option_validator.check(df)
+
+    with run_stage(run_report, 'fingerprint', len(df)):
+        handles = df['Handle'].fillna('')
+        unique_handles, row_positions = group_rows_by_handle(handles)
+        fingerprints = dict(zip(unique_handles, fingerprint_handles(df, row_positions)))
+    with run_stage(run_report, 'load_previous_run'):
+        previous_fingerprints, previous_output = load_previous_run(state_path, output_path, price_engine)
+    previous_handles = set(previous_output['Handle']) if previous_output is not None else set()
+
+    unchanged_handles = {
+        handle for handle, fingerprint in fingerprints.items()
+        if previous_fingerprints.get(handle) == fingerprint and handle in previous_handles
+    }
+    changeset = {
+        'added': [handle for handle in unique_handles if handle not in previous_fingerprints],
+        'changed': [handle for handle in unique_handles if handle in previous_fingerprints and handle not in unchanged_handles],
+        'removed': [handle for handle in previous_fingerprints if handle not in fingerprints],
+        'unchanged': len(unchanged_handles),
+    }
+
+    with worker_pool(workers, executor) as executor:
+        converted = ~handles.isin(unchanged_handles).to_numpy()
+        converted_df = transform_shopify_frame(df[converted], executor, html_cache, price_engine, run_report)
+    if option_validator is not None:
+        converted_df = option_validator.filter(converted_df, keep[converted])
+    with run_stage(run_report, 'merge_previous_output', len(df)):
+        output_parts = [converted_df]
+        if unchanged_handles:
+            output_parts.append(previous_output[previous_output['Handle'].isin(unchanged_handles)])
+
+        # Put every product back at its position in the current export
+        output_df = pd.concat(output_parts, ignore_index=True)
+        handle_ranks = pd.Series(np.arange(len(unique_handles)), index=unique_handles)
+        output_df = output_df.iloc[np.argsort(output_df['Handle'].map(handle_ranks).to_numpy(), kind='stable')]
+    return output_df, changeset, fingerprints
+
+# --- Checkpointed Streaming ---
+class Quarantine:
+    """Products left out of a checkpointed run, with the reason, instead of aborting it.
+
+    check() sets aside rows without a Handle and every row of a product with a cell
+    that was not valid UTF-8 (read as REPLACEMENT_CHARACTER); add() takes the rows of
+    a product whose conversion raised. Rows wait in memory until commit() appends
+    them to the quarantine CSV, so the file only holds checkpointed chunks. Rows are
+    numbered like the option rejects (1-based, header excluded).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.reason_counts = dict.fromkeys(QUARANTINE_REASONS, 0)
+        self.pending = []
+
+    def check(self, df):
+        """Returns a boolean array marking the rows of df (whole products) that may be converted."""
+        handles = text_values(df, 'Handle')
+        missing_handle = handles == ''
+
+        invalid = np.zeros(len(df), dtype=bool)
+        invalid_columns = np.full(len(df), '', dtype=object)
+        for col in df.columns:
+            if pd.api.types.is_numeric_dtype(df[col]):
+                continue
+            in_col = pd.Series(text_values(df, col), dtype=object).astype(str).str.contains(REPLACEMENT_CHARACTER, regex=False).to_numpy(dtype=bool)
+            invalid_columns[in_col & ~invalid] = col
+            invalid |= in_col
+        invalid &= ~missing_handle
+        # A product is only ever seeded whole, so one undecodable cell quarantines all of its rows
+        invalid_handles = set(handles[invalid])
+        product_invalid = np.fromiter((handle in invalid_handles for handle in handles), dtype=bool, count=len(df)) & ~missing_handle
+        details = np.where(invalid, 'invalid UTF-8 in ' + invalid_columns, 'another row of the product has invalid UTF-8')
+
+        self.add(df[missing_handle], 'missing_handle', '')
+        self.add(df[product_invalid], 'invalid_encoding', details[product_invalid])
+        return ~(missing_handle | product_invalid)
+
+    def add(self, df, reason, detail):
+        if not len(df):
+            return
+        self.pending.append(pd.DataFrame({
+            'Row': df.index + 1,
+            'Handle': text_values(df, 'Handle'),
+            'Reason': reason,
+            'Detail': detail,
+        }))
+
+    def discard(self):
+        """Forgets the pending rows, for chunks already committed by an earlier run."""
+        self.pending = []
+
+    def commit(self):
+        """Appends the pending rows to the quarantine CSV and returns its size in bytes."""
+        for rows_df in self.pending:
+            write_header = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+            with open(self.path, 'a', encoding='utf-8', newline='') as f:
+                rows_df.to_csv(f, header=write_header, index=False)
+            for reason, count in rows_df['Reason'].value_counts().items():
+                self.reason_counts[reason] += int(count)
+        self.pending = []
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+def report_quarantine(quarantine):
+    """Prints a summary of the quarantined rows, if there were any."""
+    quarantined = sum(quarantine.reason_counts.values())
+    if not quarantined:
+        return
+    counts = ', '.join(f"{count} {reason}" for reason, count in quarantine.reason_counts.items() if count)
+    print(f"\nQuarantine: {quarantined} rows were left out of the output ({counts}; see {quarantine.path})")
+
+def transform_isolating_failures(df, keep, quarantine, executor=None, html_cache=None, price_engine=None, run_report=None):
+    """Transforms df like transform_shopify_frame, quarantining the products whose conversion raises.
+
+    A frame that fails is split in two by handle and each half is retried, down to
+    single products, so a few bad products cost O(log n) extra transforms each.
+    Returns the output frame and the option keep mask of its rows.
+    """
+    try:
+        return transform_shopify_frame(df, executor, html_cache, price_engine, run_report), keep
+    except BrokenExecutor:
+        raise # A dead worker pool fails every product, not just a malformed one
+    except Exception as e:
+        unique_handles, row_positions = group_rows_by_handle(text_values(df, 'Handle'))
+        if len(unique_handles) == 1:
+            quarantine.add(df, 'conversion_error', f"{type(e).__name__}: {e}")
+            return pd.DataFrame(columns=output_columns(price_engine)), keep[:0]
+    first_half = np.zeros(len(df), dtype=bool)
+    first_half[np.concatenate(row_positions[:len(row_positions) // 2])] = True
+    parts = [
+        transform_isolating_failures(df[half], keep[half], quarantine, executor, html_cache, price_engine, run_report)
+        for half in [first_half, ~first_half]
+    ]
+    return pd.concat([output_df for output_df, _ in parts]), np.concatenate([part_keep for _, part_keep in parts])
+
+class ConversionCheckpoint:
+    """How far a checkpointed conversion got, saved as JSON after every chunk it writes.
+
+    The checkpoint holds the chunks done, the rows read, the last handle converted,
+    and the output and quarantine sizes at that point. A restarted run truncates both
+    files back to those sizes, reads the converted chunks again without transforming
+    them (so the collision and option checks see every row, as in one run), and
+    continues with the next chunk. It only resumes the same export, chunk size and
+    settings; otherwise the conversion starts over.
+    """
+
+    def __init__(self, path, input_path, output_path, chunksize, price_engine=None, options=None):
+        self.path = path
+        stat = os.stat(input_path)
+        self.identity = {
+            'version': CHECKPOINT_VERSION,
+            'input': os.path.abspath(input_path),
+            'input_size': stat.st_size,
+            'input_mtime_ns': stat.st_mtime_ns,
+            'output': os.path.abspath(output_path),
+            'chunksize': chunksize,
+            'settings': settings_fingerprint(price_engine),
+            'options': options or {},
+        }
+
+    def load(self):
+        """Returns the saved progress if it can be resumed, or None to start over."""
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, encoding='utf-8') as f:
+            state = json.load(f)
+        changed = [key for key, value in self.identity.items() if state.get(key) != value]
+        if changed:
+            print(f"Checkpoint '{self.path}' is for a different run ({', '.join(changed)} changed); converting from the start.")
+            return None
+        if not os.path.exists(self.identity['output']) or os.path.getsize(self.identity['output']) < state['output_bytes']:
+            print(f"'{self.identity['output']}' is shorter than checkpoint '{self.path}' expects; converting from the start.")
+            return None
+        return state
+
+    def save(self, **progress):
+        # Written to a temporary file first, so a crash mid-write leaves the previous checkpoint intact
+        temporary_path = self.path + '.tmp'
+        with open(temporary_path, 'w', encoding='utf-8') as f:
+            json.dump({**self.identity, **progress}, f, indent=2, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary_path, self.path)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+def truncate_file(path, size):
+    with open(path, 'r+b') as f:
+        f.truncate(size)
+
+def stream_shopify_data_with_checkpoints(file_path, output_path, chunksize, checkpoint, quarantine, workers=1, html_cache=None, price_engine=None, run_report=None, collision_index=None, option_validator=None, executor=None):
+    """Converts the export chunk by chunk like stream_shopify_data_to_medusa_csv, resuming from checkpoint.
+
+    Each chunk's output is flushed to disk before the checkpoint is saved, and the
+    checkpoint is removed once the whole export is converted. Undecodable bytes and
+    products that fail to convert go to the quarantine instead of aborting the run.
+    The output must be an uncompressed CSV, so it can be truncated back to a checkpoint.
+    Returns (rows written, chunk resumed from), or None if the export could not be read.
+    """
+    state = checkpoint.load()
+    chunks_done = state['chunks_done'] if state else 0
+    rows_written = state['rows_written'] if state else 0
+    if state:
+        truncate_file(output_path, state['output_bytes'])
+        if os.path.exists(quarantine.path):
+            truncate_file(quarantine.path, state['quarantine_bytes'])
+        quarantine.reason_counts.update(state['quarantine_counts'])
+        print(f"Resuming from checkpoint '{checkpoint.path}': {chunks_done} chunks ({state['rows_read']} rows, up to handle '{state['last_handle']}') already converted")
+    elif os.path.exists(quarantine.path):
+        os.remove(quarantine.path)
+
+    rows_read = 0
+    try:
+        with open(output_path, 'a' if state else 'w', encoding='utf-8', newline='') as output_stream, worker_pool(workers, executor) as executor:
+            if not state:
+                pd.DataFrame(columns=output_columns(price_engine)).to_csv(output_stream, index=False)
+            chunks = iter_product_chunks(file_path, chunksize, encoding_errors='replace')
+            for chunk_number in itertools.count():
+                with run_stage(run_report, 'read_csv'):
+                    chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                rows_read += len(chunk)
+                last_handle = text_values(chunk, 'Handle')[-1]
+                convertible = quarantine.check(chunk)
+                chunk = chunk[convertible]
+                if collision_index is not None:
+                    with run_stage(run_report, 'collisions', len(chunk)):
+                        chunk = collision_index.check(chunk)
+                keep = np.ones(len(chunk), dtype=bool)
+                if option_validator is not None:
+                    with run_stage(run_report, 'validate_options', len(chunk)):
+                        keep = option_validator.check(chunk)
+
+                if chunk_number < chunks_done:
+                    # Converted by an earlier run: only the checks above needed to see it again
+                    quarantine.discard()
+                    if chunk_number == chunks_done - 1 and (rows_read != state['rows_read'] or last_handle != state['last_handle']):
+                        print(f"Error: the export no longer matches checkpoint '{checkpoint.path}' at row {rows_read}; delete the checkpoint to convert from the start.")
+                        return None
+                    continue
+
+                if run_report is not None:
+                    run_report.count_rows('read_csv', len(chunk))
+                output_df, keep = transform_isolating_failures(chunk, keep, quarantine, executor, html_cache, price_engine, run_report)
+                if option_validator is not None:
+                    output_df = option_validator.filter(output_df, keep)
+                with run_stage(run_report, 'to_csv', len(output_df)):
+                    output_df.to_csv(output_stream, header=False, index=False)
+                    output_stream.flush()
+                    os.fsync(output_stream.fileno())
+                rows_written += len(output_df)
+                checkpoint.save(
+                    chunks_done=chunk_number + 1,
+                    rows_read=rows_read,
+                    last_handle=last_handle,
+                    rows_written=rows_written,
+                    output_bytes=output_stream.tell(),
+                    quarantine_bytes=quarantine.commit(),
+                    quarantine_counts=quarantine.reason_counts,
+                )
+    except FileNotFoundError:
+        print(f"Error: The file '{file_path}' was not found. Please ensure it's in the same directory as the script.")
+        return None
+    except pd.errors.ParserError as e:
+        print(f"An error occurred while reading the CSV file: {e}")
+        print(f"The products converted before it are kept in '{output_path}', up to checkpoint '{checkpoint.path}'.")
+        return None
+
+    checkpoint.remove()
+    return rows_written, chunks_done
+
+# --- Multi-Store Merge ---
+def convert_store_export(file_path, price_engine, reader_engine='pandas', html_cache_path=None, html_cache_bytes=DEFAULT_HTML_CACHE_BYTES,
+                         slowest_handles=DEFAULT_SLOWEST_HANDLES, collision_index=None, option_validator=None, extra_columns=()):
+    """Converts one store's export on a worker process of the multi-store mode.
+
+    Each worker opens the HTML cache read-only and fills its own copies of the run
+    report, collision index and option validator, which are sent back with the output
+    and the new cache entries in a dict (output is None if the export could not be read).
+    """
+    html_cache = HtmlContentCache(html_cache_path, html_cache_bytes, read_only=True) if html_cache_path else None
+    run_report = RunReport(slowest_handles)
+    output_df = process_shopify_data_for_medusa_csv(file_path, 1, html_cache, price_engine, run_report, ShopifyExportReader(reader_engine), collision_index, option_validator,
+                                                    extra_columns=extra_columns)
+    result = {
+        'output': output_df,
+        'run_report': run_report.to_dict(input=file_path),
+        'collision_index': collision_index,
+        'option_validator': option_validator,
+        'html_cache_hits': html_cache.hits if html_cache is not None else 0,
+        'html_cache_misses': html_cache.misses if html_cache is not None else 0,
+        'html_cache_writes': (html_cache.pending_rows, html_cache.used_keys) if html_cache is not None else ([], set()),
+    }
+    if html_cache is not None:
+        html_cache.close()
+    return result
+
+def store_ranks(store_names, policy, export_mtimes, preferred_store=None):
+    """The priority of each store under a conflict policy, 0 winning every conflict.
+
+    newest ranks the exports by modification time, latest first; prefer puts
+    preferred_store first; otherwise, and between equals, the input order decides.
+    """
+    if policy == 'newest':
+        order = sorted(range(len(store_names)), key=lambda i: (-export_mtimes[i], i))
+    elif policy == 'prefer':
+        order = sorted(range(len(store_names)), key=lambda i: (store_names[i] != preferred_store, i))
+    else:
+        order = list(range(len(store_names)))
+    ranks = np.empty(len(store_names), dtype=np.intp)
+    ranks[order] = np.arange(len(store_names))
+    return ranks
+
+def merge_store_outputs(store_names, store_outputs, ranks, keep_both=False):
+    """Merges the converted outputs of several stores into one, in input order.
+
+    A product conflicts with the products of other stores that share its Handle or one
+    of its Variant SKUs. It is dropped when one of them comes from a store ranked before
+    its own (see store_ranks), or with keep_both kept with "-<store>" appended to its
+    handle and SKUs found in other stores. A SKU that several products of one store use
+    (e.g. a supplier's option code) identifies none of them and links no stores, so only
+    direct matches on a product's own handle or SKUs make it lose. Conflicting products
+    are reported in groups, linked through the values they share with other stores.
+    Returns (merged DataFrame, conflict groups).
+    """
+    merged = pd.concat(store_outputs, ignore_index=True)
+    stores = np.repeat(np.arange(len(store_outputs)), [len(df) for df in store_outputs])
+    handles = text_values(merged, 'Handle')
+    skus = text_values(merged, 'Variant SKU')
+    handle_codes, unique_handles = pd.factorize(handles)
+    product_codes, _ = pd.factorize(stores * len(unique_handles) + handle_codes)
+    n_products = product_codes.max(initial=-1) + 1
+    product_stores = np.zeros(n_products, dtype=np.intp)
+    product_stores[product_codes] = stores
+    sku_codes, _ = pd.factorize(np.where(skus != '', skus, None))
+    # Only SKUs used by a single product in every store holding them identify products across stores
+    sku_products = np.unique(np.stack([sku_codes, product_codes])[:, sku_codes >= 0], axis=1)
+    products_per_store_sku = np.bincount(sku_products[0] * len(store_names) + product_stores[sku_products[1]],
+                                         minlength=(sku_codes.max(initial=-1) + 1) * len(store_names))
+    ambiguous_skus = products_per_store_sku.reshape(-1, len(store_names)).max(axis=1, initial=0) > 1
+    identity_sku_codes = np.where((sku_codes >= 0) & ambiguous_skus[np.maximum(sku_codes, 0)], -1, sku_codes)
+    def stores_per_value(codes):
+        pairs = np.unique(codes[codes >= 0].astype(np.int64) * len(store_names) + stores[codes >= 0])
+        return np.bincount(pairs // len(store_names), minlength=codes.max(initial=-1) + 1)
+
+    # A product loses when one of its handle or SKUs is also held by a store ranked before
+    # its own; ranks are distinct per store, so a lower rank is always another store's
+    row_ranks = ranks[stores]
+    best_ranks = np.full(len(merged), len(store_names), dtype=np.intp)
+    for key_codes in (handle_codes, identity_sku_codes):
+        linked = key_codes >= 0
+        key_ranks = np.full(key_codes.max(initial=-1) + 1, len(store_names), dtype=np.intp)
+        np.minimum.at(key_ranks, key_codes[linked], row_ranks[linked])
+        best_ranks[linked] = np.minimum(best_ranks[linked], key_ranks[key_codes[linked]])
+    product_best_ranks = np.full(n_products, len(store_names), dtype=np.intp)
+    np.minimum.at(product_best_ranks, product_codes, best_ranks)
+    losing_products = product_best_ranks < ranks[product_stores]
+    losing_rows = losing_products[product_codes]
+
+    # Union-find over products, linking those that share a handle or SKU held by several stores
+    parents = np.arange(n_products)
+    def find(product):
+        while parents[product] != product:
+            parents[product] = parents[parents[product]]
+            product = parents[product]
+        return product
+    for key_codes in (handle_codes, identity_sku_codes):
+        linked = key_codes >= 0
+        pairs = np.unique(key_codes[linked].astype(np.int64) * n_products + product_codes[linked])
+        pair_keys, pair_products = np.divmod(pairs, n_products)
+        shared = stores_per_value(key_codes)[pair_keys] > 1
+        first_products = {}
+        for key, product in zip(pair_keys[shared].tolist(), pair_products[shared].tolist()):
+            root, other = find(first_products.setdefault(key, product)), find(product)
+            if root != other:
+                parents[max(root, other)] = min(root, other)
+    groups = np.array([find(product) for product in range(n_products)], dtype=np.intp)
+
+    # A group is a conflict when its products come from more than one store
+    group_stores = np.unique(groups.astype(np.int64) * len(store_names) + product_stores)
+    store_counts = np.bincount(group_stores // len(store_names), minlength=n_products)
+    winners = np.full(n_products, len(store_names), dtype=np.intp)
+    np.minimum.at(winners, groups, ranks[product_stores])
+
+    conflicts = []
+    winning_stores = np.argsort(ranks)
+    row_groups = groups[product_codes]
+    conflict_rows = np.flatnonzero(store_counts[row_groups] > 1)
+    conflict_groups, group_positions = group_rows_by_handle(row_groups[conflict_rows])
+    for group, positions in zip(conflict_groups, group_positions):
+        group_rows = conflict_rows[positions]
+        conflicts.append({
+            'handles': list(dict.fromkeys(handles[group_rows])),
+            'stores': [store_names[store] for store in np.unique(stores[group_rows])],
+            'winner': store_names[winning_stores[winners[group]]],
+            'action': 'suffixed' if keep_both else 'dropped',
+            'losing_handles': list(dict.fromkeys(handles[group_rows[losing_rows[group_rows]]])),
+        })
+
+    if not keep_both:
+        return merged[~losing_rows].reset_index(drop=True), conflicts
+
+    # Suffix the handles and SKUs of the losing products that another store also uses
+    store_suffixes = np.array(['-' + slug for slug in slugify_handles(np.array(store_names, dtype=object))], dtype=object)
+    shared_handles = losing_rows & (stores_per_value(handle_codes)[handle_codes] > 1)
+    shared_skus = losing_rows & (sku_codes >= 0)
+    shared_skus[shared_skus] = stores_per_value(sku_codes)[sku_codes[shared_skus]] > 1
+    merged['Handle'] = np.where(shared_handles, handles + store_suffixes[stores], handles)
+    merged['Variant SKU'] = np.where(shared_skus, skus + store_suffixes[stores], merged['Variant SKU'].astype(object))
+    return merged, conflicts
+
+def process_store_exports(file_paths, store_names, ranks, keep_both=False, price_engine=None, reader_engine='pandas', html_cache=None,
+                          slowest_handles=DEFAULT_SLOWEST_HANDLES, collision_index=None, option_validator=None, run_report=None, extra_columns=()):
+    """Converts several store exports at once, one worker process per export, and merges them.
+
+    The workers only read html_cache; the entries they parsed are written back to it
+    here once they are done. The wall time is that of the slowest export plus the
+    merge. Returns (merged DataFrame, with extra_columns after the output columns,
+    conflict groups, per-store results from convert_store_export), or None if an
+    export could not be read.
+    """
+    with run_stage(run_report, 'convert_stores'):
+        with ProcessPoolExecutor(max_workers=len(file_paths)) as executor:
+            futures = [
+                executor.submit(convert_store_export, file_path, price_engine, reader_engine,
+                                html_cache.path if html_cache is not None else None,
+                                html_cache.max_bytes if html_cache is not None else DEFAULT_HTML_CACHE_BYTES,
+                                slowest_handles, collision_index, option_validator, extra_columns)
+                for file_path in file_paths
+            ]
+            store_results = [future.result() for future in futures]
+        if html_cache is not None:
+            for result in store_results:
+                html_cache.write_back(*result['html_cache_writes'])
+    if any(result['output'] is None for result in store_results):
+        return None
+    if run_report is not None:
+        run_report.count_rows('convert_stores', sum(len(result['output']) for result in store_results))
+
+    with run_stage(run_report, 'merge_stores', sum(len(result['output']) for result in store_results)):
+        merged_df, conflicts = merge_store_outputs(store_names, [result['output'] for result in store_results], ranks, keep_both)
+    return merged_df, conflicts, store_results
+
+# --- Converter ---
+class Converter:
+    """Converts Shopify exports into Medusa seed data, keeping its state warm across exports.
+
+    The price engine (currency tables and rounding), the HTML cache, the export reader
+    and, with workers > 1, the process pool are set up once and reused by every call
+    until close(); the category matcher and HTML parser settings are built once at
+    import. Each conversion checks collisions and option values with a fresh
+    CollisionIndex and OptionValidator (plus a Quarantine for checkpointed ones, and a
+    DuplicateDetector with find_duplicates), left on the converter for reporting.
+    convert and convert_to_csv also fill any feed writers given from the same pass.
+
+        with Converter(workers=4) as converter:
+            for feed in feeds:
+                for product in converter.iter_products(feed):
+                    ...
+    """
+
+    def __init__(self, price_engine=None, html_cache=None, workers=1, reader='pandas', arrow_cache=None, chunksize=DEFAULT_CHUNKSIZE,
+                 fix_collisions=False, max_variants=MAX_VARIANTS_PER_PRODUCT, drop_option_rejects=False, run_report=None,
+                 find_duplicates=False, collapse_duplicates=False, duplicate_threshold=DEFAULT_DUPLICATE_THRESHOLD):
+        self.price_engine = price_engine or PRICE_ENGINE
+        self.html_cache = html_cache
+        self.workers = workers
+        self.export_reader = ShopifyExportReader(reader, arrow_cache)
+        self.chunksize = chunksize
+        self.fix_collisions = fix_collisions
+        self.max_variants = max_variants
+        self.drop_option_rejects = drop_option_rejects
+        self.run_report = run_report
+        self.find_duplicates = find_duplicates or collapse_duplicates
+        self.collapse_duplicates = collapse_duplicates
+        self.duplicate_threshold = duplicate_threshold
+        self.executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        self.collision_index = None
+        self.option_validator = None
+        self.quarantine = None
+        self.duplicate_detector = None
+
+    def _start_checks(self):
+        self.collision_index = CollisionIndex(self.fix_collisions)
+        self.option_validator = OptionValidator(self.max_variants, self.drop_option_rejects)
+        self.duplicate_detector = DuplicateDetector(self.duplicate_threshold) if self.find_duplicates else None
+
+    def check_duplicates(self, output_df):
+        """Feeds a whole output frame (e.g. of merged stores) to the duplicate detector, collapsing its clusters if asked to."""
+        if not self.find_duplicates or output_df is None:
+            return output_df
+        if self.duplicate_detector is None:
+            self.duplicate_detector = DuplicateDetector(self.duplicate_threshold)
+        with run_stage(self.run_report, 'duplicates', len(output_df)):
+            self.duplicate_detector.add(output_df)
+            return self.duplicate_detector.collapse(output_df) if self.collapse_duplicates else output_df
+
+    def convert(self, source, feed_writers=(), output_writer=None):
+        """The whole output DataFrame of an export (a path or file object), or None if it could not be read.
+
+        The output also goes to output_writer (e.g. an NdjsonOutputWriter), if given; see write_output.
+        """
+        self._start_checks()
+        output_df = self.check_duplicates(process_shopify_data_for_medusa_csv(source, self.workers, self.html_cache, self.price_engine, self.run_report,
+                                                                               self.export_reader, self.collision_index, self.option_validator, self.executor,
+                                                                               writer_input_columns([*feed_writers, output_writer])))
+        if output_df is None:
+            return None
+        if output_writer is not None:
+            with run_stage(self.run_report, 'to_csv', len(output_df)):
+                write_output(output_df, output_writer, self.price_engine)
+        return write_feeds(output_df, feed_writers, self.price_engine, self.run_report)
+
+    def convert_to_csv(self, source, output_path, chunksize=None, output_writer=None, columnar_writer=None, feed_writers=()):
+        """Streams an export into output_path (or output_writer) in chunks; see stream_shopify_data_to_medusa_csv.
+
+        Duplicates are only reported: streamed chunks are written before the clusters are known.
+        """
+        self._start_checks()
+        return stream_shopify_data_to_medusa_csv(source, output_path, chunksize or self.chunksize, self.workers, self.html_cache, self.price_engine,
+                                                 output_writer, self.run_report, columnar_writer, self.collision_index, self.option_validator, self.executor,
+                                                 self.duplicate_detector, feed_writers)
+
+    def convert_with_checkpoints(self, source, output_path, checkpoint_path, quarantine_path, chunksize=None):
+        """Streams an export into output_path, resuming from checkpoint_path; see stream_shopify_data_with_checkpoints."""
+        self._start_checks()
+        chunksize = chunksize or self.chunksize
+        options = {'fix_collisions': self.fix_collisions, 'max_variants': self.max_variants, 'drop_option_rejects': self.drop_option_rejects}
+        checkpoint = ConversionCheckpoint(checkpoint_path, source, output_path, chunksize, self.price_engine, options)
+        self.quarantine = Quarantine(quarantine_path)
+        return stream_shopify_data_with_checkpoints(source, output_path, chunksize, checkpoint, self.quarantine, self.workers, self.html_cache, self.price_engine,
+                                                    self.run_report, self.collision_index, self.option_validator, self.executor)
+
+    def convert_incrementally(self, source, output_path, state_path):
+        """Converts the products changed since the run that wrote state_path; see process_shopify_data_incrementally."""
+        self._start_checks()
+        result = process_shopify_data_incrementally(source, output_path, state_path, self.workers, self.html_cache, self.price_engine, self.run_report,
+                                                    self.export_reader, self.collision_index, self.option_validator, self.executor)
+        if result is None:
+            return None
+        output_df, changeset, fingerprints = result
+        return self.check_duplicates(output_df), changeset, fingerprints
+
+    def iter_products(self, source, chunksize=None):
+        """Yields the products of an export (a path or file object) one at a time, as createProductsWorkflow-shaped dicts.
+
+        The export is read and converted in chunks of about chunksize rows that never
+        split a product, so memory follows the chunk size rather than the catalog.
+        Read errors are raised, as FileNotFoundError or a parser error.
+        """
+        self._start_checks()
+        for output_df in iter_converted_chunks(source, chunksize or self.chunksize, self.executor, self.html_cache, self.price_engine,
+                                               self.run_report, self.collision_index, self.option_validator, NDJSON_INPUT_COLUMNS):
+            yield from iter_product_documents(output_df, self.price_engine)
+
+    def close(self):
+        """Shuts the process pool down; the HTML cache belongs to the caller and stays open."""
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
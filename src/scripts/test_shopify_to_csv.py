@@ -0,0 +1,530 @@
+"""Tests for the shopify_to_csv library. Run from src/scripts with: python -m pytest -q"""
+import asyncio
+import bz2
+import gzip
+import http.client
+import importlib.util
+import io
+import json
+import os
+import sys
+from fractions import Fraction
+from xml.etree import ElementTree
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import shopify_to_csv
+from shopify_to_csv import (
+    CollisionIndex,
+    ColumnarOutputWriter,
+    Converter,
+    DuplicateDetector,
+    GoogleShoppingFeedWriter,
+    HtmlContentCache,
+    NdjsonOutputWriter,
+    OptionValidator,
+    PriceEngine,
+    RunReport,
+    ShardedOutputWriter,
+    SitemapWriter,
+    divide_rounded,
+    extract_html_content,
+    infer_category,
+    merge_store_outputs,
+    normalize_output_frame,
+    output_columns,
+    pa,
+    read_shopify_export,
+    save_incremental_state,
+    slugify_handles,
+    write_csv,
+    zstandard,
+)
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+EXPORT_PATH = os.path.join(SCRIPTS_DIR, 'products.csv')
+
+def load_script(file_name):
+    """Imports one of the hyphen-named scripts next to this file as a module."""
+    spec = importlib.util.spec_from_file_location(file_name[:-3].replace('-', '_'), os.path.join(SCRIPTS_DIR, file_name))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module # So pool workers can unpickle its functions
+    spec.loader.exec_module(module)
+    return module
+
+def export_subset(path, products):
+    """Writes every row of the first products of products.csv to path, to keep the slower tests short."""
+    export_df = pd.read_csv(EXPORT_PATH, dtype=str, keep_default_na=False)
+    export_df[export_df['Handle'].isin(export_df['Handle'].unique()[:products])].to_csv(path, index=False)
+    return str(path)
+
+def write_export(path, columns):
+    """Writes a small Shopify export to path: the given columns, and blank ones for the rest the converter reads."""
+    rows = len(columns['Handle'])
+    blank_columns = ['Title', 'Body (HTML)', 'Vendor', 'Status', 'Tags', 'Image Src', 'Variant Image', 'Variant SKU', 'Variant Price',
+                     'Option1 Name', 'Option1 Value', 'Option2 Name', 'Option2 Value', 'Option3 Name', 'Option3 Value']
+    pd.DataFrame({**{col: [''] * rows for col in blank_columns}, **columns}).to_csv(path, index=False)
+    return str(path)
+
+# (handle, slugifyString(handle) in seed-from-shopify.ts), as printed by node
+SEEDER_SLUGS = [
+    ('café-noir', 'cafe-noir'),
+    ('Crème Brûlée Mug', 'creme-brulee-mug'),
+    ('São Paulo Tee', 'sao-paulo-tee'),
+    ('Ñandú  -- Plush', 'nandu-plush'),
+    ('naïve_ART', 'naive_art'),
+    ('İstanbul', 'istanbul'),
+    ('Straße-Hoodie', 'strae-hoodie'), # Letters without a decomposition are dropped, not transliterated
+    ('Øresund Scarf', 'resund-scarf'),
+    ('日本 Tee', 'tee'),
+]
+
+def test_slugify_handles_matches_seeder():
+    handles, slugs = zip(*SEEDER_SLUGS)
+    assert list(slugify_handles(list(handles))) == list(slugs)
+
+def test_accented_handles_collide_like_the_seeder():
+    df = pd.DataFrame({'Handle': ['café-noir', 'cafe-noir', 'caf-noir']})
+    collision_index = CollisionIndex(fix=True)
+    fixed = collision_index.check(df)
+    assert collision_index.report()['handle'] == [{'slug': 'cafe-noir', 'handles': ['café-noir', 'cafe-noir'], 'rows': [1, 2]}]
+    assert list(fixed['Handle']) == ['café-noir', 'cafe-noir-2', 'caf-noir']
+
+@pytest.mark.parametrize('chunk_size', [3, 1])
+def test_fixed_handles_and_skus_stay_unique(chunk_size):
+    df = pd.DataFrame({'Handle': ['tee', 'Tee', 'tee-2'], 'Variant SKU': ['TEE', 'TEE', 'TEE-2']})
+    collision_index = CollisionIndex(fix=True)
+    fixed = pd.concat([collision_index.check(df.iloc[start:start + chunk_size]) for start in range(0, len(df), chunk_size)])
+    assert fixed['Handle'].nunique() == 3 and fixed['Variant SKU'].nunique() == 3
+    if chunk_size == 3:
+        # Suffixes skip values held later in the same frame
+        assert list(fixed['Handle']) == ['tee', 'tee-3', 'tee-2']
+        assert list(fixed['Variant SKU']) == ['TEE', 'TEE-3', 'TEE-2']
+    else:
+        # A later chunk holding a generated value is suffixed again, and reported
+        assert list(fixed['Handle']) == ['tee', 'tee-2', 'tee-2-2']
+        assert list(fixed['Variant SKU']) == ['TEE', 'TEE-2', 'TEE-2-2']
+        assert {'slug': 'tee-2', 'handles': ['Tee', 'tee-2'], 'rows': [2, 3]} in collision_index.report()['handle']
+
+@pytest.mark.parametrize('reader', ['pandas', pytest.param('pyarrow', marks=pytest.mark.skipif(pa is None, reason="needs pyarrow"))])
+@pytest.mark.parametrize('mode', ['r', 'rb'])
+def test_convert_accepts_file_objects(reader, mode):
+    with Converter(reader=reader) as converter:
+        expected = converter.convert(EXPORT_PATH)
+        with open(EXPORT_PATH, mode) as f:
+            converted = converter.convert(f)
+    assert converted is not None
+    pd.testing.assert_frame_equal(converted, expected)
+
+def test_iter_products_accepts_file_objects():
+    with Converter(chunksize=700) as converter:
+        expected = list(converter.iter_products(EXPORT_PATH))
+        with open(EXPORT_PATH, encoding='utf-8') as f:
+            products = list(converter.iter_products(f))
+    assert len(products) == 251
+    assert products == expected
+
+def test_arrow_cache_skips_file_objects(tmp_path):
+    if pa is None:
+        pytest.skip("needs pyarrow")
+    with Converter(arrow_cache=str(tmp_path / 'export.arrow')) as converter:
+        with open(EXPORT_PATH, encoding='utf-8') as f:
+            converted = converter.convert(f)
+        assert converted is not None and not converter.export_reader.cache_hit
+        assert not (tmp_path / 'export.arrow').exists()
+
+def test_feed_urls_use_the_seeded_slug(tmp_path):
+    export_path = write_export(tmp_path / 'products.csv', {
+        'Handle': ['café-noir', 'café-noir'],
+        'Title': ['Café Noir Mug', ''],
+        'Body (HTML)': ['<p>A mug for black coffee.</p>', ''],
+        'Vendor': ['KaziHub', ''],
+        'Status': ['active', ''],
+        'Option1 Name': ['Size', ''], 'Option1 Value': ['Large', 'Small'],
+        'Variant Price': ['12.00', '10.00'],
+        'Image Src': ['https://cdn.example.com/cafe.jpg?w=1&h=1', ''],
+        'SEO Title': ['Café Noir', ''],
+    })
+    output_path = str(tmp_path / 'seed.csv')
+    feed_writers = [GoogleShoppingFeedWriter(output_path, store_url='https://shop.example.com/'), SitemapWriter(output_path, store_url='https://shop.example.com/')]
+    with Converter() as converter:
+        converted = converter.convert(export_path, feed_writers)
+    for feed_writer in feed_writers:
+        feed_writer.close()
+
+    assert list(converted.columns) == output_columns()
+    feed = pd.read_csv(tmp_path / 'seed_google_shopping.tsv', sep='\t', dtype=str, keep_default_na=False)
+    assert list(feed['link']) == ['https://shop.example.com/products/cafe-noir'] * 2
+    assert list(feed['id']) == ['café-noir-1', 'café-noir-2']
+    assert list(feed['size']) == ['Large', 'Small']
+    namespaces = {'sm': 'http://www.sitemaps.org/schemas/sitemap/0.9', 'image': 'http://www.google.com/schemas/sitemap-image/1.1'}
+    sitemap = ElementTree.parse(tmp_path / 'seed_sitemap.xml')
+    assert [loc.text for loc in sitemap.findall('sm:url/sm:loc', namespaces)] == ['https://shop.example.com/products/cafe-noir']
+    assert [loc.text for loc in sitemap.findall('sm:url/image:image/image:loc', namespaces)] == ['https://cdn.example.com/cafe.jpg?w=1&h=1']
+    seo = pd.read_csv(tmp_path / 'seed_seo.csv')
+    assert seo.to_dict('records') == [{'Handle': 'café-noir', 'URL': 'https://shop.example.com/products/cafe-noir', 'SEO Title': 'Café Noir', 'SEO Description': 'A mug for black coffee.'}]
+
+def test_merge_keeps_products_found_in_one_store_only():
+    # cap and tee share a supplier option code in storea; only tee is also sold by storeb
+    storea = pd.DataFrame({'Handle': ['mug', 'tee', 'cap'], 'Variant SKU': ['MUG-1', '14:193#Black', '14:193#Black']})
+    storeb = pd.DataFrame({'Handle': ['tee', 'mug-large'], 'Variant SKU': ['TEE-1', 'MUG-1']})
+    merged, conflicts = merge_store_outputs(['storea', 'storeb'], [storea, storeb], np.array([1, 0]))
+    assert list(merged['Handle']) == ['cap', 'tee', 'mug-large']
+    assert sorted(handle for conflict in conflicts for handle in conflict['losing_handles']) == ['mug', 'tee']
+
+    merged, _ = merge_store_outputs(['storea', 'storeb'], [storea, storeb], np.array([1, 0]), keep_both=True)
+    assert list(merged['Handle']) == ['mug', 'tee-storea', 'cap', 'tee', 'mug-large']
+    assert list(merged['Variant SKU']) == ['MUG-1-storea', '14:193#Black', '14:193#Black', 'TEE-1', 'MUG-1']
+
+def test_product_documents_skip_image_only_rows(tmp_path):
+    export_path = write_export(tmp_path / 'products.csv', {
+        'Handle': ['tee', 'tee', 'tee', 'tee'],
+        'Title': ['Tee', '', '', ''],
+        'Option1 Name': ['Size', '', '', ''], 'Option1 Value': ['S', 'M', '', ''],
+        'Variant SKU': ['TEE-S', 'TEE-M', '', ''], 'Variant Price': ['10.00', '12.50', '', ''],
+        'Image Src': ['https://cdn.example.com/front.jpg', '', 'https://cdn.example.com/back.jpg', 'https://cdn.example.com/side.jpg'],
+    })
+    with Converter() as converter:
+        [product] = converter.iter_products(export_path)
+    assert [variant['sku'] for variant in product['variants']] == ['TEE-S', 'TEE-M']
+    assert [variant['options'] for variant in product['variants']] == [{'Size': 'S'}, {'Size': 'M'}]
+    assert [image['url'] for image in product['images']] == [f'https://cdn.example.com/{name}.jpg' for name in ['front', 'back', 'side']]
+    # Major units, like the seeder's own products: 12.50 USD is 12.5, not 1250 cents; XOF has no minor unit
+    assert product['variants'][1]['prices'] == [
+        {'amount': 12.5, 'currency_code': 'usd'},
+        {'amount': 11, 'currency_code': 'eur'},
+        {'amount': 17.13, 'currency_code': 'cad'},
+        {'amount': 7203, 'currency_code': 'xof'},
+    ]
+
+def test_ndjson_output_has_one_variant_per_variant_row(tmp_path):
+    with Converter() as converter:
+        ndjson_writer = NdjsonOutputWriter(str(tmp_path / 'seed.csv'))
+        converted = converter.convert(EXPORT_PATH, output_writer=ndjson_writer)
+        [ndjson_path] = ndjson_writer.close()
+    with open(ndjson_path, encoding='utf-8') as f:
+        products = [json.loads(line) for line in f]
+    assert len(products) == converted['Handle'].nunique()
+    assert sum(len(product['variants']) for product in products) == (converted['Medusa_Variant_Options'] != '{}').sum()
+    assert all(variant['sku'] and variant['prices'][0]['amount'] > 0 for product in products for variant in product['variants'])
+
+def test_groupby_pass_matches_the_per_handle_loop(tmp_path):
+    export_path = export_subset(tmp_path / 'products.csv', 40)
+    expected = load_script('shopify-to-csv-005.py').process_shopify_data_for_medusa_csv(export_path)
+    with Converter() as converter:
+        converted = converter.convert(export_path)
+    # 005 predates the multi-currency amount columns; every column they share is unchanged
+    shared_columns = [col for col in expected.columns if col in converted.columns]
+    assert len(shared_columns) == 20
+    pd.testing.assert_frame_equal(converted[shared_columns].astype(str).reset_index(drop=True), expected[shared_columns].astype(str).reset_index(drop=True))
+
+def test_html_is_parsed_once_like_beautifulsoup():
+    script = load_script('shopify-to-csv-005.py')
+    export_df = pd.read_csv(EXPORT_PATH, dtype=str, keep_default_na=False)
+    bodies = [body for body in export_df['Body (HTML)'].unique() if body][:50] + [
+        '<p>Soft <b>cotton</b>&nbsp;tee</p><script>track()</script><img src="https://cdn.example.com/a.jpg"><br/><IMG SRC=b.png>',
+        '<div>Unclosed <span>tags',
+        '',
+    ]
+    for body in bodies:
+        assert extract_html_content(body) == (script.clean_html(body), script.extract_image_urls_from_html(body))
+
+def test_compiled_category_matcher_matches_the_keyword_loop():
+    script = load_script('shopify-to-csv-005.py')
+    export_df = pd.read_csv(EXPORT_PATH, dtype=str, keep_default_na=False).drop_duplicates('Handle')
+    cases = list(zip(export_df['Title'], export_df['Tags'].map(lambda tags: [tag.strip() for tag in tags.split(',') if tag.strip()])))
+    cases += [('', []), ('Untitled', ['no-such-tag'])]
+    for title, tags in cases:
+        assert sorted(infer_category(title, tags)) == sorted(script.infer_category(title, tags))
+
+def test_chunked_csv_matches_the_whole_export(tmp_path):
+    expected_path, output_path = str(tmp_path / 'expected.csv'), str(tmp_path / 'seed.csv')
+    with Converter() as converter:
+        write_csv(converter.convert(EXPORT_PATH), expected_path)
+        rows_written = converter.convert_to_csv(EXPORT_PATH, output_path, chunksize=300)
+    assert rows_written == 4936
+    with open(output_path, 'rb') as output, open(expected_path, 'rb') as expected:
+        assert output.read() == expected.read()
+
+def test_worker_pool_matches_one_process(tmp_path):
+    export_path = export_subset(tmp_path / 'products.csv', 40)
+    with Converter() as converter:
+        expected = converter.convert(export_path)
+    with Converter(workers=2) as converter:
+        converted = converter.convert(export_path)
+    pd.testing.assert_frame_equal(converted, expected)
+
+def test_html_cache_serves_a_second_run(tmp_path):
+    export_path = export_subset(tmp_path / 'products.csv', 20)
+    cache_path = str(tmp_path / 'html_cache.sqlite')
+    outputs = []
+    for _ in range(2):
+        html_cache = HtmlContentCache(cache_path)
+        with Converter(html_cache=html_cache) as converter:
+            outputs.append(converter.convert(export_path))
+        html_cache.close()
+    pd.testing.assert_frame_equal(outputs[1], outputs[0])
+    assert html_cache.misses == 0 and html_cache.hits > 0
+
+    # A read-only copy, as the multi-store workers open it, leaves the writes to write_back
+    html_cache = HtmlContentCache(cache_path)
+    worker_cache = HtmlContentCache(cache_path, read_only=True)
+    worker_cache.put_many({'<p>new</p>': ('new', [])})
+    assert worker_cache.get_many(['<p>new</p>']) == {}
+    html_cache.write_back(worker_cache.pending_rows, worker_cache.used_keys)
+    assert worker_cache.get_many(['<p>new</p>']) == {'<p>new</p>': ('new', [])}
+    worker_cache.close()
+    html_cache.close()
+
+def test_incremental_run_converts_only_changed_products(tmp_path):
+    export_path = export_subset(tmp_path / 'products.csv', 20)
+    output_path, state_path = str(tmp_path / 'seed.csv'), str(tmp_path / 'seed_state.json')
+    export_df = pd.read_csv(export_path, dtype=str, keep_default_na=False)
+    handles = list(export_df['Handle'].unique())
+
+    def run(export_df):
+        export_df.to_csv(export_path, index=False)
+        with Converter() as converter:
+            output_df, changeset, fingerprints = converter.convert_incrementally(export_path, output_path, state_path)
+        write_csv(output_df, output_path)
+        save_incremental_state(state_path, fingerprints, output_path)
+        return changeset
+
+    changeset = run(export_df)
+    assert changeset['added'] == handles and changeset['unchanged'] == 0
+    changed_df = export_df[export_df['Handle'] != handles[1]].copy()
+    changed_df.loc[changed_df.index[0], 'Title'] = 'Renamed product'
+    changeset = run(changed_df)
+    assert changeset == {'added': [], 'changed': [handles[0]], 'removed': [handles[1]], 'unchanged': len(handles) - 2}
+
+    with Converter() as converter:
+        write_csv(converter.convert(export_path), str(tmp_path / 'expected.csv'))
+    assert (tmp_path / 'seed.csv').read_bytes() == (tmp_path / 'expected.csv').read_bytes()
+
+def test_price_rounding_modes_are_exact():
+    numerators = np.array([5, 15, 25, 7, -5])
+    assert divide_rounded(numerators, 10, 'half_up').tolist() == [1, 2, 3, 1, -1]
+    assert divide_rounded(numerators, 10, 'half_even').tolist() == [0, 2, 2, 1, 0]
+    assert divide_rounded(numerators, 10, 'down').tolist() == [0, 1, 2, 0, 0]
+    assert divide_rounded(numerators, 10, 'up').tolist() == [1, 2, 3, 1, -1]
+
+    # 0.10 USD at 1.15 is exactly 11.5 cents, where floats give 0.11499999999999999
+    prices = pd.DataFrame({'Variant Price': [10, 100], 'Variant Compare At Price': [0, 0], 'Cost per item': [0, 0]})
+    amounts = {
+        rounding: PriceEngine('USD', {'EUR': Fraction('1.15')}, {'USD': 100, 'EUR': 100}, rounding).compute(prices)['Medusa_Price_EUR_Amount'].tolist()
+        for rounding in ['half_up', 'half_even', 'down']
+    }
+    assert amounts == {'half_up': [12, 115], 'half_even': [12, 115], 'down': [11, 115]}
+    with pytest.raises(ValueError):
+        PriceEngine('USD', {}, {'USD': 100}, 'nearest')
+
+def test_export_is_loaded_with_compact_dtypes():
+    export_df = read_shopify_export(EXPORT_PATH)
+    assert set(export_df.columns) <= shopify_to_csv.SHOPIFY_INPUT_COLUMNS
+    assert len(export_df.columns) < len(pd.read_csv(EXPORT_PATH, nrows=0).columns)
+    assert all(export_df[col].dtype == 'category' for col in shopify_to_csv.SHOPIFY_CATEGORICAL_COLUMNS if col in export_df.columns)
+    assert export_df['Variant Price'].dtype == np.int32
+    assert export_df['Variant Price'].iloc[0] == round(float(pd.read_csv(EXPORT_PATH, nrows=1)['Variant Price'].iloc[0]) * 100)
+
+def test_option_columns_are_built_per_product(tmp_path):
+    export_path = write_export(tmp_path / 'products.csv', {
+        'Handle': ['tee', 'tee', 'tee', 'mug'],
+        'Title': ['Tee', '', '', 'Mug'],
+        'Option1 Name': ['Size', '', '', 'Title'], 'Option1 Value': ['S', 'M', 'M', 'Default Title'],
+        'Option2 Name': ['Color', '', '', ''], 'Option2 Value': ['Red', 'Red', 'Blue', ''],
+        'Variant Price': ['10.00', '10.00', '11.00', '5.00'],
+    })
+    with Converter() as converter:
+        converted = converter.convert(export_path)
+    # Option values are listed sorted, like every earlier version of the converter
+    assert json.loads(converted['Medusa_Product_Options'].iloc[0]) == [{'name': 'Size', 'values': ['M', 'S']}, {'name': 'Color', 'values': ['Blue', 'Red']}]
+    assert [json.loads(options) for options in converted['Medusa_Variant_Options']] == [
+        {'Size': 'S', 'Color': 'Red'}, {'Size': 'M', 'Color': 'Red'}, {'Size': 'M', 'Color': 'Blue'}, {'Title': 'Default Title'},
+    ]
+
+def test_normalized_tables_hold_each_fact_once(tmp_path):
+    with Converter() as converter:
+        converted = converter.convert(EXPORT_PATH)
+    tables = normalize_output_frame(converted)
+    assert len(tables['products']) == converted['Handle'].nunique() == tables['products']['Handle'].nunique()
+    assert len(tables['variants']) == len(converted)
+    assert len(tables['prices']) == len(converted) * len(shopify_to_csv.PRICE_ENGINE.currencies)
+    usd_prices = tables['prices'][tables['prices']['Currency'] == 'USD']
+    assert usd_prices['Medusa_Price_Amount'].tolist() == converted['Medusa_Price_USD_Amount'].tolist()
+    assert not tables['images'].duplicated(['Handle', 'Image Position']).any()
+
+def test_synthetic_export_has_the_requested_rows(tmp_path):
+    benchmark = load_script('benchmark-shopify-to-csv-scaling.py')
+    export_path = str(tmp_path / 'synthetic.csv')
+    products = benchmark.generate_shopify_export(export_path, 500, seed=1)
+    export_df = pd.read_csv(export_path, dtype=str, keep_default_na=False)
+    assert len(export_df) == 500 and export_df['Handle'].nunique() == products
+    with Converter() as converter:
+        assert len(converter.convert(export_path)) == 500
+    benchmark.generate_shopify_export(str(tmp_path / 'again.csv'), 500, seed=1)
+    assert (tmp_path / 'again.csv').read_bytes() == (tmp_path / 'synthetic.csv').read_bytes()
+
+def test_run_report_records_every_stage(tmp_path):
+    run_report = RunReport(slowest_handles=3)
+    with Converter(run_report=run_report) as converter:
+        converter.convert(EXPORT_PATH)
+    report = run_report.to_dict(input=EXPORT_PATH)
+    stages = {stage['name']: stage for stage in report['stages']}
+    assert stages['read_csv']['rows'] == 4936 and stages['read_csv']['calls'] == 1
+    assert all(stage['wall_seconds'] >= 0 for stage in stages.values())
+    assert len(report['slowest_handles']) == 3
+    run_report.write(str(tmp_path / 'report.json'))
+    assert json.loads((tmp_path / 'report.json').read_text())['stages'] == report['stages']
+
+@pytest.mark.parametrize('file_format', ['parquet', 'arrow'])
+def test_columnar_output_matches_the_csv(tmp_path, file_format):
+    pytest.importorskip('pyarrow.parquet')
+    with Converter() as converter:
+        converted = converter.convert(EXPORT_PATH)
+    columnar_writer = ColumnarOutputWriter(str(tmp_path / 'seed.csv'), file_format)
+    columnar_writer.write(converted.iloc[:1000])
+    columnar_writer.write(converted.iloc[1000:])
+    path = columnar_writer.close()
+    table = pa.parquet.read_table(path) if file_format == 'parquet' else pa.ipc.open_file(pa.memory_map(path)).read_all()
+    columnar = table.to_pandas()
+    write_csv(converted, str(tmp_path / 'seed.csv'))
+    expected = pd.read_csv(tmp_path / 'seed.csv', dtype=str, keep_default_na=False)
+    assert columnar['Handle'].tolist() == expected['Handle'].tolist()
+    assert columnar['Medusa_Price_EUR_Amount'].tolist() == converted['Medusa_Price_EUR_Amount'].tolist()
+    assert columnar['Medusa_Variant_Options'].tolist() == expected['Medusa_Variant_Options'].tolist()
+
+def test_shards_keep_each_product_whole(tmp_path):
+    with Converter() as converter:
+        converted = converter.convert(EXPORT_PATH)
+    sharded_writer = ShardedOutputWriter(str(tmp_path / 'seed.csv'), 4)
+    sharded_writer.write(converted.iloc[:2000])
+    sharded_writer.write(converted.iloc[2000:])
+    manifest = sharded_writer.close()
+    shards = [pd.read_csv(path, dtype=str, keep_default_na=False) for path in sharded_writer.paths]
+    assert manifest['rows'] == sum(len(shard) for shard in shards) == len(converted)
+    assert manifest['products'] == converted['Handle'].nunique()
+    shard_handles = [set(shard['Handle']) for shard in shards]
+    assert sum(len(handles) for handles in shard_handles) == len(set().union(*shard_handles))
+    # A product lands in the same shard however the output is chunked
+    whole_writer = ShardedOutputWriter(str(tmp_path / 'whole.csv'), 4)
+    whole_writer.write(converted)
+    assert [shard['sha256'] for shard in whole_writer.close()['shards']] == [shard['sha256'] for shard in manifest['shards']]
+
+def test_option_validator_finds_what_the_seeder_would_fall_back_on():
+    df = pd.DataFrame({
+        'Handle': ['tee', 'tee', 'tee', 'tee', 'cap', 'cap', 'cap', 'hat'],
+        'Option1 Name': ['Size', '', '', '', 'Size', '', '', 'Size'],
+        'Option1 Value': ['S', 'M', 'S', '', 'S', 'M', 'L', 'S'],
+        'Option2 Name': [''] * 8,
+        'Option2 Value': ['', '', '', '', '', '', '', 'Red'],
+        'Option3 Name': [''] * 8,
+        'Option3 Value': [''] * 8,
+    })
+    option_validator = OptionValidator(max_variants=2, drop=True)
+    keep = option_validator.check(df)
+    assert keep.tolist() == [True, True, False, False, False, False, False, False]
+    reasons = option_validator.rejects[0].set_index('Row')['Reason'].to_dict()
+    assert reasons == {3: 'duplicate_combination', 4: 'no_option_values', 5: 'too_many_variants', 6: 'too_many_variants', 7: 'too_many_variants', 8: 'unexpected_value'}
+    assert len(option_validator.filter(df, keep)) == 2
+
+@pytest.mark.parametrize('compression', ['.gz', '.bz2', pytest.param('.zst', marks=pytest.mark.skipif(zstandard is None, reason="needs zstandard"))])
+def test_compressed_exports_and_outputs(tmp_path, compression):
+    plain_path = export_subset(tmp_path / 'products.csv', 40)
+    with open(plain_path, 'rb') as f:
+        export_bytes = f.read()
+    export_path = str(tmp_path / f'products.csv{compression}')
+    if compression == '.gz':
+        data = gzip.compress(export_bytes)
+    elif compression == '.bz2':
+        data = bz2.compress(export_bytes)
+    else:
+        data = zstandard.ZstdCompressor().compress(export_bytes)
+    with open(export_path, 'wb') as f:
+        f.write(data)
+    with Converter() as converter:
+        expected = converter.convert(plain_path)
+        converted = converter.convert(export_path)
+        pd.testing.assert_frame_equal(converted, expected)
+        output_path = str(tmp_path / f'seed.csv{compression}')
+        rows_written = converter.convert_to_csv(export_path, output_path, chunksize=300)
+    assert rows_written == len(expected)
+    with shopify_to_csv.open_text_stream(output_path) as f:
+        assert pd.read_csv(f, dtype=str, keep_default_na=False)['Handle'].tolist() == expected['Handle'].tolist()
+
+def test_service_streams_the_conversion(tmp_path):
+    service_script = load_script('shopify-to-csv-service.py')
+    export_path = export_subset(tmp_path / 'products.csv', 30)
+    with open(export_path, 'rb') as f:
+        body = f.read()
+
+    def post(port, path):
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        connection.request('POST', path, body=body)
+        response = connection.getresponse()
+        return response.status, response.read()
+
+    async def run():
+        service = service_script.ConversionService(workers=1, chunksize=200)
+        server = await asyncio.start_server(service.handle_connection, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            csv_response = await asyncio.to_thread(post, port, '/convert?format=csv')
+            ndjson_response = await asyncio.to_thread(post, port, '/convert?format=ndjson')
+            bad_response = await asyncio.to_thread(post, port, '/convert?format=xml')
+        finally:
+            server.close()
+            await server.wait_closed()
+            service.close()
+        return csv_response, ndjson_response, bad_response, service.totals
+
+    (csv_status, csv_body), (ndjson_status, ndjson_body), (bad_status, _), totals = asyncio.run(run())
+    with Converter() as converter:
+        expected = converter.convert(export_path)
+    assert csv_status == 200 and ndjson_status == 200 and bad_status == 400
+    converted = pd.read_csv(io.BytesIO(csv_body), dtype=str, keep_default_na=False)
+    assert converted['Handle'].tolist() == expected['Handle'].tolist()
+    assert len(ndjson_body.splitlines()) == expected['Handle'].nunique()
+    assert totals['completed'] == 2 and totals['rows'] == 2 * len(expected)
+
+def test_checkpoint_resumes_an_interrupted_conversion(tmp_path, monkeypatch):
+    export_path = export_subset(tmp_path / 'products.csv', 30)
+    expected_path, output_path = tmp_path / 'expected.csv', tmp_path / 'seed.csv'
+    checkpoint_path, quarantine_path = str(tmp_path / 'seed_checkpoint.json'), str(tmp_path / 'seed_quarantine.csv')
+    with Converter() as converter:
+        converter.convert_to_csv(export_path, str(expected_path), chunksize=100)
+
+    transform_isolating_failures = shopify_to_csv.transform_isolating_failures
+    transformed_chunks = []
+    def interrupted_transform(*args):
+        transformed_chunks.append(len(args[0]))
+        if len(transformed_chunks) == 3:
+            raise KeyboardInterrupt
+        return transform_isolating_failures(*args)
+    monkeypatch.setattr(shopify_to_csv, 'transform_isolating_failures', interrupted_transform)
+    with Converter() as converter, pytest.raises(KeyboardInterrupt):
+        converter.convert_with_checkpoints(export_path, str(output_path), checkpoint_path, quarantine_path, chunksize=100)
+    with open(checkpoint_path, encoding='utf-8') as f:
+        assert json.load(f)['chunks_done'] == 2
+
+    monkeypatch.undo()
+    with Converter() as converter:
+        rows_written, resumed_chunks = converter.convert_with_checkpoints(export_path, str(output_path), checkpoint_path, quarantine_path, chunksize=100)
+    assert resumed_chunks == 2
+    assert output_path.read_bytes() == expected_path.read_bytes()
+    assert rows_written == len(pd.read_csv(expected_path)) and not os.path.exists(checkpoint_path)
+
+def test_near_duplicate_products_are_clustered():
+    description = ' '.join(f'word{i}' for i in range(60))
+    output_df = pd.DataFrame({
+        'Handle': ['tee', 'tee', 'tee-copy', 'mug'],
+        'Title': ['Organic Cotton Tee', '', 'Organic Cotton Tee', 'Ceramic Mug'],
+        'Medusa_Description': [description, '', description + ' extra', 'A completely different ceramic mug for coffee and tea'],
+    })
+    duplicate_detector = DuplicateDetector(threshold=0.8)
+    duplicate_detector.add(output_df)
+    assert duplicate_detector.duplicate_handles() == {'tee-copy'}
+    report = duplicate_detector.report()
+    assert [cluster['keep'] for cluster in report['clusters']] == ['tee']
+    assert duplicate_detector.collapse(output_df)['Handle'].tolist() == ['tee', 'tee', 'mug']